@@ -0,0 +1,330 @@
+"""Cohort analytics over stored profiles: predicted fat% by age bracket and gender, popular exercises.
+
+Profiles are read through a chunked cursor, ``chunk_size`` rows at a time,
+with each profile's Total_Reps already summed by SQLite, and each chunk is
+scored with one ``PredictionPipeline.predict_columns`` call; only running
+sums and histogram counts are kept, never the rows. Exercise popularity is
+aggregated entirely in SQL. Results are cached per age bracket: saving a
+profile invalidates just the brackets of its old and new age, and the next
+read rescans only those. Entries also expire after ``ttl`` seconds, which
+bounds how stale other worker processes' caches can get, and cohort results
+are dropped when the models are reloaded.
+"""
+import json
+import math
+import threading
+import time
+
+import numpy as np
+
+import db
+
+# Upper ages (inclusive) of each bracket, as in ideal_fat_reference.csv; the last bracket is open-ended.
+AGE_BRACKET_BOUNDS = (25, 35, 45, 55, 65)
+FAT_HISTOGRAM_EDGES = tuple(range(0, 65, 5))
+
+
+def _to_float(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def _float_column(values) -> np.ndarray:
+    # NULLs become NaN, and so does any text /api/profile stored where a number belongs.
+    try:
+        return np.array(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        return np.array([_to_float(value) for value in values], dtype=np.float64)
+
+
+def bracket_labels(bounds=AGE_BRACKET_BOUNDS) -> list:
+    labels = [f'<={bounds[0]}']
+    labels += [f'{lo + 1}-{hi}' for lo, hi in zip(bounds, bounds[1:])]
+    return labels + [f'{bounds[-1] + 1}+']
+
+
+class CohortStats:
+    """Running sums for one (age bracket, gender) cohort."""
+
+    __slots__ = ('count', 'fat_sum', 'fat_sq_sum', 'fat_min', 'fat_max', 'histogram', 'water_sum', 'ideal_sum',
+                 'at_or_below_ideal', 'gap_sum', 'bmi_sum', 'total_reps_sum')
+
+    def __init__(self, bins: int):
+        self.count = 0
+        self.fat_sum = self.fat_sq_sum = self.water_sum = self.ideal_sum = self.gap_sum = 0.0
+        self.bmi_sum = self.total_reps_sum = 0.0
+        self.fat_min, self.fat_max = math.inf, -math.inf
+        self.at_or_below_ideal = 0
+        self.histogram = np.zeros(bins, dtype=np.int64)
+
+    def add(self, fat, water, ideal, bmi, total_reps, edges: np.ndarray):
+        self.count += len(fat)
+        self.fat_sum += float(fat.sum())
+        self.fat_sq_sum += float(np.dot(fat, fat))
+        self.fat_min = min(self.fat_min, float(fat.min()))
+        self.fat_max = max(self.fat_max, float(fat.max()))
+        # Values beyond the outer edges are counted in the first and last bins.
+        bins = np.clip(np.searchsorted(edges, fat, side='right') - 1, 0, len(self.histogram) - 1)
+        self.histogram += np.bincount(bins, minlength=len(self.histogram))
+        self.water_sum += float(water.sum())
+        self.ideal_sum += float(ideal.sum())
+        self.at_or_below_ideal += int(np.count_nonzero(fat <= ideal))
+        self.gap_sum += float((fat - ideal).sum())
+        self.bmi_sum += float(bmi.sum())
+        self.total_reps_sum += float(total_reps.sum())
+
+    def summary(self) -> dict:
+        n = self.count
+        mean = self.fat_sum / n
+        return {
+            'profiles': n,
+            'fat_pred': {
+                'mean': round(mean, 3),
+                'std': round(math.sqrt(max(self.fat_sq_sum / n - mean * mean, 0.0)), 3),
+                'min': round(self.fat_min, 3),
+                'max': round(self.fat_max, 3),
+                'histogram': self.histogram.tolist(),
+            },
+            'water_pred_mean': round(self.water_sum / n, 3),
+            'ideal_fat_mean': round(self.ideal_sum / n, 3),
+            'at_or_below_ideal': round(self.at_or_below_ideal / n, 4),
+            'mean_gap_to_ideal': round(self.gap_sum / n, 3),
+            'mean_bmi': round(self.bmi_sum / n, 3),
+            'mean_total_reps': round(self.total_reps_sum / n, 1),
+        }
+
+
+class CohortAnalytics:
+    """Per-bracket cache of cohort statistics, computed from the profiles table on demand.
+
+    ``get_pipeline`` returns the current ``PredictionPipeline``; a different
+    pipeline object than the one the cache was built with (the models were
+    reloaded) drops the cached cohort results. Cohorts with fewer than
+    ``min_cohort`` scored profiles, and exercises listed by fewer than
+    ``min_cohort`` profiles in a bracket, are left out of the results.
+    """
+
+    def __init__(self, pool: db.ConnectionPool, get_pipeline, bounds=AGE_BRACKET_BOUNDS, chunk_size: int = 5000,
+                 ttl: float = 60.0, min_cohort: int = 5, histogram_edges=FAT_HISTOGRAM_EDGES):
+        self.pool = pool
+        self.get_pipeline = get_pipeline
+        self.bounds = tuple(bounds)
+        self.labels = bracket_labels(self.bounds)
+        self.chunk_size = chunk_size
+        self.ttl = ttl
+        self.min_cohort = min_cohort
+        self.histogram_edges = np.asarray(histogram_edges, dtype=np.float64)
+        # (lower, upper] ages of each bracket, as the SQL filters them.
+        edges = (-math.inf,) + self.bounds + (math.inf,)
+        self._ranges = list(zip(edges, edges[1:]))
+        self._entries = {}
+        # Bumped by invalidate; a scan only stores its result if its bracket's
+        # version is unchanged, so a save during the scan isn't overwritten.
+        self._versions = [0] * len(self.labels)
+        self._pipeline = None
+        self._lock = threading.Lock()
+        # One scan at a time: concurrent cold reads wait for it and then hit the cache.
+        self._scan_lock = threading.Lock()
+        self.scans = 0
+        self.hits = 0
+        self.invalidations = 0
+
+    def bracket_of(self, age):
+        """Index of the bracket ``age`` falls in, or None if it isn't a number."""
+        try:
+            age = float(age)
+        except (TypeError, ValueError):
+            return None
+        if math.isnan(age):
+            return None
+        return int(np.searchsorted(self.bounds, age, side='left'))
+
+    def invalidate(self, *ages):
+        """Drop the cached brackets containing ``ages`` (e.g. a profile's previous and new age)."""
+        brackets = {self.bracket_of(age) for age in ages} - {None}
+        self._drop(('cohorts', 'exercises'), brackets)
+
+    def _drop(self, kinds: tuple, brackets):
+        with self._lock:
+            for bracket in brackets:
+                self._versions[bracket] += 1
+                for kind in kinds:
+                    self._entries.pop((kind, bracket), None)
+            self.invalidations += len(brackets)
+
+    def _selected(self, brackets) -> list:
+        if brackets is None:
+            return list(range(len(self.labels)))
+        unknown = [label for label in brackets if label not in self.labels]
+        if unknown:
+            raise ValueError(f'unknown age bracket(s) {", ".join(unknown)}; expected one of {", ".join(self.labels)}')
+        return [self.labels.index(label) for label in brackets]
+
+    def _cached(self, kind: str, brackets: list, compute) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            found = {b: self._entries.get((kind, b)) for b in brackets}
+            found = {b: entry[1] for b, entry in found.items() if entry is not None and entry[0] > now}
+            self.hits += len(found)
+        missing = [b for b in brackets if b not in found]
+        if missing:
+            with self._scan_lock:
+                with self._lock:
+                    for b in missing:
+                        entry = self._entries.get((kind, b))
+                        if entry is not None and entry[0] > time.monotonic():
+                            found[b] = entry[1]
+                    missing = [b for b in missing if b not in found]
+                    versions = {b: self._versions[b] for b in missing}
+                if missing:
+                    computed = compute(missing)
+                    expires = time.monotonic() + self.ttl
+                    with self._lock:
+                        for b, value in computed.items():
+                            if self._versions[b] == versions[b]:
+                                self._entries[(kind, b)] = (expires, value)
+                    found.update(computed)
+        return found
+
+    def _scan_ranges(self, missing: list) -> list:
+        # A cold cache is filled by one pass over every profile rather than one per bracket.
+        if len(missing) == len(self.labels):
+            return [(-math.inf, math.inf)]
+        return [self._ranges[b] for b in missing]
+
+    # -------- Predicted fat% by bracket and gender --------
+    def cohorts(self, brackets=None) -> dict:
+        pipeline = self.get_pipeline()
+        if pipeline is not self._pipeline:
+            if self._pipeline is not None:
+                # Reloaded models: every bracket's predictions are stale; exercise counts aren't.
+                self._drop(('cohorts',), range(len(self.labels)))
+            self._pipeline = pipeline
+        selected = self._selected(brackets)
+        stats = self._cached('cohorts', selected, lambda missing: self._score(pipeline, missing))
+        rows = []
+        skipped = suppressed = 0
+        for b in selected:
+            skipped += stats[b]['skipped']
+            for gender, summary in sorted(stats[b]['genders'].items()):
+                if summary['profiles'] < self.min_cohort:
+                    suppressed += summary['profiles']
+                    continue
+                rows.append({'bracket': self.labels[b], 'gender': gender, **summary})
+        return {
+            'cohorts': rows,
+            'histogram_edges': self.histogram_edges.tolist(),
+            'skipped': skipped,
+            'suppressed': suppressed,
+        }
+
+    def _score(self, pipeline, missing: list) -> dict:
+        self.scans += 1
+        bins = len(self.histogram_edges) - 1
+        accumulators = {b: {} for b in missing}
+        skipped = dict.fromkeys(missing, 0)
+        intensity = json.dumps(pipeline.exercise_intensity)
+        conn = self.pool.acquire()
+        try:
+            for lo, hi in self._scan_ranges(missing):
+                # Plain tuples rather than sqlite3.Row: the chunk is transposed into columns right away.
+                cursor = conn.cursor()
+                cursor.row_factory = None
+                cursor.execute(db.SELECT_COHORT_PROFILES, (intensity, lo, hi))
+                while True:
+                    rows = cursor.fetchmany(self.chunk_size)
+                    if not rows:
+                        break
+                    self._score_chunk(pipeline, rows, accumulators, skipped, bins)
+        finally:
+            self.pool.release(conn)
+        return {
+            b: {'skipped': skipped[b], 'genders': {g: acc.summary() for g, acc in accumulators[b].items()}}
+            for b in missing
+        }
+
+    def _score_chunk(self, pipeline, rows: list, accumulators: dict, skipped: dict, bins: int):
+        fields = list(zip(*rows))
+        age, weight, height, duration, frequency, total_reps = (
+            _float_column(fields[idx]) for idx in (0, 2, 3, 4, 5, 7))
+        genders = np.array(fields[1], dtype=object)
+        bracket = np.searchsorted(self.bounds, age, side='left')
+        # Profiles /predict would reject: missing, non-numeric, non-finite or
+        # non-positive measurements, no gender, or an exercise plan kept as an
+        # unparseable legacy blob.
+        valid = (np.isfinite(age) & np.isfinite(duration) & np.isfinite(frequency)
+                 & np.isfinite(weight) & np.isfinite(height) & np.isfinite(total_reps)
+                 & (weight > 0) & (height > 0) & (genders != None)  # noqa: E711
+                 & ~np.array(fields[6], dtype=bool))
+        for b in np.unique(bracket[~valid]):
+            if int(b) in skipped:
+                skipped[int(b)] += int(np.count_nonzero(~valid & (bracket == b)))
+        if not valid.any():
+            return
+        age, weight, height, duration, frequency, total_reps, genders, bracket = (
+            column[valid] for column in (age, weight, height, duration, frequency, total_reps, genders, bracket))
+        bmi = weight / (height * height)
+        columns = {
+            'Age': age, 'Gender': genders, 'Weight (kg)': weight, 'Height (m)': height, 'BMI': bmi,
+            'Session_Duration (hours)': duration, 'Workout_Frequency (days/week)': frequency,
+            'Total_Reps': total_reps,
+        }
+        fat, water = pipeline.predict_columns(columns, len(age), {})
+        fat, water = np.asarray(fat, dtype=np.float64), np.asarray(water, dtype=np.float64)
+        ideal = pipeline.ideal_fat_table.lookup_many(age, genders).astype(np.float64)
+        # Cohorts are keyed by lower-cased gender, so 'Male' and 'male' are one cohort.
+        distinct, inverse = np.unique(genders.astype(str), return_inverse=True)
+        keys = np.array([g.lower() for g in distinct.tolist()], dtype=object)[inverse]
+        for b in np.unique(bracket):
+            b = int(b)
+            if b not in accumulators:
+                continue
+            in_bracket = bracket == b
+            for gender in np.unique(keys[in_bracket]):
+                mask = in_bracket & (keys == gender)
+                acc = accumulators[b].get(gender)
+                if acc is None:
+                    acc = accumulators[b][gender] = CohortStats(bins)
+                acc.add(fat[mask], water[mask], ideal[mask], bmi[mask], total_reps[mask], self.histogram_edges)
+
+    # -------- Most common exercises --------
+    def exercises(self, limit: int = 10, brackets=None) -> dict:
+        selected = self._selected(brackets)
+        per_bracket = self._cached('exercises', selected, self._count_exercises)
+        totals = {}
+        for b in selected:
+            for name, (profiles, reps, sets) in per_bracket[b].items():
+                total = totals.setdefault(name, [0, 0.0, 0.0])
+                total[0] += profiles
+                total[1] += reps
+                total[2] += sets
+        ranked = sorted(totals.items(), key=lambda item: (-item[1][0], item[0]))[:limit]
+        return {'exercises': [
+            {'exercise': name, 'profiles': profiles, 'avg_reps': round(reps / profiles, 2),
+             'avg_sets': round(sets / profiles, 2)}
+            for name, (profiles, reps, sets) in ranked
+        ]}
+
+    def _count_exercises(self, missing: list) -> dict:
+        self.scans += 1
+        counts = {b: {} for b in missing}
+        conn = self.pool.acquire()
+        try:
+            for b in missing:
+                lo, hi = self._ranges[b]
+                for row in conn.execute(db.SELECT_COHORT_EXERCISES, (lo, hi, self.min_cohort)):
+                    counts[b][row['exercise']] = (row['profiles'], row['reps'] or 0, row['sets'] or 0)
+        finally:
+            self.pool.release(conn)
+        return counts
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'cached_entries': len(self._entries),
+                'hits': self.hits,
+                'scans': self.scans,
+                'invalidations': self.invalidations,
+            }
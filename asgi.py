@@ -0,0 +1,357 @@
+"""Async serving mode for the Flask app:  uvicorn asgi:app --workers 4
+
+/predict, /predict/batch (JSON arrays) and /api/profile are handled natively:
+model inference runs on a bounded thread pool and SQLite goes through
+``db.AsyncDB``; their bodies are refused with a 413 past ``ASGI_MAX_BODY_BYTES``.
+Every other route (pages, /exercises, auth, NDJSON batches) is passed to the
+Flask app on a bounded pool of WSGI threads, where password hashing already
+runs on its own bounded process pool. Those requests read their body from the
+connection as the app consumes it, so NDJSON uploads stream rather than buffer. At most
+``ASGI_MAX_PENDING`` requests are in progress at once; past that, requests get
+an immediate 503 with Retry-After instead of queueing without limit.
+"""
+import asyncio
+import contextvars
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from itsdangerous import BadSignature
+from werkzeug.http import parse_cookie
+
+import db
+import flask_app
+import metrics
+from model_registry import ModelUnavailable
+
+MAX_PENDING = int(os.environ.get('ASGI_MAX_PENDING', '256'))
+MAX_BODY_BYTES = int(os.environ.get('ASGI_MAX_BODY_BYTES', str(16 * 1024 * 1024)))
+# With micro-batching on, each waiting request holds a model thread, so allow a full batch.
+_default_model_workers = os.cpu_count() or 1
+if flask_app.micro_batcher is not None:
+    _default_model_workers = max(_default_model_workers, flask_app.micro_batcher.max_rows)
+model_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get('ASGI_MODEL_WORKERS', str(_default_model_workers))), thread_name_prefix='asgi-model'
+)
+wsgi_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get('ASGI_WSGI_WORKERS', '16')), thread_name_prefix='asgi-wsgi'
+)
+async_db = db.AsyncDB(flask_app.db_pool, workers=int(os.environ.get('ASGI_DB_WORKERS', '8')))
+
+
+class Admission:
+    """Counts requests in progress and refuses new ones past ``max_pending``."""
+
+    def __init__(self, max_pending: int):
+        self.max_pending = max_pending
+        self.pending = 0
+        self.rejected = 0
+
+    def try_enter(self) -> bool:
+        # Only touched from the event loop thread, so no lock is needed.
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            return False
+        self.pending += 1
+        return True
+
+    def leave(self):
+        self.pending -= 1
+
+
+admission = Admission(MAX_PENDING)
+
+
+class BodyTooLarge(Exception):
+    """Raised when a natively handled request body passes ``MAX_BODY_BYTES``."""
+
+
+async def _read_body(receive, limit: int = None) -> bytes:
+    limit = MAX_BODY_BYTES if limit is None else limit
+    chunks = []
+    size = 0
+    while True:
+        message = await receive()
+        chunk = message.get('body', b'')
+        size += len(chunk)
+        if size > limit:
+            raise BodyTooLarge(f'Request body is over the limit of {limit} bytes')
+        chunks.append(chunk)
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+
+class _ReceiveStream(io.RawIOBase):
+    """``wsgi.input`` that pulls the ASGI body from the event loop as the WSGI app reads it."""
+
+    def __init__(self, receive, loop):
+        self._receive = receive
+        self._loop = loop
+        self._buffer = b''
+        self._more = True
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        # Runs on a WSGI thread; the event loop is free to deliver the next message.
+        while not self._buffer and self._more:
+            message = asyncio.run_coroutine_threadsafe(self._receive(), self._loop).result()
+            if message['type'] == 'http.disconnect':
+                self._more = False
+                break
+            self._buffer = message.get('body', b'')
+            self._more = message.get('more_body', False)
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        return n
+
+
+def _header(scope, name: bytes) -> str:
+    for key, value in scope['headers']:
+        if key == name:
+            return value.decode('latin-1')
+    return ''
+
+
+async def _send_json(send, status: int, payload, headers=()):
+    # Same encoding as Flask's jsonify outside debug mode.
+    body = (flask_app.app.json.dumps(payload, separators=(',', ':')) + '\n').encode()
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode()), *headers],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def _session_user_id(scope):
+    # Reads the Flask session cookie the way the app's session interface does.
+    app = flask_app.app
+    value = parse_cookie(_header(scope, b'cookie')).get(app.config['SESSION_COOKIE_NAME'])
+    if not value:
+        return None
+    if flask_app.session_store is not None:
+        data = await async_db.run(_load_session, value)
+        return None if data is None else data.get('user_id')
+    serializer = app.session_interface.get_signing_serializer(app)
+    try:
+        data = serializer.loads(value, max_age=int(app.permanent_session_lifetime.total_seconds()))
+    except BadSignature:
+        return None
+    return data.get('user_id')
+
+
+def _load_session(conn, sid):
+    return flask_app.app.session_interface.load_data(sid, conn)
+
+
+def _forget_user(conn, user_id):
+    flask_app.session_store.forget_user(user_id, conn)
+
+
+def _run_predict(data):
+    return flask_app.get_pipeline().run(data)
+
+
+def _run_predict_batch(payloads):
+    return flask_app.get_pipeline().run_batch(payloads)
+
+
+async def predict(scope, receive, send):
+    try:
+        data = json.loads(await _read_body(receive) or b'null') or {}
+    except BodyTooLarge as exc:
+        return await _send_json(send, 413, {'error': str(exc)})
+    except ValueError as exc:
+        return await _send_json(send, 400, {'error': f'invalid JSON: {exc}'})
+    loop = asyncio.get_running_loop()
+    try:
+        result, timings = await loop.run_in_executor(model_executor, _run_predict, data)
+    except ModelUnavailable as exc:
+        return await _send_json(send, 503, {'error': str(exc)})
+    except Exception as exc:
+        return await _send_json(send, 400, {'error': str(exc)})
+    metrics.observe_stages('predict', timings)
+    if flask_app.history_writer is not None:
+        user_id = await _session_user_id(scope)
+        if user_id is not None:
+            flask_app.history_writer.record(user_id, result)
+    timing = flask_app.server_timing_header(timings).encode()
+    await _send_json(send, 200, result, [(b'server-timing', timing)])
+
+
+async def predict_batch(scope, receive, send):
+    try:
+        data = json.loads(await _read_body(receive) or b'null')
+    except BodyTooLarge as exc:
+        return await _send_json(send, 413, {'error': str(exc)})
+    except ValueError:
+        data = None
+    if not isinstance(data, list):
+        return await _send_json(send, 400, {'error': 'Expected a JSON array of prediction payloads'})
+    if len(data) > flask_app.BATCH_MAX_ROWS:
+        return await _send_json(send, 413, {'error': flask_app.batch_too_large_message(len(data))})
+    loop = asyncio.get_running_loop()
+    try:
+        results, timings = await loop.run_in_executor(model_executor, _run_predict_batch, data)
+    except ModelUnavailable as exc:
+        return await _send_json(send, 503, {'error': str(exc)})
+    metrics.observe_stages('batch', timings)
+    timing = flask_app.server_timing_header(timings).encode()
+    await _send_json(send, 200, results, [(b'server-timing', timing)])
+
+
+async def profile(scope, receive, send):
+    user_id = await _session_user_id(scope)
+    if user_id is None:
+        return await _send_json(send, 401, {'error': 'Not authenticated'})
+    if scope['method'] == 'GET':
+        return await _send_json(send, 200, await async_db.run(db.load_profile, user_id) or {})
+    try:
+        data = json.loads(await _read_body(receive) or b'null') or {}
+    except BodyTooLarge as exc:
+        return await _send_json(send, 413, {'error': str(exc)})
+    except ValueError as exc:
+        return await _send_json(send, 400, {'error': f'invalid JSON: {exc}'})
+    fields = {field: data.get(field) for field in db.PROFILE_FIELDS}
+    try:
+        previous_age = await async_db.run(db.save_profile, user_id, fields, data.get('exercises_json'))
+    except ValueError as exc:
+        return await _send_json(send, 400, {'error': str(exc)})
+    flask_app.cohort_analytics.invalidate(previous_age, fields['age'])
+    if 'name' in data:
+        await async_db.run(db.update_user_name, user_id, data['name'] or '')
+        if flask_app.session_store is not None:
+            await async_db.run(_forget_user, user_id)
+    await _send_json(send, 200, {'ok': True})
+
+
+def _wsgi_environ(scope, body) -> dict:
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode().decode('latin-1'),
+        'PATH_INFO': scope['path'].encode().decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        # The server has already undone any chunked encoding; read to the end.
+        'wsgi.input_terminated': True,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    if scope.get('client'):
+        environ['REMOTE_ADDR'], environ['REMOTE_PORT'] = scope['client'][0], str(scope['client'][1])
+    for name, value in scope['headers']:
+        key = name.decode('latin-1').upper().replace('-', '_')
+        if key not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            key = 'HTTP_' + key
+        value = value.decode('latin-1')
+        environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+
+async def call_flask(scope, receive, send):
+    loop = asyncio.get_running_loop()
+    environ = _wsgi_environ(scope, io.BufferedReader(_ReceiveStream(receive, loop)))
+    response = {}
+
+    def start_response(status, headers, exc_info=None):
+        response['status'] = int(status.split(' ', 1)[0])
+        response['headers'] = [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers]
+
+    def start():
+        result = flask_app.app(environ, start_response)
+        return result, iter(result)
+
+    # Every step runs in the same copied context, so Flask's context variables
+    # (e.g. for stream_with_context) survive hopping between pool threads.
+    context = contextvars.copy_context()
+    result, chunks = await loop.run_in_executor(wsgi_executor, context.run, start)
+    try:
+        await send({'type': 'http.response.start', 'status': response['status'], 'headers': response['headers']})
+        while True:
+            chunk = await loop.run_in_executor(wsgi_executor, context.run, next, chunks, None)
+            if chunk is None:
+                break
+            if chunk:
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        if hasattr(result, 'close'):
+            await loop.run_in_executor(wsgi_executor, context.run, result.close)
+
+
+ROUTES = {
+    ('POST', '/predict'): predict,
+    ('GET', '/api/profile'): profile,
+    ('POST', '/api/profile'): profile,
+}
+
+
+def _route(scope):
+    if scope['method'] == 'POST' and scope['path'] == '/predict/batch':
+        # NDJSON bodies stream through the Flask route.
+        if not _header(scope, b'content-type').startswith('application/x-ndjson'):
+            return predict_batch
+    return ROUTES.get((scope['method'], scope['path']), call_flask)
+
+
+async def _timed(handler, scope, receive, send):
+    # Flask times the routes it serves itself; this covers the native ones.
+    start = time.perf_counter()
+    status = []
+
+    async def send_and_record(message):
+        if message['type'] == 'http.response.start':
+            status.append(message['status'])
+        await send(message)
+
+    try:
+        await handler(scope, receive, send_and_record)
+    finally:
+        metrics.HTTP_REQUEST_SECONDS.labels(scope['path'], scope['method'], str(status[0] if status else 500)).observe(
+            time.perf_counter() - start
+        )
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            model_executor.shutdown(wait=False)
+            wsgi_executor.shutdown(wait=False)
+            async_db.shutdown()
+            flask_app.password_hasher.shutdown()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await _lifespan(receive, send)
+    if scope['type'] != 'http':
+        return
+    if not admission.try_enter():
+        return await _send_json(send, 503, {'error': 'Server is busy, please try again.'}, [(b'retry-after', b'1')])
+    try:
+        handler = _route(scope)
+        if handler is call_flask or not metrics.ENABLED:
+            await handler(scope, receive, send)
+        else:
+            await _timed(handler, scope, receive, send)
+    finally:
+        admission.leave()
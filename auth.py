@@ -0,0 +1,135 @@
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+import metrics
+
+_HASH_SECONDS = metrics.PASSWORD_HASH_SECONDS.labels('hash')
+_VERIFY_SECONDS = metrics.PASSWORD_HASH_SECONDS.labels('verify')
+
+
+class HasherBusy(Exception):
+    """Raised when every hashing slot stays taken for longer than the queue timeout."""
+
+
+class PasswordHasher:
+    """Password hashing and verification on a bounded process pool.
+
+    ``method`` is a werkzeug method string (``scrypt``, ``scrypt:16384:8:1``,
+    ``pbkdf2:sha256`` ...); ``iterations`` sets the pbkdf2 round count. With
+    ``workers=0`` hashing runs inline on the calling thread. At most
+    ``max_pending`` hashes are queued or running at once; further callers wait
+    up to ``queue_timeout`` seconds and then get ``HasherBusy``.
+    """
+
+    def __init__(self, method: str = 'scrypt', iterations: int = None, workers: int = 2,
+                 max_pending: int = None, queue_timeout: float = 5.0):
+        if iterations:
+            if method == 'pbkdf2':
+                method = 'pbkdf2:sha256'
+            if not method.startswith('pbkdf2:'):
+                raise ValueError('iterations only apply to the pbkdf2 method')
+            method = f'{method}:{iterations}'
+        self.method = method
+        self.workers = workers
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(max_pending or max(workers, 1) * 4)
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._hash_prefix = None
+
+    def _pool(self) -> ProcessPoolExecutor:
+        # Created on first use, so each forked server worker gets its own pool.
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    def _run(self, fn, *args):
+        if self.workers <= 0:
+            return fn(*args)
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            raise HasherBusy('password hashing queue is full')
+        try:
+            return self._pool().submit(fn, *args).result()
+        finally:
+            self._slots.release()
+
+    def hash(self, password: str) -> str:
+        start = time.perf_counter()
+        try:
+            return self._run(generate_password_hash, password, self.method)
+        finally:
+            _HASH_SECONDS.observe(time.perf_counter() - start)
+
+    def verify(self, pwhash: str, password: str) -> bool:
+        start = time.perf_counter()
+        try:
+            return self._run(check_password_hash, pwhash, password)
+        finally:
+            _VERIFY_SECONDS.observe(time.perf_counter() - start)
+
+    def needs_rehash(self, pwhash: str) -> bool:
+        # werkzeug stores the fully expanded method ("scrypt:32768:8:1$salt$hash"),
+        # so compare against a reference hash made with the current settings.
+        if self._hash_prefix is None:
+            self._hash_prefix = generate_password_hash('', self.method).split('$', 1)[0]
+        return pwhash.split('$', 1)[0] != self._hash_prefix
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+
+class LoginRateLimiter:
+    """Sliding-window limit on failed sign-in attempts per key (email or IP).
+
+    Keys that hit ``max_failures`` within ``window`` seconds are refused until
+    their oldest failure ages out. Only the ``max_keys`` most recently failing
+    keys are tracked.
+    """
+
+    def __init__(self, max_failures: int = 5, window: float = 300.0, max_keys: int = 100_000):
+        self.max_failures = max_failures
+        self.window = window
+        self.max_keys = max_keys
+        self._failures = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _recent(self, key, now: float):
+        attempts = self._failures.get(key)
+        if attempts is None:
+            return None
+        while attempts and attempts[0] <= now - self.window:
+            attempts.popleft()
+        if not attempts:
+            del self._failures[key]
+            return None
+        return attempts
+
+    def allowed(self, key) -> bool:
+        if self.max_failures <= 0:
+            return True
+        with self._lock:
+            attempts = self._recent(key, time.monotonic())
+            return attempts is None or len(attempts) < self.max_failures
+
+    def record_failure(self, key):
+        now = time.monotonic()
+        with self._lock:
+            attempts = self._recent(key, now)
+            if attempts is None:
+                attempts = self._failures[key] = deque()
+            attempts.append(now)
+            self._failures.move_to_end(key)
+            while len(self._failures) > self.max_keys:
+                self._failures.popitem(last=False)
+
+    def reset(self, key):
+        with self._lock:
+            self._failures.pop(key, None)
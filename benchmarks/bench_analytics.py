@@ -0,0 +1,122 @@
+"""Cohort analytics at scale: cold scan, cached reads, and the rescan after a profile save.
+
+Seeds --profiles synthetic profiles with exercise plans, then times
+/api/analytics/cohorts and /api/analytics/exercises cold (one pass over every
+profile), warm (cache hits), and after a profile save (only the one or two
+touched brackets are rescanned). For comparison, scoring profile by profile
+through /predict's pipeline is timed on a sample and extrapolated to the full
+table. The Python heap peak (tracemalloc) of the cold scan shows that the rows are never
+all held at once.
+
+Run from the repository root:  python -m benchmarks.bench_analytics --profiles 300000
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+import warnings
+
+from benchmarks.synthetic import load_exercise_names
+
+warnings.filterwarnings('ignore')
+_tmp = tempfile.mkdtemp()
+os.environ.update(APP_DB_PATH=os.path.join(_tmp, 'bench.db'), PREDICTION_HISTORY='0', PASSWORD_HASH_WORKERS='0',
+                  PASSWORD_HASH_METHOD='pbkdf2', PASSWORD_HASH_ITERATIONS='1000')
+if not os.path.exists(os.environ.get('MODEL_WATER_PATH', 'water_model.pkl')):
+    from benchmarks.synthetic import train_standin_water_model
+
+    os.environ['MODEL_WATER_PATH'] = train_standin_water_model(os.path.join(_tmp, 'water_model.pkl'))
+
+import db  # noqa: E402
+import flask_app  # noqa: E402
+
+
+def _seed(n: int, seed: int = 0):
+    rng = random.Random(seed)
+    names = load_exercise_names()
+    conn = flask_app.db_pool.acquire()
+    try:
+        with conn:
+            conn.executemany(db.INSERT_USER, ((f'user{i}@example.com', 'x', '') for i in range(n)))
+            user_ids = [row[0] for row in conn.execute('SELECT id FROM users ORDER BY id')]
+            conn.executemany(db.REPLACE_PROFILE, (
+                (uid, rng.randint(18, 70), rng.choice(['Male', 'Female']), round(rng.uniform(45, 120), 1),
+                 round(rng.uniform(1.5, 2.0), 2), round(rng.uniform(0.5, 3.0), 1), rng.randint(1, 7), None)
+                for uid in user_ids))
+            conn.executemany(db.INSERT_PROFILE_EXERCISE, (
+                (uid, position, name, rng.randint(1, 100), rng.randint(1, 10))
+                for uid in user_ids for position, name in enumerate(rng.sample(names, rng.randint(1, 6)))))
+    finally:
+        flask_app.db_pool.release(conn)
+
+
+def _ms(fn) -> float:
+    start = time.perf_counter()
+    fn()
+    return (time.perf_counter() - start) * 1000
+
+
+def _per_profile_seconds(sample: int) -> float:
+    pipeline = flask_app.get_pipeline()
+    conn = flask_app.db_pool.acquire()
+    try:
+        user_ids = [row[0] for row in conn.execute('SELECT user_id FROM profiles LIMIT ?', (sample,))]
+        start = time.perf_counter()
+        for user_id in user_ids:
+            profile = db.load_profile(conn, user_id)
+            profile['exercises'] = json.loads(profile.pop('exercises_json') or '{}')
+            pipeline.run(profile)
+        return (time.perf_counter() - start) / len(user_ids)
+    finally:
+        flask_app.db_pool.release(conn)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--profiles', type=int, default=300000)
+    parser.add_argument('--sample', type=int, default=2000, help='profiles scored one by one for the comparison')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    _seed(args.profiles)
+    print(f'seeded {args.profiles:,} profiles in {time.perf_counter() - start:.1f} s')
+    client = flask_app.app.test_client()
+    client.post('/signup', data={'email': 'coach@example.com', 'password': 'pw'})
+    flask_app.get_pipeline()
+
+    analytics = flask_app.cohort_analytics
+    cold = _ms(lambda: client.get('/api/analytics/cohorts'))
+    warm = min(_ms(lambda: client.get('/api/analytics/cohorts')) for _ in range(20))
+    profile = {'age': 40, 'gender': 'Male', 'weight': 80, 'height': 1.8, 'session_duration': 1, 'frequency': 3,
+               'exercises_json': '{"Push-ups":{"Reps":10,"Sets":3}}'}
+    client.post('/api/profile', json=profile)
+    one_bracket = _ms(lambda: client.get('/api/analytics/cohorts'))
+    client.post('/api/profile', json=dict(profile, age=60))
+    two_brackets = _ms(lambda: client.get('/api/analytics/cohorts'))
+    print(f'GET /api/analytics/cohorts    cold {cold:9.1f} ms   warm {warm:7.2f} ms'
+          f'   after a save: 1 bracket {one_bracket:8.1f} ms, 2 brackets {two_brackets:8.1f} ms')
+    # Traced separately: tracemalloc slows the scan down.
+    analytics.invalidate(*analytics.bounds, analytics.bounds[-1] + 1)
+    tracemalloc.start()
+    client.get('/api/analytics/cohorts')
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f'  cold scan Python heap peak {peak / 2 ** 20:.1f} MiB ({analytics.chunk_size} profiles per chunk)')
+
+    cold = _ms(lambda: client.get('/api/analytics/exercises'))
+    warm = min(_ms(lambda: client.get('/api/analytics/exercises')) for _ in range(20))
+    client.post('/api/profile', json=dict(profile, age=30))
+    after = _ms(lambda: client.get('/api/analytics/exercises'))
+    print(f'GET /api/analytics/exercises  cold {cold:9.1f} ms   warm {warm:7.2f} ms   after a save: {after:8.1f} ms')
+
+    per_profile = _per_profile_seconds(args.sample)
+    print(f'profile-by-profile through the /predict pipeline: {per_profile * 1e6:.0f} us/profile,'
+          f' about {per_profile * args.profiles:.1f} s for all {args.profiles:,}')
+    print(analytics.stats())
+
+
+if __name__ == '__main__':
+    main()
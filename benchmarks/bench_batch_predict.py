@@ -0,0 +1,49 @@
+"""Rows/sec of /predict (one request per user) against /predict/batch.
+
+Run from the repository root:  python -m benchmarks.bench_batch_predict --rows 2000
+"""
+import argparse
+import time
+import warnings
+
+from benchmarks.synthetic import make_payloads
+
+warnings.filterwarnings('ignore')
+
+import flask_app  # noqa: E402
+
+
+def _rate(rows: int, seconds: float) -> str:
+    return f'{rows / seconds:>12,.0f} rows/s  ({seconds * 1000:.1f} ms total)'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=2000)
+    args = parser.parse_args()
+
+    payloads = make_payloads(args.rows)
+    client = flask_app.app.test_client()
+
+    start = time.perf_counter()
+    for payload in payloads:
+        client.post('/predict', json=payload)
+    single_http = time.perf_counter() - start
+
+    start = time.perf_counter()
+    client.post('/predict/batch', json=payloads)
+    batch_http = time.perf_counter() - start
+
+    start = time.perf_counter()
+    flask_app.predict_batch(payloads)
+    batch_api = time.perf_counter() - start
+
+    print(f'rows: {args.rows}')
+    print(f'POST /predict x{args.rows:<8} {_rate(args.rows, single_http)}')
+    print(f'POST /predict/batch      {_rate(args.rows, batch_http)}')
+    print(f'predict_batch() API      {_rate(args.rows, batch_api)}')
+    print(f'batch speedup over single-row HTTP: {single_http / batch_http:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
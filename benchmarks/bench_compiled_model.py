@@ -0,0 +1,136 @@
+"""Compiled .npz models against the joblib pickles: startup, memory, per-row latency.
+
+Compiles each model (checking it against model.predict), then starts one fresh
+process per format that imports what it needs and loads the models, and reads
+its import+load time and peak RSS (VmHWM, so Linux only). Per-row latency is timed in this process for
+single-row calls and 1000-row batches on the same encoded arrays the serving
+pipeline passes the models. Without water_model.pkl a stand-in is trained; with
+--forest a random forest fitted on synthetic users is added, to exercise the
+tree evaluator.
+
+Run from the repository root:  python -m benchmarks.bench_compiled_model --forest
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+
+import joblib
+import numpy as np
+
+from benchmarks.synthetic import BASE_DIR, make_payloads, train_standin_water_model
+from compiled_model import check_compiled, compile_model, save
+from feature_encoder import FeatureEncoder
+from prediction import derive_features, parse_payload
+
+warnings.filterwarnings('ignore')
+
+LOADER = r'''
+import json, sys, time
+start = time.perf_counter()
+if sys.argv[1] == 'pickle':
+    import joblib
+    models = [joblib.load(path) for path in sys.argv[2:]]
+else:
+    from compiled_model import load_compiled
+    models = [load_compiled(path) for path in sys.argv[2:]]
+print(json.dumps({
+    'startup_ms': (time.perf_counter() - start) * 1000,
+    # VmHWM starts afresh at exec; ru_maxrss would include the parent's peak from before the fork.
+    'max_rss_mib': int(next(l for l in open('/proc/self/status') if l.startswith('VmHWM')).split()[1]) / 1024,
+    'sklearn_imported': 'sklearn' in sys.modules, 'pandas_imported': 'pandas' in sys.modules,
+}))
+'''
+
+
+def _startup(fmt: str, paths: list, runs: int) -> dict:
+    results = [
+        json.loads(subprocess.run([sys.executable, '-c', LOADER, fmt] + paths, capture_output=True, text=True,
+                                  cwd=BASE_DIR, check=True).stdout)
+        for _ in range(runs)
+    ]
+    summary = {key: statistics.median(r[key] for r in results) for key in ('startup_ms', 'max_rss_mib')}
+    summary.update(sklearn_imported=results[0]['sklearn_imported'], pandas_imported=results[0]['pandas_imported'])
+    return summary
+
+
+def _per_row_us(fn, X, repeat: int) -> float:
+    fn(X)
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(X)
+        samples.append((time.perf_counter() - start) / len(X) * 1e6)
+    return statistics.median(samples)
+
+
+def _features(n: int, seed: int = 0) -> list:
+    # Unknown exercises count at full intensity; only the features' shape matters here.
+    return [derive_features(parse_payload(payload), {}) for payload in make_payloads(n, seed)]
+
+
+def _train_forest(columns, path: str) -> str:
+    from sklearn.ensemble import RandomForestRegressor
+
+    encoder = FeatureEncoder(columns)
+    X = encoder.encode_many(_features(2000, seed=1))
+    y = 0.2 * X[:, encoder.columns.index('BMI')] + np.random.default_rng(1).normal(0, 1, len(X))
+    forest = RandomForestRegressor(n_estimators=50, max_depth=10, random_state=0).fit(X, y)
+    forest.feature_names_in_ = np.array(columns, dtype=object)
+    joblib.dump(forest, path)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--forest', action='store_true', help='also benchmark a synthetic random forest')
+    parser.add_argument('--runs', type=int, default=5, help='fresh processes per format for startup and memory')
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    paths = [os.path.join(BASE_DIR, 'fat_model.pkl')]
+    water_path = os.path.join(BASE_DIR, 'water_model.pkl')
+    if not os.path.exists(water_path):
+        water_path = train_standin_water_model(os.path.join(tmp, 'water_model.pkl'))
+        print('water_model.pkl not found: using a stand-in linear model')
+    paths.append(water_path)
+    if args.forest:
+        columns = list(joblib.load(water_path).feature_names_in_)
+        paths.append(_train_forest(columns, os.path.join(tmp, 'forest_model.pkl')))
+
+    features = _features(1000)
+    compiled_paths = []
+    for path in paths:
+        model = joblib.load(path)
+        compiled = compile_model(model)
+        max_diff = check_compiled(model, compiled)
+        compiled_path = os.path.join(tmp, os.path.splitext(os.path.basename(path))[0] + '.npz')
+        save(compiled, compiled_path)
+        compiled_paths.append(compiled_path)
+
+        encoder = FeatureEncoder.for_model(model)
+        batch = encoder.encode_many(features)
+        single = batch[:1]
+        print(f'\n{os.path.basename(path)} ({compiled.kind}): pickle {os.path.getsize(path) / 1024:.1f} KiB,'
+              f' compiled {os.path.getsize(compiled_path) / 1024:.1f} KiB, max |diff| {max_diff:.3g}')
+        for label, X in (('single row', single), (f'batch of {len(batch)}', batch)):
+            before = _per_row_us(model.predict, X, args.repeat)
+            after = _per_row_us(compiled.predict, X, args.repeat)
+            print(f'  {label:<16} pickle {before:>9.2f} us/row   compiled {after:>9.2f} us/row'
+                  f'   {before / after:5.1f}x')
+
+    print(f'\nstartup (import + load {len(paths)} models, median of {args.runs} processes):')
+    for label, fmt, fmt_paths in (('pickle', 'pickle', paths), ('compiled', 'compiled', compiled_paths)):
+        stats = _startup(fmt, fmt_paths, args.runs)
+        print(f'  {label:<9} {stats["startup_ms"]:>8.1f} ms   peak RSS {stats["max_rss_mib"]:>6.1f} MiB'
+              f'   sklearn imported: {stats["sklearn_imported"]}   pandas imported: {stats["pandas_imported"]}')
+
+
+if __name__ == '__main__':
+    main()
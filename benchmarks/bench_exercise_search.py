@@ -0,0 +1,68 @@
+"""ExerciseCatalog search latency at 10k and 100k entries vs a linear substring scan.
+
+Synthetic names combine modifiers, equipment and the real exercise names, so
+prefixes and typos hit realistically sized posting lists.
+
+Run from the repository root:  python -m benchmarks.bench_exercise_search
+"""
+import argparse
+import random
+import time
+
+from benchmarks.synthetic import load_exercise_names
+from exercise_catalog import ExerciseCatalog
+
+MODIFIERS = ['Incline', 'Decline', 'Seated', 'Standing', 'Single-Arm', 'Single-Leg', 'Wide-Grip', 'Close-Grip',
+             'Paused', 'Tempo', 'Banded', 'Weighted', 'Isometric', 'Explosive', 'Alternating', 'Reverse']
+EQUIPMENT = ['Barbell', 'Dumbbell', 'Kettlebell', 'Cable', 'Machine', 'Smith Machine', 'Band', 'Bodyweight']
+QUERIES = ['dead', 'bench', 'press', 'squat', 'incline dumb', 'push-up', 'sqaut', 'deadlfit', 'kettlebel swing',
+           'tricep extention', 'lunge', 'row']
+
+
+def make_names(n: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    base = load_exercise_names()
+    names = set(base)
+    while len(names) < n:
+        parts = [rng.choice(MODIFIERS), rng.choice(EQUIPMENT), rng.choice(base)]
+        if rng.random() < 0.3:
+            parts.insert(0, rng.choice(MODIFIERS))
+        if rng.random() < 0.2:
+            parts.append(f'V{rng.randint(2, 9)}')
+        names.add(' '.join(parts))
+    return list(names)
+
+
+def _linear_scan(names, query, limit):
+    q = query.lower()
+    return sorted(n for n in names if q in n.lower())[:limit]
+
+
+def _per_query_us(fn, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for query in QUERIES:
+            fn(query)
+    return (time.perf_counter() - start) / (repeat * len(QUERIES)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', default='10000,100000')
+    parser.add_argument('--limit', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    for size in [int(s) for s in args.sizes.split(',')]:
+        names = make_names(size)
+        start = time.perf_counter()
+        catalog = ExerciseCatalog(names)
+        build = time.perf_counter() - start
+        indexed = _per_query_us(lambda q: catalog.search(q, args.limit), args.repeat)
+        linear = _per_query_us(lambda q: _linear_scan(names, q, args.limit), args.repeat)
+        print(f'{size:>7} names ({len(catalog)} entries)  build {build * 1000:8.1f} ms'
+              f'   search {indexed:9.1f} us/query   linear scan {linear:9.1f} us/query')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""build_model_input (pandas) against FeatureEncoder (NumPy), one row and batched.
+
+Run from the repository root:  python -m benchmarks.bench_feature_encoder
+"""
+import argparse
+import time
+import warnings
+
+import numpy as np
+
+from benchmarks.synthetic import make_payloads
+
+warnings.filterwarnings('ignore')
+
+import flask_app  # noqa: E402
+from feature_encoder import FeatureEncoder  # noqa: E402
+from prediction import build_model_input, parse_prediction_input  # noqa: E402
+
+
+def _per_call_us(fn, arg, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(arg)
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=2000)
+    parser.add_argument('--rows', type=int, default=1000)
+    args = parser.parse_args()
+
+    features = [parse_prediction_input(p, flask_app.exercise_intensity)[0] for p in make_payloads(args.rows)]
+    for name, model in (('fat', flask_app.model_registry.get('fat')), ('water', flask_app.model_registry.get('water'))):
+        encoder = FeatureEncoder.for_model(model)
+        if encoder is None:
+            print(f'{name}: model has no feature_names_in_, nothing to compare')
+            continue
+        expected = build_model_input(model, features).to_numpy(dtype=np.float64)
+        assert np.array_equal(expected, encoder.transform(features)), f'{name} encoder output differs'
+
+        pandas_one = _per_call_us(lambda f: build_model_input(model, f), features[0], args.repeat)
+        numpy_one = _per_call_us(encoder.transform, features[0], args.repeat)
+        pandas_many = _per_call_us(lambda f: build_model_input(model, f), features, 20)
+        numpy_many = _per_call_us(encoder.transform, features, 20)
+        print(f'{name} model ({len(encoder.columns)} columns)')
+        print(f'  1 row      pandas {pandas_one:>10.1f} us   numpy {numpy_one:>10.1f} us   {pandas_one / numpy_one:.0f}x')
+        print(f'  {args.rows} rows  pandas {pandas_many:>10.1f} us   numpy {numpy_many:>10.1f} us   {pandas_many / numpy_many:.0f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""Prediction history: request overhead, writer throughput and read cost against history length.
+
+1. POST /predict for a signed-in user with PREDICTION_HISTORY on vs off,
+   alternating blocks in one process (the write itself happens on the writer
+   thread, so this is the cost of queueing a row).
+2. Rows/s the background writer appends, trends included.
+3. GET /api/history (first page plus trend) as one user's history grows, which
+   stays flat because the trend is stored, not recomputed.
+
+Run from the repository root:  python -m benchmarks.bench_history --rows 50000
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+import warnings
+
+from benchmarks.synthetic import make_payloads
+
+warnings.filterwarnings('ignore')
+_tmp = tempfile.mkdtemp()
+os.environ.update(APP_DB_PATH=os.path.join(_tmp, 'bench.db'), PREDICTION_CACHE_SIZE='0', PASSWORD_HASH_WORKERS='0',
+                  PASSWORD_HASH_METHOD='pbkdf2', PASSWORD_HASH_ITERATIONS='1000')
+if not os.path.exists(os.environ.get('MODEL_WATER_PATH', 'water_model.pkl')):
+    from benchmarks.synthetic import train_standin_water_model
+
+    os.environ['MODEL_WATER_PATH'] = train_standin_water_model(os.path.join(_tmp, 'water_model.pkl'))
+
+import db  # noqa: E402
+import flask_app  # noqa: E402
+
+
+def _block_us(fn, items) -> float:
+    start = time.perf_counter()
+    for item in items:
+        fn(item)
+    return (time.perf_counter() - start) / len(items) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--blocks', type=int, default=20)
+    parser.add_argument('--block', type=int, default=100)
+    parser.add_argument('--rows', type=int, default=50000, help='history rows written for parts 2 and 3')
+    args = parser.parse_args()
+
+    writer = flask_app.history_writer
+    client = flask_app.app.test_client()
+    client.post('/signup', data={'email': 'bench@example.com', 'password': 'pw'})
+    payloads = make_payloads(args.block)
+    client.post('/predict', json=payloads[0])
+    times = {False: [], True: []}
+    for i in range(args.blocks * 2):
+        enabled = bool(i % 2)
+        flask_app.history_writer = writer if enabled else None
+        times[enabled].append(_block_us(lambda p: client.post('/predict', json=p), payloads))
+    flask_app.history_writer = writer
+    off, on = statistics.median(times[False]), statistics.median(times[True])
+    print(f'POST /predict (signed in)  history off {off:8.1f} us   on {on:8.1f} us   ({(on - off) / off * 100:+.1f}%)')
+    writer.flush()
+
+    conn = flask_app.db_pool.acquire()
+    user_id = conn.execute(db.SELECT_USER_BY_EMAIL, ('bench@example.com',)).fetchone()['id']
+    flask_app.db_pool.release(conn)
+    result = {'fat_pred': 30.0, 'water_pred': 2.5, 'ideal_fat': 25, 'total_rep_increase': 100}
+    start_at = time.time()
+    checkpoints = sorted({min(args.rows, n) for n in (100, 1000, 10000, args.rows)})
+    written = 0
+    for checkpoint in checkpoints:
+        start = time.perf_counter()
+        for i in range(written, checkpoint):
+            # Stay under the writer's queue bound rather than drop rows.
+            if i % 5000 == 4999:
+                writer.flush()
+            writer.record(user_id, result, created_at=start_at + i * 3600)
+        writer.flush()
+        elapsed = time.perf_counter() - start
+        rows = checkpoint - written
+        written = checkpoint
+        read_us = statistics.median(_block_us(lambda _: client.get('/api/history?limit=50'), range(50))
+                                    for _ in range(5))
+        print(f'history {checkpoint:>8,} rows   writer {rows / elapsed:>9,.0f} rows/s'
+              f'   GET /api/history {read_us:8.1f} us')
+    print(writer.stats())
+
+
+if __name__ == '__main__':
+    main()
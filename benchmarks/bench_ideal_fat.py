@@ -0,0 +1,44 @@
+"""IdealFatTable.lookup per row against lookup_many (searchsorted) for a batch.
+
+Run from the repository root:  python -m benchmarks.bench_ideal_fat --rows 100000
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+
+from ideal_fat import IdealFatTable
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    table = IdealFatTable.from_csv()
+    rng = random.Random(0)
+    ages = [rng.randint(16, 90) for _ in range(args.rows)]
+    genders = [rng.choice(['Male', 'Female']) for _ in range(args.rows)]
+    age_array, gender_array = np.array(ages), np.array(genders)
+
+    expected = [table.lookup(age, gender) for age, gender in zip(ages, genders)]
+    assert table.lookup_many(age_array, gender_array).tolist() == expected, 'lookup_many differs from lookup'
+
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        [table.lookup(age, gender) for age, gender in zip(ages, genders)]
+    scalar = (time.perf_counter() - start) / args.repeat
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        table.lookup_many(age_array, gender_array)
+    vectorized = (time.perf_counter() - start) / args.repeat
+
+    print(f'{args.rows} rows')
+    print(f'  lookup per row   {scalar * 1000:>9.2f} ms')
+    print(f'  lookup_many      {vectorized * 1000:>9.2f} ms   {scalar / vectorized:.0f}x')
+
+
+if __name__ == '__main__':
+    main()
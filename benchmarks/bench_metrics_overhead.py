@@ -0,0 +1,63 @@
+"""Per-request cost of the metrics instrumentation, recording on vs off.
+
+Signs up a user and then times POST /predict (cache off, so both models run)
+and GET /api/profile (three SQLite statements) through Flask's test client,
+switching metrics.ENABLED between blocks of --block requests so both settings
+see the same machine noise. Reports the median per-request time of each.
+
+Run from the repository root:  python -m benchmarks.bench_metrics_overhead --blocks 40
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+import warnings
+
+from benchmarks.synthetic import make_payloads
+
+warnings.filterwarnings('ignore')
+_tmp = tempfile.mkdtemp()
+os.environ.update(APP_DB_PATH=os.path.join(_tmp, 'bench.db'), PREDICTION_CACHE_SIZE='0', PASSWORD_HASH_WORKERS='0',
+                  PASSWORD_HASH_METHOD='pbkdf2', PASSWORD_HASH_ITERATIONS='1000')
+
+import flask_app  # noqa: E402
+import metrics  # noqa: E402
+
+
+def _block_us(fn, items) -> float:
+    start = time.perf_counter()
+    for item in items:
+        fn(item)
+    return (time.perf_counter() - start) / len(items) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--blocks', type=int, default=40)
+    parser.add_argument('--block', type=int, default=100)
+    args = parser.parse_args()
+
+    client = flask_app.app.test_client()
+    client.post('/signup', data={'email': 'bench@example.com', 'password': 'pw'})
+    client.post('/api/profile', json={'age': 30, 'gender': 'Male', 'weight': 80, 'height': 1.8,
+                                      'exercises_json': '{"Push Ups": {"Reps": 10, "Sets": 3}}'})
+    payloads = make_payloads(args.block)
+    client.post('/predict', json=payloads[0])
+    cases = (
+        ('POST /predict', lambda p: client.post('/predict', json=p), payloads),
+        ('GET /api/profile', lambda _: client.get('/api/profile'), range(args.block)),
+    )
+    for label, fn, items in cases:
+        times = {False: [], True: []}
+        for i in range(args.blocks * 2):
+            enabled = bool(i % 2)
+            metrics.ENABLED = enabled
+            times[enabled].append(_block_us(fn, items))
+        metrics.ENABLED = True
+        off, on = statistics.median(times[False]), statistics.median(times[True])
+        print(f'{label:<18} off {off:>8.1f} us   on {on:>8.1f} us   overhead {(on - off) / off * 100:+.1f}%')
+
+
+if __name__ == '__main__':
+    main()
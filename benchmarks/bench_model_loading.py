@@ -0,0 +1,80 @@
+"""Model load time and per-worker memory: eager joblib.load vs the mmap registry.
+
+Starts --workers processes per mode that each load the same pickles (like
+forked gunicorn workers that load on first use), then reads their memory from
+/proc while all of them are alive. PSS splits shared pages between the
+processes that map them, so it shows what one more worker really costs.
+
+Run from the repository root:  python -m benchmarks.bench_model_loading --workers 4
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WORKER = r'''
+import json, sys, time, warnings
+warnings.filterwarnings('ignore')
+import joblib, sklearn  # import cost is the same either way; keep it out of load_ms
+mmap_mode = sys.argv[1] or None
+start = time.perf_counter()
+models = [joblib.load(path, mmap_mode=mmap_mode) for path in sys.argv[2:]]
+print(json.dumps({'load_ms': (time.perf_counter() - start) * 1000}), flush=True)
+sys.stdin.read()
+'''
+
+
+def _memory_kb(pid: int) -> dict:
+    fields = {}
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as fh:
+            for line in fh:
+                key, _, rest = line.partition(':')
+                if key in ('Rss', 'Pss', 'Private_Dirty'):
+                    fields[key] = int(rest.split()[0])
+    except OSError:
+        pass
+    return fields
+
+
+def _run(mode: str, paths: list, workers: int) -> list:
+    procs = [
+        subprocess.Popen([sys.executable, '-c', WORKER, mode] + paths, stdin=subprocess.PIPE,
+                         stdout=subprocess.PIPE, text=True, cwd=BASE_DIR)
+        for _ in range(workers)
+    ]
+    results = []
+    for proc in procs:
+        stats = json.loads(proc.stdout.readline())
+        results.append(stats)
+    for proc, stats in zip(procs, results):
+        stats.update(_memory_kb(proc.pid))
+    for proc in procs:
+        proc.stdin.close()
+        proc.wait()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('models', nargs='*', help='pickles to load (default: the repository models that exist)')
+    args = parser.parse_args()
+
+    paths = args.models or [
+        path for path in (os.path.join(BASE_DIR, 'fat_model.pkl'), os.path.join(BASE_DIR, 'water_model.pkl'))
+        if os.path.exists(path)
+    ]
+    print('models:', ', '.join(f'{os.path.basename(p)} ({os.path.getsize(p) / 1024:.1f} KiB)' for p in paths))
+    for label, mode in (('eager (before)', ''), ('mmap_mode=r (after)', 'r')):
+        results = _run(mode, paths, args.workers)
+        avg = lambda key: sum(r.get(key, 0) for r in results) / len(results)  # noqa: E731
+        print(f'{label:<22} load {avg("load_ms"):8.1f} ms   RSS {avg("Rss") / 1024:7.1f} MiB'
+              f'   PSS {avg("Pss") / 1024:7.1f} MiB   private dirty {avg("Private_Dirty") / 1024:7.1f} MiB  (per worker)')
+
+
+if __name__ == '__main__':
+    main()
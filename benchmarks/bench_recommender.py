@@ -0,0 +1,67 @@
+"""calculate_rep_increase per user against RepRecommender over the whole cohort.
+
+Run from the repository root:  python -m benchmarks.bench_recommender --users 200000
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import load_exercise_names, make_payloads
+from prediction import REP_SLOPE, calculate_rep_increase, ideal_fat_percentage
+from recommender import RepRecommender
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=100000)
+    args = parser.parse_args()
+
+    names = load_exercise_names()
+    rng = random.Random(1)
+    # Every tenth exercise is left out so the unknown-exercise defaults are covered too.
+    exercise_intensity = {name: rng.uniform(0.1, 1.5) for i, name in enumerate(names) if i % 10}
+    payloads = make_payloads(args.users, seed=1)
+    plans = [p['exercises'] for p in payloads]
+    fat = [rng.uniform(8, 45) for _ in payloads]
+    ideal = [float(ideal_fat_percentage(p['age'], p['gender'])) for p in payloads]
+
+    start = time.perf_counter()
+    expected_totals = [
+        sum(v['Reps'] * v['Sets'] * (exercise_intensity.get(ex, 100) / 100) for ex, v in plan.items())
+        for plan in plans
+    ]
+    expected = [
+        calculate_rep_increase(f, i, REP_SLOPE, plan, exercise_intensity)
+        for f, i, plan in zip(fat, ideal, plans)
+    ]
+    scalar = time.perf_counter() - start
+
+    recommender = RepRecommender(exercise_intensity)
+    start = time.perf_counter()
+    encoded = recommender.encode(plans)
+    encode = time.perf_counter() - start
+    fat_arr, ideal_arr = np.array(fat), np.array(ideal)
+    start = time.perf_counter()
+    totals = recommender.total_reps(encoded)
+    total_inc, each = recommender.recommend(fat_arr, ideal_arr, encoded)
+    compute = time.perf_counter() - start
+    start = time.perf_counter()
+    dicts = recommender.as_dicts(encoded, each)
+    decode = time.perf_counter() - start
+
+    mismatches = sum(
+        1 for (exp_total, exp_each), got_total, got_each in zip(expected, total_inc.tolist(), dicts)
+        if exp_total != got_total or exp_each != got_each
+    )
+    mismatches += int(np.count_nonzero(totals != np.array(expected_totals)))
+    print(f'{args.users} users, {mismatches} mismatches against the per-user functions')
+    print(f'  per-user Python      {scalar * 1000:>9.1f} ms   {args.users / scalar:>12,.0f} users/s')
+    print(f'  encode dicts         {encode * 1000:>9.1f} ms')
+    print(f'  NumPy compute        {compute * 1000:>9.1f} ms   {args.users / compute:>12,.0f} users/s')
+    print(f'  back to dicts        {decode * 1000:>9.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
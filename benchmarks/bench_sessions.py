@@ -0,0 +1,98 @@
+"""Page-view latency for a signed-in user under each session store.
+
+GET / and GET /dashboard with Flask's signed-cookie sessions (the user row is
+read from SQLite on every view, as before server-side sessions), the in-process
+store and the SQLite store (the user row comes cached with the session).
+Modes are swapped on the one app and alternate block by block, so they share
+the same noise; the statements each view runs are counted too.
+
+Run from the repository root:  python -m benchmarks.bench_sessions --blocks 20
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+import warnings
+
+from flask.sessions import SecureCookieSessionInterface
+
+warnings.filterwarnings('ignore')
+_tmp = tempfile.mkdtemp()
+os.environ.update(APP_DB_PATH=os.path.join(_tmp, 'bench.db'), PASSWORD_HASH_WORKERS='0',
+                  PASSWORD_HASH_METHOD='pbkdf2', PASSWORD_HASH_ITERATIONS='1000')
+
+import db  # noqa: E402
+import flask_app  # noqa: E402
+from sessions import MemorySessionStore, ServerSideSessionInterface, SQLiteSessionStore  # noqa: E402
+
+PAGES = ('/', '/dashboard')
+
+
+def _modes() -> dict:
+    memory = MemorySessionStore()
+    sqlite_store = SQLiteSessionStore(flask_app.db_pool, flask_app.SESSION_CACHE_TTL)
+    return {
+        'cookie': (SecureCookieSessionInterface(), None),
+        'memory': (ServerSideSessionInterface(memory), memory),
+        'sqlite': (ServerSideSessionInterface(sqlite_store), sqlite_store),
+    }
+
+
+def _use(mode):
+    flask_app.app.session_interface, flask_app.session_store = mode
+
+
+def _statements(client, page: str) -> int:
+    count = 0
+    execute = db.TimedConnection.execute
+
+    def counting(self, sql, parameters=()):
+        nonlocal count
+        count += 1
+        return execute(self, sql, parameters)
+
+    db.TimedConnection.execute = counting
+    try:
+        client.get(page)
+    finally:
+        db.TimedConnection.execute = execute
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--blocks', type=int, default=20)
+    parser.add_argument('--block', type=int, default=100, help='page views per block')
+    args = parser.parse_args()
+
+    modes = _modes()
+    clients = {}
+    for name, mode in modes.items():
+        _use(mode)
+        client = clients[name] = flask_app.app.test_client()
+        client.post('/signup', data={'email': f'{name}@example.com', 'password': 'pw', 'name': name.title()})
+        for page in PAGES:
+            client.get(page)
+
+    for page in PAGES:
+        times = {name: [] for name in modes}
+        for _ in range(args.blocks):
+            for name, mode in modes.items():
+                _use(mode)
+                client = clients[name]
+                start = time.perf_counter()
+                for _ in range(args.block):
+                    client.get(page)
+                times[name].append((time.perf_counter() - start) / args.block * 1e6)
+        before = statistics.median(times['cookie'])
+        print(f'GET {page}')
+        for name, mode in modes.items():
+            _use(mode)
+            median = statistics.median(times[name])
+            print(f'  {name:<7} {median:8.1f} us   ({(median - before) / before * 100:+5.1f}%)'
+                  f'   {_statements(clients[name], page)} SQL statement(s) per view')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""Sign-in latency (p50/p99) under concurrent load, inline hashing vs the process pool.
+
+Run from the repository root:  python -m benchmarks.bench_signin --threads 8 --requests 200
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import threading
+import time
+import warnings
+
+warnings.filterwarnings('ignore')
+_tmp = tempfile.TemporaryDirectory()
+os.environ['APP_DB_PATH'] = os.path.join(_tmp.name, 'bench.db')
+os.environ['LOGIN_MAX_FAILURES_PER_EMAIL'] = '0'
+os.environ['LOGIN_MAX_FAILURES_PER_IP'] = '0'
+
+import db  # noqa: E402
+import flask_app  # noqa: E402
+from auth import PasswordHasher  # noqa: E402
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def _load(threads: int, requests: int, users: int):
+    latencies = []
+    lock = threading.Lock()
+
+    def worker(idx):
+        client = flask_app.app.test_client()
+        local = []
+        for i in range(requests // threads):
+            user = (idx + i) % users
+            start = time.perf_counter()
+            client.post('/signin', data={'email': f'user{user}@example.com', 'password': 'correct horse'})
+            local.append((time.perf_counter() - start) * 1000)
+        with lock:
+            latencies.extend(local)
+
+    start = time.perf_counter()
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    return latencies, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--method', default='scrypt')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2)
+    args = parser.parse_args()
+
+    users = 20
+    seed = PasswordHasher(method=args.method, workers=0)
+    conn = flask_app.db_pool.acquire()
+    password_hash = seed.hash('correct horse')
+    conn.executemany(db.INSERT_USER, [(f'user{i}@example.com', password_hash, f'User {i}') for i in range(users)])
+    conn.commit()
+    flask_app.db_pool.release(conn)
+
+    print(f'method={args.method} threads={args.threads} requests={args.requests}')
+    for label, workers in (('inline', 0), (f'pool({args.workers})', args.workers)):
+        flask_app.password_hasher = PasswordHasher(method=args.method, workers=workers)
+        _load(args.threads, args.threads, users)  # warm up the pool
+        latencies, elapsed = _load(args.threads, args.requests, users)
+        flask_app.password_hasher.shutdown()
+        print(f'{label:<10} p50 {statistics.median(latencies):8.1f} ms   p99 {_percentile(latencies, 99):8.1f} ms'
+              f'   {len(latencies) / elapsed:8.1f} signins/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""Cold-start report: python -X importtime for flask_app, then time to first response.
+
+Each measurement is a fresh interpreter. The import report lists the slowest
+modules flask_app pulls in and whether pandas, joblib or sklearn were imported.
+Time to first response is measured from process spawn to the import finishing,
+the first GET /exercises and the first POST /predict (which loads the models),
+once against a fresh database (schema creation and migration run) and again
+against the now-existing one. --repo points at another checkout, e.g. a
+`git worktree` of an older commit, to measure that tree the same way.
+
+Run from the repository root:  python -m benchmarks.bench_startup --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.synthetic import BASE_DIR, make_payloads, train_standin_water_model
+
+CHILD = r'''
+import json, sys, time
+import flask_app
+imported = time.time()
+heavy = sorted(m for m in ('pandas', 'joblib', 'sklearn') if m in sys.modules)
+client = flask_app.app.test_client()
+client.get('/exercises')
+first_get = time.time()
+client.post('/predict', json=json.loads(sys.argv[1]))
+first_predict = time.time()
+print(json.dumps({
+    'import': imported, 'first_get': first_get, 'first_predict': first_predict,
+    'heavy_modules': heavy,
+}))
+'''
+
+
+def _parse_importtime(stderr: str) -> list:
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative_us, name = line.split('|')
+        modules.append((name.strip(), int(cumulative_us)))
+    return modules
+
+
+def _first_response(repo: str, env: dict, payload: dict) -> dict:
+    spawned = time.time()
+    out = subprocess.run([sys.executable, '-c', CHILD, json.dumps(payload)], cwd=repo, env=env,
+                         capture_output=True, text=True, check=True).stdout
+    stats = json.loads(out.strip().splitlines()[-1])
+    return {key: (stats[key] - spawned) * 1000 for key in ('import', 'first_get', 'first_predict')} | {
+        'heavy_modules': stats['heavy_modules']}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=12, help='slowest imports to list')
+    parser.add_argument('--repo', default=BASE_DIR, help='checkout to measure (default: this one)')
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    env = dict(os.environ, PREDICTION_CACHE_SIZE='0')
+    if 'MODEL_WATER_PATH' not in env and not os.path.exists(os.path.join(args.repo, 'water_model.pkl')):
+        env['MODEL_WATER_PATH'] = train_standin_water_model(os.path.join(tmp, 'water_model.pkl'))
+    payload = make_payloads(1)[0]
+
+    env['APP_DB_PATH'] = os.path.join(tmp, 'import.db')
+    stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import flask_app'], cwd=args.repo, env=env,
+                            capture_output=True, text=True, check=True).stderr
+    modules = _parse_importtime(stderr)
+    total = dict(modules).get('flask_app', 0)
+    print(f'python -X importtime: flask_app {total / 1000:.1f} ms cumulative; slowest imports:')
+    slowest = sorted((m for m in modules if m[0] != 'flask_app'), key=lambda m: -m[1])
+    for name, cumulative in slowest[:args.top]:
+        print(f'  {cumulative / 1000:>8.1f} ms  {name}')
+
+    print(f'\ntime to first response (ms since spawn, median of {args.runs} processes):')
+    env['APP_DB_PATH'] = os.path.join(tmp, 'existing.db')
+    _first_response(args.repo, env, payload)
+    for label in ('fresh database', 'existing database'):
+        results = []
+        for run in range(args.runs):
+            env['APP_DB_PATH'] = os.path.join(tmp, f'fresh-{run}.db' if label == 'fresh database' else 'existing.db')
+            results.append(_first_response(args.repo, env, payload))
+        med = {key: statistics.median(r[key] for r in results) for key in ('import', 'first_get', 'first_predict')}
+        print(f'  {label:<18} import {med["import"]:>7.1f}   first GET /exercises {med["first_get"]:>7.1f}'
+              f'   first POST /predict {med["first_predict"]:>7.1f}')
+    print(f'  heavy modules imported by flask_app itself: {", ".join(results[0]["heavy_modules"]) or "none"}')
+
+
+if __name__ == '__main__':
+    main()
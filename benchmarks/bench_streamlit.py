@@ -0,0 +1,71 @@
+"""Rerun cost of the Streamlit app, driven headlessly with streamlit.testing.
+
+Times one session's first run, a second session's first run (which finds the
+caches warm), reruns after a slider change, and Predict clicks with inputs seen
+before and with new ones. Medians over --reruns. --script measures another
+version of the app, e.g. one exported with `git show <rev>:app.py`.
+
+Run from the repository root:  python -m benchmarks.bench_streamlit --reruns 30
+"""
+import argparse
+import logging
+import os
+import statistics
+import tempfile
+import time
+import warnings
+
+from benchmarks.synthetic import BASE_DIR, train_standin_water_model
+
+warnings.filterwarnings('ignore')
+logging.getLogger('streamlit').setLevel(logging.ERROR)
+
+
+def _timed(fn) -> float:
+    start = time.perf_counter()
+    fn()
+    return (time.perf_counter() - start) * 1000
+
+
+def _session(app_test, script: str):
+    at = app_test.from_file(script, default_timeout=120)
+    ms = _timed(at.run)
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+    weight, height = at.number_input[1], at.number_input[2]
+    weight.set_value(70.0)
+    height.set_value(1.75)
+    at.run()
+    return at, ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--script', default=os.path.join(BASE_DIR, 'app.py'))
+    parser.add_argument('--reruns', type=int, default=30)
+    args = parser.parse_args()
+
+    if 'MODEL_WATER_PATH' not in os.environ and not os.path.exists(os.path.join(BASE_DIR, 'water_model.pkl')):
+        os.environ['MODEL_WATER_PATH'] = train_standin_water_model(os.path.join(tempfile.mkdtemp(), 'water_model.pkl'))
+    from streamlit.testing.v1 import AppTest
+
+    at, first_ms = _session(AppTest, os.path.abspath(args.script))
+    _, second_ms = _session(AppTest, os.path.abspath(args.script))
+    frequency = at.slider[1]
+    age = at.number_input[0]
+    slider = [_timed(frequency.set_value(2 + i % 2).run) for i in range(args.reruns)]
+    repeat = [_timed(at.button[0].click().run) for _ in range(args.reruns)]
+    fresh = []
+    for i in range(args.reruns):
+        age.set_value(18 + i % 50)
+        fresh.append(_timed(at.button[0].click().run))
+    print(f'{os.path.relpath(args.script)}')
+    print(f'  first run, first session   {first_ms:9.1f} ms')
+    print(f'  first run, second session  {second_ms:9.1f} ms')
+    print(f'  slider change rerun        {statistics.median(slider):9.1f} ms')
+    print(f'  Predict, repeated inputs   {statistics.median(repeat):9.1f} ms')
+    print(f'  Predict, new inputs        {statistics.median(fresh):9.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""Concurrent read/write throughput on users/profiles by number of workers.
+
+Compares the old access pattern (a fresh sqlite3.connect per request on the
+default rollback journal) with the pooled WAL connections used by flask_app.
+Each operation is a profile page view (user + profile read) or, with
+probability --write-ratio, a profile save.
+
+Run from the repository root:  python -m benchmarks.load_db --seconds 2
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+
+import db
+
+USERS = 500
+PROFILE = {'age': 30, 'gender': 'Male', 'weight': 80.0, 'height': 1.8, 'session_duration': 1.0, 'frequency': 4}
+PLAN = '{"Deadlifts":{"Reps":8,"Sets":3},"Bench Press":{"Reps":10,"Sets":3},"Squats":{"Reps":12,"Sets":4}}'
+
+
+def _legacy_connect(path):
+    conn = sqlite3.connect(path, timeout=5)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def _seed(path):
+    conn = db.connect(path)
+    db.create_schema(conn)
+    conn.executemany(db.INSERT_USER, [(f'user{i}@example.com', 'x', f'User {i}') for i in range(USERS)])
+    for i in range(USERS):
+        db.save_profile(conn, i + 1, PROFILE, PLAN)
+    conn.close()
+
+
+def _operation(conn, rng, write_ratio):
+    user_id = rng.randint(1, USERS)
+    if rng.random() < write_ratio:
+        db.save_profile(conn, user_id, dict(PROFILE, age=rng.randint(18, 70)), PLAN)
+    else:
+        conn.execute(db.SELECT_USER_BY_ID, (user_id,)).fetchone()
+        db.load_profile(conn, user_id)
+
+
+def _run(mode, path, workers, seconds, write_ratio):
+    pool = db.ConnectionPool(path, max_idle=workers) if mode == 'pooled-wal' else None
+    counts = [0] * workers
+    errors = [0] * workers
+    deadline = time.perf_counter() + seconds
+
+    def worker(idx):
+        rng = random.Random(idx)
+        while time.perf_counter() < deadline:
+            conn = pool.acquire() if pool else _legacy_connect(path)
+            try:
+                _operation(conn, rng, write_ratio)
+                counts[idx] += 1
+            except sqlite3.OperationalError:
+                errors[idx] += 1
+            finally:
+                pool.release(conn) if pool else conn.close()
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(workers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    if pool:
+        pool.close_all()
+    return sum(counts) / seconds, sum(errors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--seconds', type=float, default=2.0)
+    parser.add_argument('--write-ratio', type=float, default=0.2)
+    parser.add_argument('--workers', default='1,2,4,8,16')
+    args = parser.parse_args()
+
+    print(f'{"mode":<14}{"workers":>8}{"ops/s":>12}{"errors":>8}')
+    for mode in ('per-request', 'pooled-wal'):
+        for workers in [int(w) for w in args.workers.split(',')]:
+            with tempfile.TemporaryDirectory() as tmp:
+                path = os.path.join(tmp, 'load.db')
+                _seed(path)
+                if mode == 'per-request':
+                    conn = sqlite3.connect(path)
+                    conn.execute('PRAGMA journal_mode=DELETE')
+                    conn.close()
+                rate, errors = _run(mode, path, workers, args.seconds, args.write_ratio)
+            print(f'{mode:<14}{workers:>8}{rate:>12,.0f}{errors:>8}')
+
+
+if __name__ == '__main__':
+    main()
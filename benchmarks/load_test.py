@@ -0,0 +1,154 @@
+"""Throughput and tail latency of /predict: threaded Flask server vs asgi.py under uvicorn.
+
+Each mode starts its server on a free local port (with a throwaway database and
+the prediction cache off, so every request runs the models), then --concurrency
+client threads send keep-alive POST /predict requests for --seconds. Pass --url
+to load an already running server instead. The asgi mode needs uvicorn.
+
+Run from the repository root:  python -m benchmarks.load_test --concurrency 32 --seconds 10
+                               python -m benchmarks.load_test --mode sync --env PREDICT_MICROBATCH=1
+"""
+import argparse
+import http.client
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+from benchmarks.synthetic import make_payloads
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SERVERS = {
+    'sync': lambda port: [
+        sys.executable, '-c',
+        f"import flask_app; flask_app.app.run(host='127.0.0.1', port={port}, threaded=True)",
+    ],
+    'asgi': lambda port: [
+        sys.executable, '-m', 'uvicorn', 'asgi:app', '--host', '127.0.0.1', '--port', str(port),
+        '--log-level', 'warning', '--no-access-log',
+    ],
+}
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _wait_ready(host: str, port: int, proc, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f'server exited with {proc.returncode}')
+        try:
+            conn = http.client.HTTPConnection(host, port, timeout=30)
+            conn.request('GET', '/exercises')
+            conn.getresponse().read()
+            # Load the models before the clock starts.
+            conn.request('POST', '/predict', body=json.dumps(make_payloads(1)[0]), headers={'Content-Type': 'application/json'})
+            conn.getresponse().read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError('server did not come up')
+
+
+def _load(host: str, port: int, bodies: list, concurrency: int, seconds: float) -> dict:
+    latencies = [[] for _ in range(concurrency)]
+    statuses = [Counter() for _ in range(concurrency)]
+    start_gate = threading.Barrier(concurrency + 1)
+    deadline = [0.0]
+
+    def client(idx):
+        conn = http.client.HTTPConnection(host, port, timeout=30)
+        headers = {'Content-Type': 'application/json'}
+        n = idx
+        start_gate.wait()
+        while time.perf_counter() < deadline[0]:
+            body = bodies[n % len(bodies)]
+            n += concurrency
+            start = time.perf_counter()
+            try:
+                conn.request('POST', '/predict', body=body, headers=headers)
+                response = conn.getresponse()
+                response.read()
+                statuses[idx][response.status] += 1
+            except OSError:
+                statuses[idx]['conn-error'] += 1
+                conn.close()
+                conn = http.client.HTTPConnection(host, port, timeout=30)
+                continue
+            latencies[idx].append(time.perf_counter() - start)
+        conn.close()
+
+    threads = [threading.Thread(target=client, args=(i,), daemon=True) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    deadline[0] = time.perf_counter() + seconds
+    start_gate.wait()
+    for thread in threads:
+        thread.join()
+
+    status = sum(statuses, Counter())
+    ok = sorted(lat for per_client in latencies for lat in per_client)
+    pct = lambda p: ok[min(len(ok) - 1, int(p * len(ok)))] * 1000 if ok else float('nan')  # noqa: E731
+    return {
+        'requests': sum(status.values()),
+        'rps': sum(status.values()) / seconds,
+        'p50_ms': pct(0.50),
+        'p95_ms': pct(0.95),
+        'p99_ms': pct(0.99),
+        'max_ms': ok[-1] * 1000 if ok else float('nan'),
+        'status': dict(status),
+    }
+
+
+def _run_mode(mode: str, bodies: list, args) -> dict:
+    port = _free_port()
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, APP_DB_PATH=os.path.join(tmp, 'load.db'), PREDICTION_CACHE_SIZE='0')
+        env.update(item.split('=', 1) for item in args.env)
+        proc = subprocess.Popen(SERVERS[mode](port), cwd=BASE_DIR, env=env,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            _wait_ready('127.0.0.1', port, proc)
+            return _load('127.0.0.1', port, bodies, args.concurrency, args.seconds)
+        finally:
+            proc.terminate()
+            proc.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mode', choices=('sync', 'asgi', 'both'), default='both')
+    parser.add_argument('--url', help='load this running server instead of starting one')
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--env', action='append', default=[], metavar='NAME=VALUE',
+                        help='extra environment for the started servers, e.g. PREDICT_MICROBATCH=1')
+    args = parser.parse_args()
+
+    bodies = [json.dumps(p).encode() for p in make_payloads(1000, seed=2)]
+    if args.url:
+        parts = urlsplit(args.url)
+        runs = [(args.url, _load(parts.hostname, parts.port or 80, bodies, args.concurrency, args.seconds))]
+    else:
+        modes = ('sync', 'asgi') if args.mode == 'both' else (args.mode,)
+        runs = [(mode, _run_mode(mode, bodies, args)) for mode in modes]
+
+    print(f'POST /predict, {args.concurrency} clients, {args.seconds:g}s')
+    for name, r in runs:
+        print(f'  {name:<6} {r["rps"]:>8.0f} req/s   p50 {r["p50_ms"]:>7.1f} ms   p95 {r["p95_ms"]:>7.1f} ms   '
+              f'p99 {r["p99_ms"]:>7.1f} ms   max {r["max_ms"]:>7.1f} ms   {r["status"]}')
+
+
+if __name__ == '__main__':
+    main()
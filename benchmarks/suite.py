@@ -0,0 +1,167 @@
+"""Benchmark suite for the prediction and persistence hot paths, with JSON results.
+
+Times build_model_input, single-row and batch predict for both models,
+calculate_rep_increase, POST /predict end to end (prediction cache off) and
+GET/POST /api/profile against a temporary app.db. Everything runs offline: if
+water_model.pkl is missing, a stand-in linear model is trained on synthetic
+users and served in its place (recorded in the results' meta).
+
+Each case runs --number calls per sample for --repeat samples and reports the
+median, min and p95 per-call time. --compare loads an earlier results file and
+exits with status 1 when a case is more than --threshold slower; on a noisy
+machine, --stat min compares the fastest samples instead of the medians.
+
+Run from the repository root:
+    python -m benchmarks.suite --output bench.json
+    python -m benchmarks.suite --compare bench.json --threshold 0.2
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import warnings
+
+import numpy as np
+import sklearn
+
+from benchmarks.synthetic import BASE_DIR, make_payloads, train_standin_water_model
+
+warnings.filterwarnings('ignore')
+_tmp = tempfile.mkdtemp()
+os.environ.update(APP_DB_PATH=os.path.join(_tmp, 'bench.db'), PREDICTION_CACHE_SIZE='0', PASSWORD_HASH_WORKERS='0',
+                  PASSWORD_HASH_METHOD='pbkdf2', PASSWORD_HASH_ITERATIONS='1000')
+STANDIN_WATER_MODEL = not os.path.exists(os.environ.get('MODEL_WATER_PATH', os.path.join(BASE_DIR, 'water_model.pkl')))
+if STANDIN_WATER_MODEL:
+    os.environ['MODEL_WATER_PATH'] = train_standin_water_model(os.path.join(_tmp, 'water_model.pkl'))
+
+import flask_app  # noqa: E402
+from prediction import build_model_input, calculate_rep_increase, parse_prediction_input  # noqa: E402
+
+BATCH_ROWS = 1000
+
+
+def _samples_us(fn, number: int, repeat: int) -> list:
+    fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - start) / number * 1e6)
+    return samples
+
+
+def _summary(samples: list, number: int) -> dict:
+    ordered = sorted(samples)
+    return {
+        'median_us': round(statistics.median(ordered), 3),
+        'min_us': round(ordered[0], 3),
+        'p95_us': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3),
+        'number': number,
+        'repeat': len(ordered),
+    }
+
+
+def _cases(client, payloads: list) -> list:
+    """(name, fn, calls per sample relative to --number) for every benchmarked path."""
+    intensity = flask_app.exercise_intensity
+    fat_model, water_model = flask_app.model_registry.get('fat'), flask_app.model_registry.get('water')
+    parsed = [parse_prediction_input(payload, intensity) for payload in payloads]
+    features = [row for row, _ in parsed]
+    single = features[0]
+    # The models are scored on the encoded arrays the serving pipeline passes them.
+    encoder = flask_app.get_pipeline().encoder
+    fat_one, water_one = encoder.transform(single)
+    fat_batch, water_batch = encoder.transform(features)
+    exercises = parsed[0][1]
+    profile = {'age': 30, 'gender': 'Male', 'weight': 80, 'height': 1.8,
+               'exercises_json': json.dumps(payloads[0]['exercises'])}
+    return [
+        ('build_model_input/single', lambda: build_model_input(fat_model, single), 1),
+        (f'build_model_input/batch{BATCH_ROWS}', lambda: build_model_input(fat_model, features), 0.1),
+        ('fat_model.predict/single', lambda: fat_model.predict(fat_one), 1),
+        (f'fat_model.predict/batch{BATCH_ROWS}', lambda: fat_model.predict(fat_batch), 0.1),
+        ('water_model.predict/single', lambda: water_model.predict(water_one), 1),
+        (f'water_model.predict/batch{BATCH_ROWS}', lambda: water_model.predict(water_batch), 0.1),
+        ('calculate_rep_increase', lambda: calculate_rep_increase(35.0, 20, -0.03, exercises, intensity), 10),
+        ('POST /predict', lambda: client.post('/predict', json=payloads[0]), 0.5),
+        ('GET /api/profile', lambda: client.get('/api/profile'), 0.5),
+        ('POST /api/profile', lambda: client.post('/api/profile', json=profile), 0.5),
+    ]
+
+
+def run(number: int, repeat: int) -> dict:
+    client = flask_app.app.test_client()
+    client.post('/signup', data={'email': 'bench@example.com', 'password': 'pw'})
+    payloads = make_payloads(BATCH_ROWS)
+    client.post('/api/profile', json={'age': 30, 'gender': 'Male', 'weight': 80, 'height': 1.8,
+                                      'exercises_json': json.dumps(payloads[0]['exercises'])})
+    results = {}
+    for name, fn, scale in _cases(client, payloads):
+        calls = max(1, int(number * scale))
+        results[name] = _summary(_samples_us(fn, calls, repeat), calls)
+        print(f'{name:<34} {results[name]["median_us"]:>12.1f} us  (min {results[name]["min_us"]:.1f})')
+    return {
+        'meta': {
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'numpy': np.__version__,
+            'sklearn': sklearn.__version__,
+            'standin_water_model': STANDIN_WATER_MODEL,
+        },
+        'results': results,
+    }
+
+
+def compare(current: dict, baseline: dict, threshold: float, stat: str = 'median') -> list:
+    """Print each shared case's ``stat`` against the baseline; return the regressed case names."""
+    key = f'{stat}_us'
+    regressions = []
+    print(f'\n{"case":<34} {"baseline":>12} {"current":>12} {"change":>8}')
+    for name, result in current['results'].items():
+        before = baseline['results'].get(name)
+        if before is None:
+            print(f'{name:<34} {"-":>12} {result[key]:>12.1f}      new')
+            continue
+        change = result[key] / before[key] - 1
+        flag = ''
+        if change > threshold:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        print(f'{name:<34} {before[key]:>12.1f} {result[key]:>12.1f} {change * 100:>+7.1f}%{flag}')
+    if baseline['meta'].get('standin_water_model') != current['meta']['standin_water_model']:
+        print('note: the baseline and this run used different water models')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--number', type=int, default=200, help='calls per sample for the cheapest cases')
+    parser.add_argument('--repeat', type=int, default=15, help='samples per case')
+    parser.add_argument('--output', help='write the results as JSON to this path')
+    parser.add_argument('--compare', metavar='BASELINE', help='results JSON to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed slowdown (0.2 = 20%%)')
+    parser.add_argument('--stat', choices=('median', 'min'), default='median', help='statistic to compare')
+    args = parser.parse_args()
+
+    current = run(args.number, args.repeat)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(current, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(current, baseline, args.threshold, args.stat)
+        if regressions:
+            print(f'{len(regressions)} case(s) more than {args.threshold:.0%} slower than the baseline')
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+import os
+import random
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import LinearRegression
+
+from prediction import build_model_input, derive_features, parse_payload
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EXERCISE_CSV_PATH = os.path.join(BASE_DIR, 'exercise_intensity_new.csv')
+
+
+def load_exercise_names() -> list:
+    return pd.read_csv(EXERCISE_CSV_PATH)['Name of Exercise'].tolist()
+
+
+def make_payloads(n: int, seed: int = 0) -> list:
+    """Random /predict payloads shaped like the ones the dashboard sends."""
+    rng = random.Random(seed)
+    names = load_exercise_names()
+    payloads = []
+    for _ in range(n):
+        chosen = rng.sample(names, rng.randint(1, 6))
+        payloads.append({
+            'age': rng.randint(18, 70),
+            'gender': rng.choice(['Male', 'Female']),
+            'weight': round(rng.uniform(45, 120), 1),
+            'height': round(rng.uniform(1.5, 2.0), 2),
+            'session_duration': round(rng.uniform(0.5, 3.0), 1),
+            'frequency': rng.randint(1, 7),
+            'exercises': {ex: {'Reps': rng.randint(1, 100), 'Sets': rng.randint(1, 10)} for ex in chosen},
+        })
+    return payloads
+
+
+def train_standin_water_model(path: str, n: int = 2000, seed: int = 0) -> str:
+    """Fit and save a linear water-intake model on synthetic users.
+
+    The stand-in takes the same feature columns as the served models, so the
+    pipeline encodes and scores it like the real ``water_model.pkl``. Its
+    predictions are not meaningful, only its cost.
+    """
+    intensity = pd.read_csv(EXERCISE_CSV_PATH).set_index('Name of Exercise')['Average Calories Per Rep'].to_dict()
+    features = [derive_features(parse_payload(payload), intensity) for payload in make_payloads(n, seed)]
+    X = build_model_input(None, features)
+    rng = np.random.default_rng(seed)
+    y = (0.033 * X['Weight (kg)'] + 0.5 * X['Session_Duration (hours)'] * X['Workout_Frequency (days/week)'] / 7
+         + rng.normal(0, 0.2, len(X)))
+    joblib.dump(LinearRegression().fit(X, y), path)
+    return path
@@ -0,0 +1,209 @@
+"""Score a file of user profiles offline, in bounded memory.
+
+The input (CSV or Parquet) is read in chunks; each chunk is scored on a process
+pool with the same PredictionPipeline the Flask app uses, and results are
+appended to the output in input order. At most ``2 * workers`` chunks are in
+flight at once, so memory stays flat however large the input is.
+
+Input columns: age, gender, weight, height, session_duration, frequency and
+an ``exercises`` (or ``exercises_json``) column holding the JSON plan,
+``{"Squats": {"Reps": 12, "Sets": 3}, ...}``. Output columns: the id columns,
+fat_pred, water_pred, ideal_fat, total_rep_increase, rep_increase_each (JSON)
+and error.
+
+    python bulk_score.py members.csv scores.csv --workers 8 --chunk-size 50000
+"""
+import argparse
+import json
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from exercise_catalog import read_exercise_csv
+from ideal_fat import IDEAL_FAT_CSV_PATH, IdealFatTable
+from model_registry import load_model
+from prediction import PredictionPipeline
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PROFILE_COLUMNS = ('age', 'gender', 'weight', 'height', 'session_duration', 'frequency')
+RESULT_COLUMNS = ('fat_pred', 'water_pred', 'ideal_fat', 'total_rep_increase', 'rep_increase_each', 'error')
+
+_pipeline = None
+
+
+def _file_format(path: str, explicit: str = None) -> str:
+    if explicit:
+        return explicit
+    return 'parquet' if path.lower().endswith(('.parquet', '.pq')) else 'csv'
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        sys.exit('Parquet input/output needs pyarrow: pip install pyarrow')
+    return pyarrow
+
+
+def iter_chunks(path: str, fmt: str, chunk_size: int):
+    if fmt == 'parquet':
+        pa = _require_pyarrow()
+        for batch in pa.parquet.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunk_size)
+
+
+def _init_worker(fat_path: str, water_path: str, exercise_csv: str, ideal_fat_csv: str):
+    global _pipeline
+    _pipeline = PredictionPipeline(
+        load_model(fat_path),
+        load_model(water_path),
+        read_exercise_csv(exercise_csv),
+        ideal_fat_table=IdealFatTable.from_csv(ideal_fat_csv),
+    )
+
+
+def _payloads(chunk: pd.DataFrame, exercises_column: str) -> list:
+    payloads = []
+    for record in chunk.to_dict('records'):
+        payload = {col: record.get(col) for col in PROFILE_COLUMNS}
+        # Blank cells read as NaN; parse_payload turns away other non-finite values row by row.
+        missing = [col for col, value in payload.items() if pd.isna(value)]
+        if missing:
+            payloads.append(f'missing {", ".join(missing)}')
+            continue
+        plan = record.get(exercises_column) if exercises_column else None
+        try:
+            payload['exercises'] = json.loads(plan) if isinstance(plan, str) else {}
+        except ValueError as exc:
+            payload = f'invalid exercises JSON: {exc}'
+        payloads.append(payload)
+    return payloads
+
+
+def score_chunk(chunk: pd.DataFrame, id_columns: list, exercises_column: str) -> pd.DataFrame:
+    payloads = _payloads(chunk, exercises_column)
+    scorable = [p for p in payloads if isinstance(p, dict)]
+    results = iter(_pipeline.run_batch(scorable)[0])
+    rows = []
+    for payload in payloads:
+        result = next(results) if isinstance(payload, dict) else {'error': payload}
+        rows.append({
+            'fat_pred': result.get('fat_pred'),
+            'water_pred': result.get('water_pred'),
+            'ideal_fat': result.get('ideal_fat'),
+            'total_rep_increase': result.get('total_rep_increase'),
+            'rep_increase_each': json.dumps(result['rep_increase_each']) if 'rep_increase_each' in result else None,
+            'error': result.get('error'),
+        })
+    # Fixed dtypes, so every chunk (even an all-error one) has the same schema.
+    out = pd.DataFrame(rows, columns=list(RESULT_COLUMNS), index=chunk.index).astype({
+        'fat_pred': 'float64',
+        'water_pred': 'float64',
+        'ideal_fat': 'float64',
+        'total_rep_increase': 'Int64',
+        'rep_increase_each': 'string',
+        'error': 'string',
+    })
+    return pd.concat([chunk[id_columns], out], axis=1) if id_columns else out
+
+
+class _Writer:
+    def __init__(self, path: str, fmt: str):
+        self.path = path
+        self.fmt = fmt
+        self._parquet = None
+        self._wrote_header = False
+
+    def write(self, frame: pd.DataFrame):
+        if self.fmt == 'parquet':
+            pa = _require_pyarrow()
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            if self._parquet is None:
+                self._parquet = pa.parquet.ParquetWriter(self.path, table.schema)
+            self._parquet.write_table(table.cast(self._parquet.schema))
+        else:
+            frame.to_csv(self.path, mode='a' if self._wrote_header else 'w', header=not self._wrote_header, index=False)
+            self._wrote_header = True
+
+    def close(self):
+        if self._parquet is not None:
+            self._parquet.close()
+
+
+def run(input_path: str, output_path: str, chunk_size: int = 50_000, workers: int = None,
+        fat_model: str = None, water_model: str = None, exercise_csv: str = None, ideal_fat_csv: str = None,
+        input_format: str = None, output_format: str = None, id_columns=None) -> int:
+    workers = workers or os.cpu_count() or 1
+    in_fmt = _file_format(input_path, input_format)
+    out_fmt = _file_format(output_path, output_format)
+    initargs = (
+        fat_model or os.path.join(BASE_DIR, 'fat_model.pkl'),
+        water_model or os.path.join(BASE_DIR, 'water_model.pkl'),
+        exercise_csv or os.path.join(BASE_DIR, 'exercise_intensity_new.csv'),
+        ideal_fat_csv or IDEAL_FAT_CSV_PATH,
+    )
+
+    writer = _Writer(output_path, out_fmt)
+    rows = 0
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=initargs) as pool:
+        chunks = iter_chunks(input_path, in_fmt, chunk_size)
+        try:
+            for chunk in chunks:
+                if id_columns is None:
+                    id_columns = [col for col in ('user_id', 'id') if col in chunk.columns]
+                exercises_column = next((c for c in ('exercises', 'exercises_json') if c in chunk.columns), None)
+                pending.append(pool.submit(score_chunk, chunk, id_columns, exercises_column))
+                # Write in input order and keep at most 2 chunks per worker in memory.
+                while len(pending) >= 2 * workers:
+                    frame = pending.popleft().result()
+                    writer.write(frame)
+                    rows += len(frame)
+            while pending:
+                frame = pending.popleft().result()
+                writer.write(frame)
+                rows += len(frame)
+        finally:
+            writer.close()
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('input')
+    parser.add_argument('output')
+    parser.add_argument('--chunk-size', type=int, default=50_000)
+    parser.add_argument('--workers', type=int, default=None, help='default: number of CPUs')
+    parser.add_argument('--input-format', choices=('csv', 'parquet'))
+    parser.add_argument('--output-format', choices=('csv', 'parquet'))
+    parser.add_argument('--id-columns', help='comma-separated columns copied to the output (default: user_id/id if present)')
+    parser.add_argument('--fat-model')
+    parser.add_argument('--water-model')
+    parser.add_argument('--exercise-csv')
+    parser.add_argument('--ideal-fat-csv')
+    args = parser.parse_args(argv)
+
+    rows = run(
+        args.input,
+        args.output,
+        chunk_size=args.chunk_size,
+        workers=args.workers,
+        fat_model=args.fat_model,
+        water_model=args.water_model,
+        exercise_csv=args.exercise_csv,
+        ideal_fat_csv=args.ideal_fat_csv,
+        input_format=args.input_format,
+        output_format=args.output_format,
+        id_columns=args.id_columns.split(',') if args.id_columns else None,
+    )
+    print(f'scored {rows} rows -> {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,212 @@
+"""Array-backed serving format for the fat/water models, evaluated with NumPy alone.
+
+``compile_model`` turns a fitted scikit-learn regressor into plain arrays:
+coefficients and intercept for linear models; flattened node arrays
+(feature, threshold, children, leaf value) for decision trees, random forests,
+extra trees and gradient boosting. ``save``/``load_compiled`` store them as an
+``.npz`` file, and the compiled model's ``predict`` runs on NumPy only, with
+no sklearn input validation and no pandas. ``ModelRegistry`` loads any model
+path ending in ``.npz`` this way.
+
+Export the pickles (each is checked against ``model.predict`` first):
+
+    python compiled_model.py fat_model.pkl water_model.pkl
+"""
+import argparse
+import os
+
+import numpy as np
+
+COMPILED_SUFFIX = '.npz'
+FORMAT_VERSION = 1
+TREE_LEAF = -1
+
+
+class CompiledLinear:
+    kind = 'linear'
+
+    def __init__(self, feature_names, coef, intercept: float):
+        self.feature_names_in_ = feature_names
+        self.coef = np.ascontiguousarray(coef, dtype=np.float64)
+        self.intercept = float(intercept)
+        self.n_features_in_ = len(self.coef)
+
+    def predict(self, X) -> np.ndarray:
+        return np.asarray(X, dtype=np.float64) @ self.coef + self.intercept
+
+    def arrays(self) -> dict:
+        return {'coef': self.coef, 'intercept': np.float64(self.intercept)}
+
+    @classmethod
+    def from_arrays(cls, feature_names, arrays):
+        return cls(feature_names, arrays['coef'], arrays['intercept'])
+
+
+class CompiledTrees:
+    """One or more regression trees, flattened into shared node arrays.
+
+    ``roots`` holds each tree's first node; child indices are absolute, with
+    ``TREE_LEAF`` marking leaves. The prediction is ``base + scale * sum`` of
+    the leaf values reached, which covers a single tree (0, 1), a forest's mean
+    (0, 1 / n_trees) and gradient boosting (initial estimate, learning rate).
+    All rows walk all trees together, one level per step, for as many steps as
+    the deepest tree has levels; leaves point back at themselves so rows that
+    reached one stay put.
+    """
+
+    kind = 'trees'
+
+    def __init__(self, feature_names, n_features: int, feature, threshold, left, right, value, roots,
+                 base: float = 0.0, scale: float = 1.0):
+        self.feature_names_in_ = feature_names
+        self.n_features_in_ = int(n_features)
+        self.feature = np.ascontiguousarray(feature, dtype=np.intp)
+        self.threshold = np.ascontiguousarray(threshold, dtype=np.float64)
+        self.left = np.ascontiguousarray(left, dtype=np.intp)
+        self.right = np.ascontiguousarray(right, dtype=np.intp)
+        self.value = np.ascontiguousarray(value, dtype=np.float64)
+        self.roots = np.ascontiguousarray(roots, dtype=np.intp)
+        self.base = float(base)
+        self.scale = float(scale)
+        leaf = self.left == TREE_LEAF
+        nodes = np.arange(len(self.left))
+        # children[2 * node] is the left child, children[2 * node + 1] the right one.
+        self._children = np.column_stack([np.where(leaf, nodes, self.left), np.where(leaf, nodes, self.right)]).ravel()
+        self._depth = 0
+        frontier = self.roots
+        while True:
+            frontier = frontier[self.left[frontier] != TREE_LEAF]
+            if not len(frontier):
+                break
+            frontier = np.concatenate([self.left[frontier], self.right[frontier]])
+            self._depth += 1
+
+    def predict(self, X) -> np.ndarray:
+        # sklearn compares float32 features against float64 thresholds.
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        flat = X.ravel()
+        row_offsets = (np.arange(len(X)) * X.shape[1])[:, None]
+        node = np.tile(self.roots, (len(X), 1))
+        for _ in range(self._depth):
+            go_right = flat[row_offsets + self.feature[node]] > self.threshold[node]
+            node = self._children[2 * node + go_right]
+        return self.base + self.scale * self.value[node].sum(axis=1)
+
+    def arrays(self) -> dict:
+        return {
+            'n_features': np.int64(self.n_features_in_), 'feature': self.feature, 'threshold': self.threshold,
+            'left': self.left, 'right': self.right, 'value': self.value, 'roots': self.roots,
+            'base': np.float64(self.base), 'scale': np.float64(self.scale),
+        }
+
+    @classmethod
+    def from_arrays(cls, feature_names, arrays):
+        return cls(feature_names, arrays['n_features'], arrays['feature'], arrays['threshold'], arrays['left'],
+                   arrays['right'], arrays['value'], arrays['roots'], arrays['base'], arrays['scale'])
+
+
+KINDS = {cls.kind: cls for cls in (CompiledLinear, CompiledTrees)}
+
+
+def _flatten_trees(trees) -> tuple:
+    feature, threshold, left, right, value, roots = [], [], [], [], [], []
+    offset = 0
+    for tree in trees:
+        if tree.value.shape[1] != 1:
+            raise TypeError('only single-output regressors can be compiled')
+        # Leaves carry feature -2; any valid column index keeps the gather in bounds.
+        feature.append(np.maximum(tree.feature, 0))
+        threshold.append(tree.threshold)
+        left.append(np.where(tree.children_left == TREE_LEAF, TREE_LEAF, tree.children_left + offset))
+        right.append(np.where(tree.children_right == TREE_LEAF, TREE_LEAF, tree.children_right + offset))
+        value.append(tree.value[:, 0, 0])
+        roots.append(offset)
+        offset += tree.node_count
+    return tuple(np.concatenate(parts) for parts in (feature, threshold, left, right, value)) + (np.array(roots),)
+
+
+def _gradient_boosting_base(model) -> float:
+    init = model.init_
+    if init == 'zero':
+        return 0.0
+    if hasattr(init, 'constant_'):
+        return float(np.ravel(init.constant_)[0])
+    raise TypeError(f'cannot compile a gradient boosting init estimator of type {type(init).__name__}')
+
+
+def compile_model(model):
+    """An array-backed equivalent of a fitted sklearn regressor."""
+    feature_names = getattr(model, 'feature_names_in_', None)
+    if hasattr(model, 'coef_') and hasattr(model, 'intercept_'):
+        coef = np.asarray(model.coef_, dtype=np.float64)
+        if coef.ndim > 1 and coef.shape[0] != 1:
+            raise TypeError('only single-output regressors can be compiled')
+        return CompiledLinear(feature_names, coef.ravel(), np.ravel(model.intercept_)[0])
+    if hasattr(model, 'tree_'):
+        return CompiledTrees(feature_names, model.n_features_in_, *_flatten_trees([model.tree_]))
+    estimators = getattr(model, 'estimators_', None)
+    if estimators is not None and hasattr(model, 'learning_rate') and hasattr(model, 'init_'):
+        trees = [est.tree_ for est in np.ravel(estimators)]
+        return CompiledTrees(feature_names, model.n_features_in_, *_flatten_trees(trees),
+                             base=_gradient_boosting_base(model), scale=model.learning_rate)
+    if estimators is not None and all(hasattr(est, 'tree_') for est in estimators):
+        return CompiledTrees(feature_names, model.n_features_in_, *_flatten_trees([est.tree_ for est in estimators]),
+                             scale=1.0 / len(estimators))
+    raise TypeError(f'cannot compile a model of type {type(model).__name__}')
+
+
+def save(compiled, path: str):
+    names = compiled.feature_names_in_
+    np.savez(
+        path, format_version=np.int64(FORMAT_VERSION), kind=np.array(compiled.kind),
+        feature_names=np.array([] if names is None else [str(name) for name in names], dtype=str),
+        has_feature_names=np.bool_(names is not None), **compiled.arrays(),
+    )
+
+
+def load_compiled(path: str):
+    with np.load(path, allow_pickle=False) as data:
+        arrays = {key: data[key] for key in data.files}
+    if int(arrays['format_version']) != FORMAT_VERSION:
+        raise ValueError(f'{path} has compiled model format {int(arrays["format_version"])}, expected {FORMAT_VERSION}')
+    feature_names = arrays['feature_names'].astype(object) if arrays['has_feature_names'] else None
+    return KINDS[str(arrays['kind'])].from_arrays(feature_names, arrays)
+
+
+def check_compiled(model, compiled, rows: int = 2000, seed: int = 0) -> float:
+    """Largest absolute difference from ``model.predict`` over random rows; raises past tolerance."""
+    rng = np.random.default_rng(seed)
+    X = rng.uniform(0, 100, size=(rows, compiled.n_features_in_))
+    if compiled.feature_names_in_ is not None:
+        for idx, name in enumerate(compiled.feature_names_in_):
+            if str(name).startswith('Gender'):
+                X[:, idx] = rng.integers(0, 2, rows)
+    expected = np.ravel(model.predict(X))
+    actual = compiled.predict(X)
+    if not np.allclose(actual, expected, rtol=1e-9, atol=1e-9):
+        raise AssertionError(f'compiled predictions differ from model.predict by up to {np.abs(actual - expected).max()}')
+    return float(np.abs(actual - expected).max())
+
+
+def main():
+    import warnings
+
+    import joblib
+
+    warnings.filterwarnings('ignore')
+    parser = argparse.ArgumentParser(description='Compile model pickles into the .npz serving format.')
+    parser.add_argument('models', nargs='+', help='model pickles, e.g. fat_model.pkl')
+    parser.add_argument('--out-dir', help='where to write the .npz files (default: next to each pickle)')
+    args = parser.parse_args()
+    for path in args.models:
+        model = joblib.load(path)
+        compiled = compile_model(model)
+        max_diff = check_compiled(model, compiled)
+        stem = os.path.splitext(os.path.basename(path))[0]
+        out = os.path.join(args.out_dir or os.path.dirname(os.path.abspath(path)), stem + COMPILED_SUFFIX)
+        save(compiled, out)
+        print(f'{path} -> {out}  ({compiled.kind}, max |diff| {max_diff:.3g})')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,470 @@
+import json
+import math
+import queue
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+
+# WAL lets profile reads proceed while another connection writes; NORMAL sync
+# is durable across application crashes in WAL mode and skips most fsyncs.
+PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA busy_timeout=5000',
+    'PRAGMA cache_size=-8000',
+)
+
+# Pooled connections keep their prepared statements in sqlite3's per-connection
+# statement cache, so the fixed queries below are only compiled once each.
+STATEMENT_CACHE_SIZE = 64
+
+SELECT_USER_BY_ID = 'SELECT id, email, name FROM users WHERE id=?'
+SELECT_USER_BY_EMAIL = 'SELECT * FROM users WHERE email=?'
+INSERT_USER = 'INSERT INTO users(email, password_hash, name) VALUES (?, ?, ?)'
+UPDATE_PASSWORD_HASH = 'UPDATE users SET password_hash=? WHERE id=?'
+UPDATE_USER_NAME = 'UPDATE users SET name=? WHERE id=?'
+REPLACE_PROFILE = 'REPLACE INTO profiles(user_id, age, gender, weight, height, session_duration, frequency, exercises_json) VALUES (?, ?, ?, ?, ?, ?, ?, ?)'
+SELECT_PROFILE_WITH_EXERCISES = (
+    'SELECT p.age, p.gender, p.weight, p.height, p.session_duration, p.frequency, p.exercises_json, '
+    'e.exercise, e.reps, e.sets '
+    'FROM profiles p LEFT JOIN profile_exercises e ON e.user_id = p.user_id '
+    'WHERE p.user_id=? ORDER BY e.position'
+)
+SELECT_PROFILE_AGE = 'SELECT age FROM profiles WHERE user_id=?'
+DELETE_PROFILE_EXERCISES = 'DELETE FROM profile_exercises WHERE user_id=?'
+INSERT_PROFILE_EXERCISE = 'INSERT INTO profile_exercises(user_id, position, exercise, reps, sets) VALUES (?, ?, ?, ?, ?)'
+
+INSERT_PREDICTION = (
+    'INSERT INTO predictions(user_id, created_at, fat_pred, water_pred, ideal_fat, total_rep_increase) '
+    'VALUES (?, ?, ?, ?, ?, ?)'
+)
+# Newest first, keyset-paged on (created_at, id) so deep pages stay index seeks.
+SELECT_PREDICTIONS_PAGE = (
+    'SELECT id, created_at, fat_pred, water_pred, ideal_fat, total_rep_increase FROM predictions '
+    'WHERE user_id=? AND (created_at, id) < (?, ?) ORDER BY created_at DESC, id DESC LIMIT ?'
+)
+# The row that leaves a trend window of N when a newer row is added: the Nth newest before it.
+SELECT_PREDICTION_AT_OFFSET = (
+    'SELECT created_at, fat_pred FROM predictions '
+    'WHERE user_id=? AND (created_at, id) < (?, ?) ORDER BY created_at DESC, id DESC LIMIT 1 OFFSET ?'
+)
+SELECT_TREND = 'SELECT * FROM prediction_trends WHERE user_id=?'
+# Takes the write lock up front, so trends read in the transaction can't change before it commits.
+BEGIN_IMMEDIATE = 'BEGIN IMMEDIATE'
+REPLACE_TREND = (
+    'REPLACE INTO prediction_trends(user_id, count, origin, window_n, sum_t, sum_y, sum_tt, sum_ty, ema, '
+    'last_fat, last_ideal_fat, last_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)'
+)
+
+SELECT_SESSION = 'SELECT user_id, data, expires_at FROM sessions WHERE sid=? AND expires_at > ?'
+REPLACE_SESSION = 'REPLACE INTO sessions(sid, user_id, data, expires_at) VALUES (?, ?, ?, ?)'
+DELETE_SESSION = 'DELETE FROM sessions WHERE sid=?'
+# Drops one key (a JSON path such as '$._user') from every session a user has open.
+FORGET_SESSION_KEY = 'UPDATE sessions SET data = json_remove(data, ?) WHERE user_id=?'
+DELETE_EXPIRED_SESSIONS = 'DELETE FROM sessions WHERE expires_at <= ?'
+COUNT_SESSIONS = 'SELECT COUNT(*) FROM sessions'
+
+# Cohort analytics (analytics.py), over profiles with lower < age <= upper.
+# One row per profile with its Total_Reps summed in SQL; ?1 is the exercise
+# intensity map as a JSON object, materialized once so the join can index it.
+SELECT_COHORT_PROFILES = (
+    'WITH intensity(name, value) AS MATERIALIZED (SELECT key, value FROM json_each(?1)) '
+    'SELECT p.age, p.gender, p.weight, p.height, p.session_duration, p.frequency, '
+    "p.exercises_json IS NOT NULL AND p.exercises_json <> '{}' AS legacy, "
+    'COALESCE(SUM(e.reps * e.sets * COALESCE(i.value, 100) / 100.0), 0) AS total_reps '
+    'FROM profiles p LEFT JOIN profile_exercises e ON e.user_id = p.user_id '
+    'LEFT JOIN intensity i ON i.name = e.exercise '
+    'WHERE p.age > ?2 AND p.age <= ?3 GROUP BY p.user_id'
+)
+SELECT_COHORT_EXERCISES = (
+    'SELECT e.exercise, COUNT(*) AS profiles, SUM(e.reps) AS reps, SUM(e.sets) AS sets '
+    'FROM profiles p JOIN profile_exercises e ON e.user_id = p.user_id '
+    'WHERE p.age > ? AND p.age <= ? GROUP BY e.exercise HAVING COUNT(DISTINCT e.user_id) >= ?'
+)
+
+PROFILE_FIELDS = ('age', 'gender', 'weight', 'height', 'session_duration', 'frequency')
+TREND_FIELDS = ('count', 'origin', 'window_n', 'sum_t', 'sum_y', 'sum_tt', 'sum_ty', 'ema', 'last_fat',
+                'last_ideal_fat', 'last_at')
+
+SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        email TEXT UNIQUE NOT NULL,
+        password_hash TEXT NOT NULL,
+        name TEXT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS profiles (
+        user_id INTEGER PRIMARY KEY,
+        age INTEGER,
+        gender TEXT,
+        weight REAL,
+        height REAL,
+        session_duration REAL,
+        frequency INTEGER,
+        exercises_json TEXT,
+        FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE
+    )
+    """,
+    # One row per exercise in a user's plan; position keeps the client's order.
+    """
+    CREATE TABLE IF NOT EXISTS profile_exercises (
+        user_id INTEGER NOT NULL,
+        position INTEGER NOT NULL,
+        exercise TEXT NOT NULL,
+        reps INTEGER,
+        sets INTEGER,
+        PRIMARY KEY (user_id, exercise),
+        FOREIGN KEY(user_id) REFERENCES profiles(user_id) ON DELETE CASCADE
+    )
+    """,
+    'CREATE INDEX IF NOT EXISTS idx_profile_exercises_exercise_sets ON profile_exercises(exercise, sets)',
+    'CREATE INDEX IF NOT EXISTS idx_profile_exercises_exercise_reps ON profile_exercises(exercise, reps)',
+    'CREATE INDEX IF NOT EXISTS idx_profiles_age ON profiles(age)',
+    # Append-only history of signed-in users' /predict results.
+    """
+    CREATE TABLE IF NOT EXISTS predictions (
+        id INTEGER PRIMARY KEY,
+        user_id INTEGER NOT NULL,
+        created_at REAL NOT NULL,
+        fat_pred REAL NOT NULL,
+        water_pred REAL,
+        ideal_fat REAL,
+        total_rep_increase INTEGER,
+        FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE
+    )
+    """,
+    'CREATE INDEX IF NOT EXISTS idx_predictions_user_created ON predictions(user_id, created_at)',
+    # Running sums over each user's latest predictions, updated as rows are appended
+    # (see history.py); t is in days since the user's first prediction (origin).
+    """
+    CREATE TABLE IF NOT EXISTS prediction_trends (
+        user_id INTEGER PRIMARY KEY,
+        count INTEGER NOT NULL,
+        origin REAL NOT NULL,
+        window_n INTEGER NOT NULL,
+        sum_t REAL NOT NULL,
+        sum_y REAL NOT NULL,
+        sum_tt REAL NOT NULL,
+        sum_ty REAL NOT NULL,
+        ema REAL NOT NULL,
+        last_fat REAL NOT NULL,
+        last_ideal_fat REAL,
+        last_at REAL NOT NULL,
+        FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE
+    )
+    """,
+    # Server-side sessions (sessions.py); data is the session's JSON, user_id is
+    # copied out of it so a user's sessions can be found when their row changes.
+    """
+    CREATE TABLE IF NOT EXISTS sessions (
+        sid TEXT PRIMARY KEY,
+        user_id INTEGER,
+        data TEXT NOT NULL,
+        expires_at REAL NOT NULL
+    )
+    """,
+    'CREATE INDEX IF NOT EXISTS idx_sessions_user ON sessions(user_id)',
+    'CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions(expires_at)',
+)
+
+
+# Query label for the db_query_seconds histogram, keyed by the SQL text itself.
+QUERY_NAMES = {
+    SELECT_USER_BY_ID: 'select_user_by_id',
+    SELECT_USER_BY_EMAIL: 'select_user_by_email',
+    INSERT_USER: 'insert_user',
+    UPDATE_PASSWORD_HASH: 'update_password_hash',
+    UPDATE_USER_NAME: 'update_user_name',
+    REPLACE_PROFILE: 'replace_profile',
+    SELECT_PROFILE_WITH_EXERCISES: 'select_profile_with_exercises',
+    SELECT_PROFILE_AGE: 'select_profile_age',
+    DELETE_PROFILE_EXERCISES: 'delete_profile_exercises',
+    INSERT_PROFILE_EXERCISE: 'insert_profile_exercise',
+    INSERT_PREDICTION: 'insert_prediction',
+    SELECT_PREDICTIONS_PAGE: 'select_predictions_page',
+    SELECT_PREDICTION_AT_OFFSET: 'select_prediction_at_offset',
+    SELECT_TREND: 'select_trend',
+    REPLACE_TREND: 'replace_trend',
+    SELECT_SESSION: 'select_session',
+    REPLACE_SESSION: 'replace_session',
+    DELETE_SESSION: 'delete_session',
+    FORGET_SESSION_KEY: 'forget_session_key',
+    DELETE_EXPIRED_SESSIONS: 'delete_expired_sessions',
+    COUNT_SESSIONS: 'count_sessions',
+    SELECT_COHORT_PROFILES: 'select_cohort_profiles',
+    SELECT_COHORT_EXERCISES: 'select_cohort_exercises',
+}
+_query_series = {}
+_COMMIT_SECONDS = metrics.DB_QUERY_SECONDS.labels('commit')
+
+
+def _observe_query(sql: str, seconds: float):
+    series = _query_series.get(sql)
+    if series is None:
+        series = _query_series[sql] = metrics.DB_QUERY_SECONDS.labels(QUERY_NAMES.get(sql, 'other'))
+    series.observe(seconds)
+
+
+class TimedConnection(sqlite3.Connection):
+    """A connection that records each statement's execution time in ``metrics``."""
+
+    def execute(self, sql, parameters=()):
+        if not metrics.ENABLED:
+            return super().execute(sql, parameters)
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            _observe_query(sql, time.perf_counter() - start)
+
+    def executemany(self, sql, seq_of_parameters):
+        if not metrics.ENABLED:
+            return super().executemany(sql, seq_of_parameters)
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            _observe_query(sql, time.perf_counter() - start)
+
+    def commit(self):
+        if not metrics.ENABLED:
+            return super().commit()
+        start = time.perf_counter()
+        try:
+            return super().commit()
+        finally:
+            _COMMIT_SECONDS.observe(time.perf_counter() - start)
+
+
+def connect(path: str, pragmas=PRAGMAS) -> sqlite3.Connection:
+    conn = sqlite3.connect(
+        path,
+        check_same_thread=False,
+        cached_statements=STATEMENT_CACHE_SIZE,
+        factory=TimedConnection,
+    )
+    conn.row_factory = sqlite3.Row
+    for pragma in pragmas:
+        conn.execute(pragma)
+    return conn
+
+
+# Bump whenever SCHEMA or a data migration changes; databases record the
+# version they were brought up to in PRAGMA user_version.
+SCHEMA_VERSION = 4
+
+
+def create_schema(conn: sqlite3.Connection):
+    for ddl in SCHEMA:
+        conn.execute(ddl)
+    conn.commit()
+    migrate_profile_exercises(conn)
+    conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+    conn.commit()
+
+
+def ensure_schema(conn: sqlite3.Connection) -> bool:
+    """Run ``create_schema`` unless the database is already at SCHEMA_VERSION; True if it ran."""
+    if conn.execute('PRAGMA user_version').fetchone()[0] >= SCHEMA_VERSION:
+        return False
+    create_schema(conn)
+    return True
+
+
+def _plan_number(value, field: str, ex: str):
+    # Reps/Sets as stored: numbers as they are, numeric strings parsed, anything else rejected.
+    if value is None:
+        return None
+    if isinstance(value, str):
+        try:
+            value = int(value)
+        except ValueError:
+            try:
+                value = float(value)
+            except ValueError:
+                raise ValueError(f'{field} for {ex} must be a number') from None
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+        raise ValueError(f'{field} for {ex} must be a number')
+    return value
+
+
+# Stored in profiles.exercises_json for an empty plan, which has no rows to keep.
+EMPTY_PLAN_JSON = '{}'
+
+
+def parse_exercises_json(exercises_json):
+    """Exercise rows (name, reps, sets) from a client ``exercises_json`` string.
+
+    Returns None when the string isn't a JSON object of ``{name: {Reps, Sets}}``
+    so the caller can keep it as an opaque blob instead, and raises ValueError
+    when it is one but a Reps or Sets value isn't a number.
+    """
+    if exercises_json is None:
+        return []
+    try:
+        plan = json.loads(exercises_json)
+    except (TypeError, ValueError):
+        return None
+    if not isinstance(plan, dict):
+        return None
+    rows = []
+    for ex, vals in plan.items():
+        if not isinstance(vals, dict):
+            return None
+        rows.append((ex, _plan_number(vals.get('Reps'), 'Reps', ex), _plan_number(vals.get('Sets'), 'Sets', ex)))
+    return rows
+
+
+def dump_exercises_json(rows) -> str:
+    # Compact separators, like the dashboard's JSON.stringify.
+    return json.dumps({ex: {'Reps': reps, 'Sets': sets} for ex, reps, sets in rows}, separators=(',', ':'))
+
+
+def _write_profile_exercises(conn, user_id, rows):
+    conn.execute(DELETE_PROFILE_EXERCISES, (user_id,))
+    conn.executemany(
+        INSERT_PROFILE_EXERCISE,
+        [(user_id, position, ex, reps, sets) for position, (ex, reps, sets) in enumerate(rows)],
+    )
+
+
+def migrate_profile_exercises(conn: sqlite3.Connection, batch_size: int = 500):
+    """Backfill profile_exercises from legacy exercises_json blobs.
+
+    Migrated profiles get exercises_json set to NULL (``EMPTY_PLAN_JSON`` for an
+    empty plan); blobs that don't parse are left in place and keep being served
+    as they are. Safe to re-run.
+    """
+    last_id = 0
+    while True:
+        pending = conn.execute(
+            'SELECT user_id, exercises_json FROM profiles '
+            'WHERE exercises_json IS NOT NULL AND user_id > ? ORDER BY user_id LIMIT ?',
+            (last_id, batch_size),
+        ).fetchall()
+        if not pending:
+            return
+        with conn:
+            for user_id, exercises_json in pending:
+                try:
+                    rows = parse_exercises_json(exercises_json)
+                except ValueError:
+                    continue
+                if rows is None:
+                    continue
+                _write_profile_exercises(conn, user_id, rows)
+                conn.execute('UPDATE profiles SET exercises_json = ? WHERE user_id=?',
+                             (None if rows else EMPTY_PLAN_JSON, user_id))
+        last_id = pending[-1][0]
+
+
+def load_profile(conn: sqlite3.Connection, user_id: int):
+    """The profile as /api/profile returns it, or None if there is none.
+
+    A single statement, so the profile and its exercises come from one snapshot.
+    ``exercises_json`` is None when no plan was saved.
+    """
+    rows = conn.execute(SELECT_PROFILE_WITH_EXERCISES, (user_id,)).fetchall()
+    if not rows:
+        return None
+    profile = {field: rows[0][field] for field in PROFILE_FIELDS}
+    legacy_json = rows[0]['exercises_json']
+    if legacy_json is not None:
+        profile['exercises_json'] = legacy_json
+    else:
+        exercises = [(row['exercise'], row['reps'], row['sets']) for row in rows if row['exercise'] is not None]
+        profile['exercises_json'] = dump_exercises_json(exercises) if exercises else None
+    return profile
+
+
+def update_user_name(conn: sqlite3.Connection, user_id: int, name: str):
+    with conn:
+        conn.execute(UPDATE_USER_NAME, (name, user_id))
+
+
+def save_profile(conn: sqlite3.Connection, user_id: int, profile: dict, exercises_json):
+    """Replace the user's profile and plan; returns the age it had before (None if it is new).
+
+    Raises ValueError, before writing anything, if a Reps or Sets value isn't a number.
+    """
+    rows = parse_exercises_json(exercises_json)
+    if rows is None:
+        # Anything that isn't a {name: {Reps, Sets}} object is kept verbatim.
+        legacy_json = exercises_json
+    elif not rows and exercises_json is not None:
+        legacy_json = EMPTY_PLAN_JSON
+    else:
+        legacy_json = None
+    with conn:
+        previous = conn.execute(SELECT_PROFILE_AGE, (user_id,)).fetchone()
+        conn.execute(REPLACE_PROFILE, (user_id,) + tuple(profile.get(field) for field in PROFILE_FIELDS) + (legacy_json,))
+        _write_profile_exercises(conn, user_id, rows or [])
+    return None if previous is None else previous['age']
+
+
+class ConnectionPool:
+    """Reuses tuned SQLite connections across requests.
+
+    ``acquire`` hands out an idle connection or opens a new one, so concurrent
+    requests never wait on the pool itself; ``release`` rolls back anything
+    left uncommitted and keeps up to ``max_idle`` connections for reuse.
+    """
+
+    def __init__(self, path: str, max_idle: int = 8):
+        self.path = path
+        self._idle = queue.LifoQueue(maxsize=max_idle)
+
+    def acquire(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return connect(self.path)
+
+    def release(self, conn: sqlite3.Connection):
+        if conn.in_transaction:
+            conn.rollback()
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def close_all(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class AsyncDB:
+    """Runs db functions on pooled connections in a bounded thread pool, for asyncio callers.
+
+    ``await async_db.run(load_profile, user_id)`` calls ``load_profile(conn, user_id)``
+    off the event loop; at most ``workers`` connections are busy at once.
+    """
+
+    def __init__(self, pool: ConnectionPool, workers: int = 4):
+        # Imported here so the WSGI app, which never builds an AsyncDB, skips asyncio.
+        import asyncio
+
+        self.pool = pool
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='db')
+        self._running_loop = asyncio.get_running_loop
+
+    def _call(self, fn, args):
+        conn = self.pool.acquire()
+        try:
+            return fn(conn, *args)
+        finally:
+            self.pool.release(conn)
+
+    async def run(self, fn, *args):
+        return await self._running_loop().run_in_executor(self._executor, self._call, fn, args)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
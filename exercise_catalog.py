@@ -0,0 +1,204 @@
+import bisect
+import csv
+import hashlib
+import json
+import os
+import re
+from collections import defaultdict
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+EXERCISE_CSV_PATH = os.path.join(BASE_DIR, 'exercise_intensity_new.csv')
+EXERCISE_ARTIFACT_PATH = os.path.join(BASE_DIR, 'exercise_catalog.json')
+ARTIFACT_VERSION = 1
+
+_SEPARATORS = re.compile(r'[\s\-_/]+')
+_NON_WORD = re.compile(r'[^0-9a-z ]')
+
+
+def _singular(word: str) -> str:
+    if len(word) > 2 and word.endswith('s') and not word.endswith('ss'):
+        return word[:-1]
+    return word
+
+
+def normalize_name(name: str) -> str:
+    """Lookup key shared by spelling variants: "Push-ups", "Push Ups" -> "push up"."""
+    words = _NON_WORD.sub('', _SEPARATORS.sub(' ', str(name).lower())).split()
+    return ' '.join(_singular(word) for word in words)
+
+
+def _trigrams(key: str) -> set:
+    padded = f'  {key} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class ExerciseCatalog:
+    """Sorted, searchable index over exercise names.
+
+    Names that normalize to the same key (``Deadlift``/``Deadlifts``) become a
+    single entry under the first name in sorted order, with the rest kept as
+    aliases; extra ``aliases`` ({alias: name}) can be supplied as well. Search
+    ranks whole-name prefix matches first, then word-prefix matches, then
+    typo-tolerant trigram matches.
+    """
+
+    def __init__(self, names, aliases=None, min_similarity: float = 0.3):
+        self.min_similarity = min_similarity
+        by_key = {}
+        for name in sorted(set(str(n) for n in names), key=str.lower):
+            by_key.setdefault(normalize_name(name), []).append(name)
+
+        # Entries in display order; index i is the entry id used by every index below.
+        self.names = []
+        self.aliases = []
+        self.keys = []
+        for key, group in sorted(by_key.items(), key=lambda item: item[1][0].lower()):
+            self.names.append(group[0])
+            self.aliases.append(group[1:])
+            self.keys.append(key)
+        entry_by_name = {name: i for i, name in enumerate(self.names)}
+        for i, group in enumerate(self.aliases):
+            for alias in group:
+                entry_by_name[alias] = i
+        for alias, name in (aliases or {}).items():
+            if name in entry_by_name and alias not in entry_by_name:
+                entry_by_name[alias] = entry_by_name[name]
+                self.aliases[entry_by_name[name]].append(alias)
+        self.entry_by_name = entry_by_name
+
+        # Sorted (key, entry) pairs for whole-name prefix lookups, and the same for
+        # every later word onwards ("decline push up" -> "push up", "up").
+        names_index = []
+        words_index = []
+        trigram_index = defaultdict(list)
+        self._trigram_counts = []
+        for i in range(len(self.names)):
+            searchable = {self.keys[i]} | {normalize_name(alias) for alias in self.aliases[i]}
+            grams = set()
+            for key in searchable:
+                names_index.append((key, i))
+                words = key.split()
+                for start in range(1, len(words)):
+                    words_index.append((' '.join(words[start:]), i))
+                grams |= _trigrams(key)
+            for gram in grams:
+                trigram_index[gram].append(i)
+            self._trigram_counts.append(len(grams))
+        names_index.sort()
+        words_index.sort()
+        self._names_index = names_index
+        self._words_index = words_index
+        self._trigram_index = {gram: np.array(ids, dtype=np.int32) for gram, ids in trigram_index.items()}
+        self._trigram_counts = np.array(self._trigram_counts, dtype=np.float64)
+
+        digest = hashlib.sha1('\n'.join(f'{n}\t{"|".join(a)}' for n, a in zip(self.names, self.aliases)).encode())
+        self.version = digest.hexdigest()[:16]
+
+    def __len__(self):
+        return len(self.names)
+
+    def canonical(self, name: str):
+        """Display name of the entry ``name`` (or any alias of it) belongs to, else None."""
+        i = self.entry_by_name.get(name)
+        if i is None:
+            i = self._exact(normalize_name(name))
+        return None if i is None else self.names[i]
+
+    def _exact(self, key: str):
+        pos = bisect.bisect_left(self._names_index, (key, -1))
+        if pos < len(self._names_index) and self._names_index[pos][0] == key:
+            return self._names_index[pos][1]
+        return None
+
+    @staticmethod
+    def _prefix_scan(index: list, prefix: str, seen: set, out: list, limit: int):
+        pos = bisect.bisect_left(index, (prefix, -1))
+        while pos < len(index) and len(out) < limit:
+            key, i = index[pos]
+            if not key.startswith(prefix):
+                break
+            if i not in seen:
+                seen.add(i)
+                out.append(i)
+            pos += 1
+
+    def _fuzzy(self, key: str, seen: set, limit: int) -> list:
+        # Dice similarity of trigram sets, counted for every entry at once.
+        grams = _trigrams(key)
+        postings = [self._trigram_index[gram] for gram in grams if gram in self._trigram_index]
+        if not postings or limit <= 0:
+            return []
+        shared = np.bincount(np.concatenate(postings), minlength=len(self.names))
+        scores = 2 * shared / (len(grams) + self._trigram_counts)
+        if seen:
+            scores[list(seen)] = 0
+        candidates = np.flatnonzero(scores >= self.min_similarity)
+        if len(candidates) > limit:
+            candidates = candidates[np.argpartition(-scores[candidates], limit - 1)[:limit]]
+        # Best score first, ties in display order.
+        return candidates[np.lexsort((candidates, -scores[candidates]))].tolist()
+
+    def search(self, query: str, limit: int = 20) -> list:
+        """Up to ``limit`` matching entries as ``{'name', 'aliases', 'match'}`` dicts."""
+        key = normalize_name(query)
+        if not key:
+            return [self._result(i, 'all') for i in range(min(limit, len(self.names)))]
+        seen = set()
+        prefix, words = [], []
+        self._prefix_scan(self._names_index, key, seen, prefix, limit)
+        self._prefix_scan(self._words_index, key, seen, words, limit - len(prefix))
+        results = [self._result(i, 'prefix') for i in prefix] + [self._result(i, 'word') for i in words]
+        if len(results) < limit:
+            results += [self._result(i, 'fuzzy') for i in self._fuzzy(key, seen, limit - len(results))]
+        return results
+
+    def _result(self, i: int, match: str) -> dict:
+        return {'name': self.names[i], 'aliases': self.aliases[i], 'match': match}
+
+
+def read_exercise_csv(path: str = EXERCISE_CSV_PATH) -> dict:
+    """{exercise name: average calories per rep}, in file order."""
+    with open(path, newline='') as f:
+        return {row['Name of Exercise']: float(row['Average Calories Per Rep']) for row in csv.DictReader(f)}
+
+
+def _file_sha1(path: str) -> str:
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def build_artifact(csv_path: str = EXERCISE_CSV_PATH, artifact_path: str = EXERCISE_ARTIFACT_PATH) -> dict:
+    """Write the parsed exercise table as compact JSON, tagged with the CSV's digest."""
+    intensity = read_exercise_csv(csv_path)
+    artifact = {
+        'version': ARTIFACT_VERSION,
+        'source_sha1': _file_sha1(csv_path),
+        'names': list(intensity),
+        'calories_per_rep': list(intensity.values()),
+    }
+    with open(artifact_path, 'w') as f:
+        json.dump(artifact, f, separators=(',', ':'))
+    return intensity
+
+
+def load_exercise_intensity(csv_path: str = EXERCISE_CSV_PATH, artifact_path: str = EXERCISE_ARTIFACT_PATH) -> dict:
+    """The exercise table from the precomputed artifact, or from the CSV if the artifact is missing or stale.
+
+    The artifact is only used when its recorded digest matches the CSV on disk,
+    so an edited CSV takes effect even before the artifact is rebuilt.
+    """
+    try:
+        with open(artifact_path) as f:
+            artifact = json.load(f)
+    except (OSError, ValueError):
+        artifact = None
+    if artifact and artifact.get('version') == ARTIFACT_VERSION and artifact.get('source_sha1') == _file_sha1(csv_path):
+        return dict(zip(artifact['names'], artifact['calories_per_rep']))
+    return read_exercise_csv(csv_path)
+
+
+if __name__ == '__main__':
+    table = build_artifact()
+    print(f'{EXERCISE_ARTIFACT_PATH}: {len(table)} exercises from {EXERCISE_CSV_PATH}')
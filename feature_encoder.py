@@ -0,0 +1,75 @@
+import numpy as np
+
+GENDER_PREFIX = 'Gender_'
+
+
+class FeatureEncoder:
+    """Writes feature dicts straight into float64 rows in a model's column order.
+
+    Produces exactly what ``build_model_input`` would (one-hot ``Gender_<value>``
+    slots, 0 for any expected column the features don't provide, including a
+    raw ``Gender`` column, which ``get_dummies`` always drops) without going
+    through pandas.
+    """
+
+    def __init__(self, feature_names):
+        self.columns = [str(col) for col in feature_names]
+        self.value_slots = []   # (column index, feature key)
+        self.gender_slots = []  # (column index, gender value)
+        for idx, col in enumerate(self.columns):
+            if col.startswith(GENDER_PREFIX):
+                self.gender_slots.append((idx, col[len(GENDER_PREFIX):]))
+            elif col != 'Gender':
+                self.value_slots.append((idx, col))
+
+    @classmethod
+    def for_model(cls, model):
+        expected_cols = getattr(model, 'feature_names_in_', None)
+        if expected_cols is None:
+            return None
+        return cls(expected_cols)
+
+    def encode(self, features: dict) -> np.ndarray:
+        row = np.zeros((1, len(self.columns)), dtype=np.float64)
+        for idx, key in self.value_slots:
+            if key in features:
+                row[0, idx] = features[key]
+        gender = str(features.get('Gender'))
+        for idx, value in self.gender_slots:
+            if gender == value:
+                row[0, idx] = 1.0
+        return row
+
+    def encode_many(self, rows: list) -> np.ndarray:
+        out = np.zeros((len(rows), len(self.columns)), dtype=np.float64)
+        if not rows:
+            return out
+        for idx, key in self.value_slots:
+            if key in rows[0]:
+                out[:, idx] = np.fromiter((row[key] for row in rows), dtype=np.float64, count=len(rows))
+        if self.gender_slots:
+            genders = np.array([str(row.get('Gender')) for row in rows], dtype=object)
+            for idx, value in self.gender_slots:
+                out[:, idx] = genders == value
+        return out
+
+    def encode_columns(self, columns: dict, n: int) -> np.ndarray:
+        """Encode ``n`` rows given per feature as a scalar or a length-``n`` array."""
+        out = np.zeros((n, len(self.columns)), dtype=np.float64)
+        for idx, key in self.value_slots:
+            if key in columns:
+                out[:, idx] = columns[key]
+        if self.gender_slots:
+            genders = np.asarray(columns.get('Gender'), dtype=object)
+            if genders.ndim:
+                genders = np.array([str(g) for g in genders], dtype=object)
+            else:
+                genders = str(genders.item())
+            for idx, value in self.gender_slots:
+                out[:, idx] = genders == value
+        return out
+
+    def transform(self, features) -> np.ndarray:
+        if isinstance(features, dict):
+            return self.encode(features)
+        return self.encode_many(list(features))
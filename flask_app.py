@@ -1,195 +1,441 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for, session
-import pandas as pd
-import joblib
+from flask import Flask, Response, g, render_template, request, jsonify, redirect, url_for, session, stream_with_context
+import atexit
+import hashlib
+import json
 import os
 import sqlite3
-from werkzeug.security import generate_password_hash, check_password_hash
+import threading
+
+import db
+import metrics
+from analytics import CohortAnalytics
+from auth import HasherBusy, LoginRateLimiter, PasswordHasher
+from exercise_catalog import EXERCISE_ARTIFACT_PATH, ExerciseCatalog, load_exercise_intensity, normalize_name
+from history import HistoryWriter, load_history, parse_cursor
+from ideal_fat import IDEAL_FAT_CSV_PATH, IdealFatTable
+from microbatch import MicroBatcher
+from model_registry import ModelRegistry, ModelUnavailable
+from prediction import PredictionPipeline, server_timing_header
+from prediction_cache import PredictionCache
+from profiling import RequestProfiler
+from sessions import SESSION_STORES, USER_CACHE_KEY, ServerSession, ServerSideSessionInterface
+from sweep import GridTooLarge, run_sweep
 
 app = Flask(__name__)
 app.secret_key = os.environ.get('FLASK_SECRET_KEY', 'dev-secret-change-me')
 
-# Load models and data once at startup
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-MODEL_FAT_PATH = os.path.join(BASE_DIR, 'fat_model.pkl')
-MODEL_WATER_PATH = os.path.join(BASE_DIR, 'water_model.pkl')
+MODEL_FAT_PATH = os.environ.get('MODEL_FAT_PATH', os.path.join(BASE_DIR, 'fat_model.pkl'))
+MODEL_WATER_PATH = os.environ.get('MODEL_WATER_PATH', os.path.join(BASE_DIR, 'water_model.pkl'))
 EXERCISE_CSV_PATH = os.path.join(BASE_DIR, 'exercise_intensity_new.csv')
 
-model_fat = joblib.load(MODEL_FAT_PATH)
-model_water = joblib.load(MODEL_WATER_PATH)
-exercise_df = pd.read_csv(EXERCISE_CSV_PATH)
-exercise_intensity = exercise_df.set_index('Name of Exercise')['Average Calories Per Rep'].to_dict()
-
-DB_PATH = os.path.join(BASE_DIR, 'app.db')
+# Repeat /predict inputs are served from an LRU cache that the model registry
+# drops whenever it swaps in a new model. The exercise and ideal-fat tables are
+# read once at startup. PREDICTION_CACHE_SIZE=0 disables it.
+prediction_cache = PredictionCache(
+    max_size=int(os.environ.get('PREDICTION_CACHE_SIZE', '1024')),
+    ttl=float(os.environ.get('PREDICTION_CACHE_TTL', '300')),
+)
+
+# Models load on first use, memory-mapped so forked workers share their arrays,
+# and are swapped for new versions when the pickles change on disk.
+model_registry = ModelRegistry(
+    {'fat': MODEL_FAT_PATH, 'water': MODEL_WATER_PATH},
+    mmap_mode=os.environ.get('MODEL_MMAP_MODE', 'r') or None,
+    check_interval=float(os.environ.get('MODEL_CHECK_INTERVAL', '1')),
+    on_swap=lambda name: prediction_cache.clear(),
+)
+
+# Read from the precomputed exercise_catalog.json (python exercise_catalog.py
+# rebuilds it) while it matches the CSV, so startup needs neither pandas nor a parse.
+exercise_intensity = load_exercise_intensity(EXERCISE_CSV_PATH, EXERCISE_ARTIFACT_PATH)
+# Sorted and indexed once here rather than on every /exercises request.
+exercise_names = sorted(exercise_intensity.keys())
+exercise_catalog = ExerciseCatalog(exercise_names)
+EXERCISE_SEARCH_MAX_LIMIT = 100
+
+# IDEAL_FAT_TABLE_PATH swaps in another gender x age-bracket reference table.
+IDEAL_FAT_TABLE_PATH = os.environ.get('IDEAL_FAT_TABLE_PATH', IDEAL_FAT_CSV_PATH)
+ideal_fat_table = IdealFatTable.from_csv(IDEAL_FAT_TABLE_PATH)
+
+# Largest what-if grid /predict/sweep will score in one request.
+SWEEP_MAX_GRID_SIZE = int(os.environ.get('SWEEP_MAX_GRID_SIZE', '10000'))
+# Longest JSON array /predict/batch scores in one request; NDJSON streams in chunks and has no limit.
+BATCH_MAX_ROWS = int(os.environ.get('BATCH_MAX_ROWS', '10000'))
+
+PREDICT_CONCURRENT_MODELS = os.environ.get('PREDICT_CONCURRENT_MODELS', '0') == '1'
+# PREDICT_MICROBATCH=1 coalesces concurrent /predict calls into shared model calls,
+# waiting at most PREDICT_MICROBATCH_WAIT_MS for up to PREDICT_MICROBATCH_MAX_ROWS rows.
+micro_batcher = None
+if os.environ.get('PREDICT_MICROBATCH', '0') == '1':
+    micro_batcher = MicroBatcher(
+        max_rows=int(os.environ.get('PREDICT_MICROBATCH_MAX_ROWS', '64')),
+        max_wait=float(os.environ.get('PREDICT_MICROBATCH_WAIT_MS', '2')) / 1000,
+    )
+_pipeline = None
+_pipeline_lock = threading.Lock()
+
+
+def get_pipeline() -> PredictionPipeline:
+    # Both models share one feature derivation and encoding pass per request;
+    # PREDICT_CONCURRENT_MODELS=1 also runs the two models side by side. The
+    # pipeline is rebuilt whenever the registry hands out a reloaded model.
+    global _pipeline
+    model_fat = model_registry.get('fat')
+    model_water = model_registry.get('water')
+    current = _pipeline
+    if current is None or current.model_fat is not model_fat or current.model_water is not model_water:
+        with _pipeline_lock:
+            current = _pipeline
+            if current is None or current.model_fat is not model_fat or current.model_water is not model_water:
+                current = _pipeline = PredictionPipeline(
+                    model_fat,
+                    model_water,
+                    exercise_intensity,
+                    concurrent=PREDICT_CONCURRENT_MODELS,
+                    cache=prediction_cache,
+                    ideal_fat_table=ideal_fat_table,
+                    batcher=micro_batcher,
+                )
+    return current
+
+# Password hashing runs on a small process pool so key derivation doesn't pin
+# request threads; PASSWORD_HASH_WORKERS=0 hashes inline instead.
+password_hasher = PasswordHasher(
+    method=os.environ.get('PASSWORD_HASH_METHOD', 'scrypt'),
+    iterations=int(os.environ.get('PASSWORD_HASH_ITERATIONS', '0')) or None,
+    workers=int(os.environ.get('PASSWORD_HASH_WORKERS', '2')),
+)
+# Failed sign-ins are limited per email and per client IP, checked before any hashing.
+email_limiter = LoginRateLimiter(
+    max_failures=int(os.environ.get('LOGIN_MAX_FAILURES_PER_EMAIL', '5')),
+    window=float(os.environ.get('LOGIN_FAILURE_WINDOW', '300')),
+)
+ip_limiter = LoginRateLimiter(
+    max_failures=int(os.environ.get('LOGIN_MAX_FAILURES_PER_IP', '20')),
+    window=float(os.environ.get('LOGIN_FAILURE_WINDOW', '300')),
+)
+
+DB_PATH = os.environ.get('APP_DB_PATH', os.path.join(BASE_DIR, 'app.db'))
+db_pool = db.ConnectionPool(DB_PATH, max_idle=int(os.environ.get('DB_POOL_SIZE', '8')))
 
 def get_db():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+    # One pooled connection per app context, handed back in release_db.
+    if 'db' not in g:
+        g.db = db_pool.acquire()
+    return g.db
+
+@app.teardown_appcontext
+def release_db(exc):
+    conn = g.pop('db', None)
+    if conn is not None:
+        db_pool.release(conn)
 
 def init_db():
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            email TEXT UNIQUE NOT NULL,
-            password_hash TEXT NOT NULL,
-            name TEXT
-        )
-        """
-    )
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS profiles (
-            user_id INTEGER PRIMARY KEY,
-            age INTEGER,
-            gender TEXT,
-            weight REAL,
-            height REAL,
-            session_duration REAL,
-            frequency INTEGER,
-            exercises_json TEXT,
-            FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE
-        )
-        """
-    )
-    conn.commit()
-    conn.close()
+    conn = db_pool.acquire()
+    try:
+        db.ensure_schema(conn)
+    finally:
+        db_pool.release(conn)
 
 init_db()
 
-
-def ideal_fat_percentage(age: int, gender: str) -> int:
-    gender = gender.lower()
-    if gender == "male":
-        if age <= 25: return 15
-        elif age <= 35: return 16
-        elif age <= 45: return 17
-        elif age <= 55: return 18
-        elif age <= 65: return 19
-        else: return 20
-    else:
-        if age <= 25: return 22
-        elif age <= 35: return 24
-        elif age <= 45: return 25
-        elif age <= 55: return 27
-        elif age <= 65: return 28
-        else: return 30
-
-
-def build_model_input(model, features_dict: dict) -> pd.DataFrame:
-    df = pd.DataFrame([features_dict])
-    if 'Gender' in df.columns:
-        df = pd.get_dummies(df, columns=['Gender'], prefix='Gender')
-    expected_cols = getattr(model, 'feature_names_in_', None)
-    if expected_cols is not None:
-        for col in expected_cols:
-            if col not in df.columns:
-                df[col] = 0
-        df = df.reindex(columns=expected_cols)
-    return df
-
-
-def calculate_rep_increase(fat_pred: float, ideal_fat: float, slope: float, user_exercises: dict, exercise_intensity_map: dict):
-    if slope >= 0:
-        slope = -0.01
-    fat_diff = fat_pred - ideal_fat
-    if fat_diff <= 0:
-        return 0, {ex: 0 for ex in user_exercises}
-    total_rep_increase = fat_diff / abs(slope)
-    weighted = [exercise_intensity_map.get(ex, 1) * vals.get('Reps', 0) for ex, vals in user_exercises.items()]
-    total_weight = sum(weighted) or 1
-    rep_increase_each = {
-        ex: int((exercise_intensity_map.get(ex, 1) * vals.get('Reps', 0) / total_weight) * total_rep_increase)
-        for ex, vals in user_exercises.items()
-    }
-    total_rep_increase = min(total_rep_increase, 600)
-    return int(total_rep_increase), rep_increase_each
+# Sessions live server-side by default, in the app database so every worker
+# sees them (SESSION_STORE=sqlite), in this process only (memory), or in
+# Flask's signed cookie as before (cookie). The cookie then carries only a
+# random id, and the signed-in user's row is cached in the session. Each
+# process keeps SQLite sessions it has read for SESSION_CACHE_TTL seconds, so
+# repeat requests run no session query.
+SESSION_STORE = os.environ.get('SESSION_STORE', 'sqlite')
+SESSION_CACHE_TTL = float(os.environ.get('SESSION_CACHE_TTL', '5'))
+session_store = None
+if SESSION_STORE != 'cookie':
+    session_store = SESSION_STORES[SESSION_STORE](db_pool, SESSION_CACHE_TTL)
+    app.session_interface = ServerSideSessionInterface(session_store)
+
+
+def current_user():
+    # The user's id, email and name. Server-side sessions keep them once read;
+    # a cookie session can't be reached when the row changes, so it reads every time.
+    if 'user_id' not in session:
+        return None
+    user = session.get(USER_CACHE_KEY)
+    if user is None or user['id'] != session['user_id']:
+        row = get_db().execute(db.SELECT_USER_BY_ID, (session['user_id'],)).fetchone()
+        if row is None or session_store is None:
+            return row
+        user = session[USER_CACHE_KEY] = dict(row)
+    return user
+
+
+def start_session(user_id: int):
+    # A new session id on every sign-in, so an id set before it can't be reused.
+    session.clear()
+    if isinstance(session, ServerSession):
+        session.regenerate()
+    session['user_id'] = user_id
+
+
+def forget_cached_user(user_id: int):
+    session.pop(USER_CACHE_KEY, None)
+    if session_store is not None:
+        session_store.forget_user(user_id)
+
+# Signed-in users' /predict results are appended to the predictions table in
+# batches on a background thread (PREDICTION_HISTORY=0 turns this off). Trends
+# cover each user's latest PREDICTION_TREND_WINDOW predictions.
+history_writer = None
+if os.environ.get('PREDICTION_HISTORY', '1') == '1':
+    history_writer = HistoryWriter(
+        db_pool,
+        window=int(os.environ.get('PREDICTION_TREND_WINDOW', '10')),
+        max_batch=int(os.environ.get('PREDICTION_HISTORY_MAX_BATCH', '256')),
+        max_wait=float(os.environ.get('PREDICTION_HISTORY_WAIT_MS', '50')) / 1000,
+    )
+    atexit.register(history_writer.flush, 5)
+HISTORY_PAGE_MAX_LIMIT = 200
+
+# Cohort analytics are scored ANALYTICS_CHUNK_SIZE profiles at a time and
+# cached per age bracket; a profile save drops only the brackets it touches,
+# and ANALYTICS_CACHE_TTL bounds how long other workers serve stale brackets.
+# Cohorts under ANALYTICS_MIN_COHORT profiles are not reported.
+cohort_analytics = CohortAnalytics(
+    db_pool,
+    get_pipeline,
+    chunk_size=int(os.environ.get('ANALYTICS_CHUNK_SIZE', '5000')),
+    ttl=float(os.environ.get('ANALYTICS_CACHE_TTL', '60')),
+    min_cohort=int(os.environ.get('ANALYTICS_MIN_COHORT', '5')),
+)
+ANALYTICS_EXERCISES_MAX_LIMIT = 100
+
+
+# -------- Instrumentation --------
+# Request timings feed the histograms in metrics.py (METRICS_ENABLED=0 turns
+# them off). PROFILE_SAMPLE_RATE profiles a random share of requests, and with
+# PROFILE_TOKEN set, ?profile=1 plus a matching X-Profile-Token header profiles
+# one request; the .prof files go to PROFILE_DIR.
+request_profiler = RequestProfiler(
+    directory=os.environ.get('PROFILE_DIR', os.path.join(BASE_DIR, 'profiles')),
+    sample_rate=float(os.environ.get('PROFILE_SAMPLE_RATE', '0')),
+    token=os.environ.get('PROFILE_TOKEN'),
+)
+
+
+def _instrumentation_metrics():
+    cache = prediction_cache.stats()
+    samples = [
+        ('prediction_cache_events_total', 'counter', 'Prediction cache lookups and removals by outcome.',
+         [({'event': event}, cache[event]) for event in ('hits', 'misses', 'evictions', 'expirations', 'invalidations')]),
+        ('prediction_cache_entries', 'gauge', 'Entries in the prediction cache.', [({}, cache['size'])]),
+        ('model_loaded', 'gauge', 'Whether each model is loaded (1) or unavailable (0).',
+         [({'model': name}, int(status['loaded'])) for name, status in model_registry.status().items()]),
+    ]
+    if micro_batcher is not None:
+        batcher = micro_batcher.stats()
+        samples += [
+            ('microbatch_queue_depth', 'gauge', 'Requests waiting for a micro-batch.', [({}, batcher['queue_depth'])]),
+            ('microbatch_batches_total', 'counter', 'Micro-batches scored.', [({}, batcher['batches'])]),
+            ('microbatch_rows_total', 'counter', 'Rows scored through micro-batches.', [({}, batcher['rows'])]),
+        ]
+    analytics = cohort_analytics.stats()
+    samples += [
+        ('cohort_analytics_events_total', 'counter', 'Cohort analytics bracket lookups, scans and invalidations.',
+         [({'event': event}, analytics[event]) for event in ('hits', 'scans', 'invalidations')]),
+    ]
+    if history_writer is not None:
+        history = history_writer.stats()
+        samples += [
+            ('prediction_history_queue_depth', 'gauge', 'Predictions waiting to be written to history.',
+             [({}, history['queue_depth'])]),
+            ('prediction_history_rows_total', 'counter', 'Prediction history rows by outcome.',
+             [({'outcome': outcome}, history[outcome]) for outcome in ('written', 'dropped', 'failed')]),
+        ]
+    return samples
+
+
+metrics.REGISTRY.register_callback(_instrumentation_metrics)
+
+app.wsgi_app = metrics.RequestTimingMiddleware(app.wsgi_app)
+
+if request_profiler.enabled:
+    @app.before_request
+    def start_profiler():
+        if request_profiler.wanted(request.args, request.headers):
+            g.profiler = request_profiler.start()
+            if g.profiler is not None:
+                g.profile_path = request_profiler.profile_path(request.path)
+
+    @app.after_request
+    def name_profile(response):
+        if g.get('profiler') is not None:
+            response.headers['X-Profile-File'] = os.path.basename(g.profile_path)
+        return response
+
+    # Stopped at teardown, which also runs when the view raises, so a failed
+    # request can't leave the interpreter's profiler switched on.
+    @app.teardown_request
+    def stop_profiler(exc):
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            request_profiler.stop(profiler, g.pop('profile_path'))
+
+
+@app.get('/metrics')
+def prometheus_metrics():
+    return Response(metrics.REGISTRY.render(), mimetype='text/plain; version=0.0.4')
 
 
 @app.get('/')
 def index():
     if 'user_id' not in session:
         return redirect(url_for('signin'))
-    conn = get_db()
-    user = conn.execute('SELECT id, email, name FROM users WHERE id=?', (session['user_id'],)).fetchone()
-    conn.close()
-    return render_template('profile.html', user=user)
+    return render_template('profile.html', user=current_user())
 
 
 @app.get('/dashboard')
 def dashboard():
-    user = None
-    if 'user_id' in session:
-        conn = get_db()
-        user = conn.execute('SELECT id, email, name FROM users WHERE id=?', (session['user_id'],)).fetchone()
-        conn.close()
-    return render_template('dashboard.html', exercises=list(exercise_intensity.keys()), user=user)
+    return render_template('dashboard.html', exercises=list(exercise_intensity.keys()), user=current_user())
+
+
+BATCH_CHUNK_SIZE = 1000
+
+
+def batch_too_large_message(rows: int) -> str:
+    return f'Batch has {rows} payloads, over the limit of {BATCH_MAX_ROWS}; send larger batches as NDJSON'
+
+
+def predict_batch(payloads: list) -> list:
+    """Score many /predict payloads in one fused pass; see PredictionPipeline.run_batch."""
+    results, timings = get_pipeline().run_batch(payloads)
+    metrics.observe_stages('batch', timings)
+    return results
+
+
+def _predict_ndjson_chunk(lines: list) -> list:
+    payloads, bad_lines = [], {}
+    for i, line in enumerate(lines):
+        try:
+            payloads.append(json.loads(line))
+        except ValueError as exc:
+            payloads.append(None)
+            bad_lines[i] = f'invalid JSON: {exc}'
+    results = predict_batch(payloads)
+    for i, error in bad_lines.items():
+        results[i] = {'error': error}
+    return results
+
+
+def _iter_ndjson_results(stream):
+    chunk = []
+    for raw in stream:
+        line = raw.strip()
+        if not line:
+            continue
+        chunk.append(line)
+        if len(chunk) >= BATCH_CHUNK_SIZE:
+            for result in _predict_ndjson_chunk(chunk):
+                yield json.dumps(result) + '\n'
+            chunk = []
+    for result in _predict_ndjson_chunk(chunk):
+        yield json.dumps(result) + '\n'
+
+
+@app.errorhandler(ModelUnavailable)
+def model_unavailable(exc):
+    return jsonify({'error': str(exc)}), 503
 
 
 @app.post('/predict')
 def predict():
     data = request.get_json(force=True) or {}
+    pipeline = get_pipeline()
+    try:
+        result, timings = pipeline.run(data)
+    except Exception as exc:
+        return jsonify({'error': str(exc)}), 400
+    metrics.observe_stages('predict', timings)
+    if history_writer is not None and 'user_id' in session:
+        history_writer.record(session['user_id'], result)
+    response = jsonify(result)
+    response.headers['Server-Timing'] = server_timing_header(timings)
+    return response
+
+
+@app.post('/predict/batch')
+def predict_batch_route():
+    pipeline = get_pipeline()
+    # NDJSON in, NDJSON out: scored in BATCH_CHUNK_SIZE chunks as the body streams in.
+    if request.mimetype == 'application/x-ndjson':
+        return Response(stream_with_context(_iter_ndjson_results(request.stream)), mimetype='application/x-ndjson')
+    data = request.get_json(force=True, silent=True)
+    if not isinstance(data, list):
+        return jsonify({'error': 'Expected a JSON array of prediction payloads'}), 400
+    if len(data) > BATCH_MAX_ROWS:
+        return jsonify({'error': batch_too_large_message(len(data))}), 413
+    results, timings = pipeline.run_batch(data)
+    metrics.observe_stages('batch', timings)
+    response = jsonify(results)
+    response.headers['Server-Timing'] = server_timing_header(timings)
+    return response
+
+
+@app.post('/predict/sweep')
+def predict_sweep():
+    data = request.get_json(force=True, silent=True)
+    pipeline = get_pipeline()
     try:
-        age = int(data.get('age'))
-        gender = str(data.get('gender'))
-        weight = float(data.get('weight'))
-        height = float(data.get('height'))
-        session_duration = float(data.get('session_duration'))
-        frequency = int(data.get('frequency'))
-        user_exercises = data.get('exercises', {})  # { name: {Reps, Sets} }
-
-        bmi = weight / (height ** 2)
-        total_reps = sum(
-            (vals.get('Reps', 0) * vals.get('Sets', 0) * (exercise_intensity.get(ex, 100) / 100))
-            for ex, vals in user_exercises.items()
-        )
-
-        base_features = {
-            'Age': age,
-            'Gender': gender,
-            'Weight (kg)': weight,
-            'Height (m)': height,
-            'BMI': bmi,
-            'Session_Duration (hours)': session_duration,
-            'Workout_Frequency (days/week)': frequency,
-            'Total_Reps': total_reps
-        }
-
-        user_df_fat = build_model_input(model_fat, base_features)
-        user_df_water = build_model_input(model_water, base_features)
-
-        fat_pred = float(model_fat.predict(user_df_fat)[0])
-        water_pred = float(model_water.predict(user_df_water)[0])
-        ideal_fat = float(ideal_fat_percentage(age, gender))
-
-        true_slope = -0.00185
-        scaling_factor = 15
-        slope = true_slope * scaling_factor
-
-        total_inc, rep_increase_each = calculate_rep_increase(
-            fat_pred=fat_pred,
-            ideal_fat=ideal_fat,
-            slope=slope,
-            user_exercises=user_exercises,
-            exercise_intensity_map=exercise_intensity,
-        )
-
-        return jsonify({
-            'fat_pred': round(fat_pred, 2),
-            'water_pred': round(water_pred, 2),
-            'ideal_fat': round(ideal_fat, 2),
-            'total_rep_increase': int(total_inc),
-            'rep_increase_each': rep_increase_each,
-        })
+        result, timings = run_sweep(pipeline, data, max_grid_size=SWEEP_MAX_GRID_SIZE)
+    except GridTooLarge as exc:
+        return jsonify({'error': str(exc)}), 413
     except Exception as exc:
         return jsonify({'error': str(exc)}), 400
+    metrics.observe_stages('sweep', timings)
+    response = jsonify(result)
+    response.headers['Server-Timing'] = server_timing_header(timings)
+    return response
+
+
+@app.get('/predict/cache')
+def prediction_cache_stats():
+    return jsonify(prediction_cache.stats())
+
+
+@app.get('/predict/microbatch')
+def micro_batch_stats():
+    if micro_batcher is None:
+        return jsonify({'enabled': False})
+    return jsonify(dict(micro_batcher.stats(), enabled=True))
+
+
+@app.get('/models')
+def model_status():
+    return jsonify(model_registry.status())
+
+
+def _etagged(etag: str, build_payload):
+    # The catalog only changes on restart, so an ETag match skips the work entirely.
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = jsonify(build_payload())
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = 300
+    return response
 
 
 @app.get('/exercises')
 def list_exercises():
-    return jsonify(sorted(list(exercise_intensity.keys())))
+    return _etagged(exercise_catalog.version, lambda: exercise_names)
+
+
+@app.get('/exercises/search')
+def search_exercises():
+    query = request.args.get('q', '')
+    limit = min(max(request.args.get('limit', 20, type=int), 1), EXERCISE_SEARCH_MAX_LIMIT)
+    key = normalize_name(query)
+    etag = exercise_catalog.version + '-' + hashlib.sha1(f'{key}\0{limit}'.encode()).hexdigest()[:16]
+    return _etagged(etag, lambda: exercise_catalog.search(key, limit))
 
 
 # -------- Auth --------
@@ -203,20 +449,21 @@ def signup():
     name = data.get('name') or ''
     if not email or not password:
         return render_template('signup.html', error='Email and password are required.')
+    try:
+        password_hash = password_hasher.hash(password)
+    except HasherBusy:
+        return render_template('signup.html', error='Server is busy, please try again.'), 503
     conn = get_db()
-    cur = conn.cursor()
     try:
-        cur.execute('INSERT INTO users(email, password_hash, name) VALUES (?, ?, ?)', (
-            email, generate_password_hash(password), name
+        cur = conn.execute(db.INSERT_USER, (
+            email, password_hash, name
         ))
         conn.commit()
         user_id = cur.lastrowid
-        session['user_id'] = user_id
+        start_session(user_id)
         return redirect(url_for('index'))
     except sqlite3.IntegrityError:
         return render_template('signup.html', error='Email already registered.')
-    finally:
-        conn.close()
 
 
 @app.route('/signin', methods=['GET', 'POST'])
@@ -226,18 +473,35 @@ def signin():
     data = request.form
     email = (data.get('email') or '').strip().lower()
     password = data.get('password') or ''
+    ip = request.remote_addr
+    if not email_limiter.allowed(email) or not ip_limiter.allowed(ip):
+        return render_template('signin.html', error='Too many failed attempts, please try again later.'), 429
     conn = get_db()
-    user = conn.execute('SELECT * FROM users WHERE email=?', (email,)).fetchone()
-    conn.close()
-    if not user or not check_password_hash(user['password_hash'], password):
+    user = conn.execute(db.SELECT_USER_BY_EMAIL, (email,)).fetchone()
+    try:
+        valid = user is not None and password_hasher.verify(user['password_hash'], password)
+    except HasherBusy:
+        return render_template('signin.html', error='Server is busy, please try again.'), 503
+    if not valid:
+        email_limiter.record_failure(email)
+        ip_limiter.record_failure(ip)
         return render_template('signin.html', error='Invalid credentials.')
-    session['user_id'] = user['id']
+    email_limiter.reset(email)
+    if password_hasher.needs_rehash(user['password_hash']):
+        # Stored with older hashing settings: upgrade it while we have the password.
+        try:
+            conn.execute(db.UPDATE_PASSWORD_HASH, (password_hasher.hash(password), user['id']))
+            conn.commit()
+        except HasherBusy:
+            pass
+    start_session(user['id'])
     return redirect(url_for('dashboard'))
 
 
 @app.post('/logout')
 def logout():
-    session.pop('user_id', None)
+    # Clearing the session deletes it from the store, cached user row included.
+    session.clear()
     return redirect(url_for('index'))
 
 
@@ -246,12 +510,9 @@ def logout():
 def get_profile():
     if 'user_id' not in session:
         return jsonify({'error': 'Not authenticated'}), 401
-    conn = get_db()
-    prof = conn.execute('SELECT age, gender, weight, height, session_duration, frequency, exercises_json FROM profiles WHERE user_id=?', (session['user_id'],)).fetchone()
-    conn.close()
-    if not prof:
+    data = db.load_profile(get_db(), session['user_id'])
+    if not data:
         return jsonify({}), 200
-    data = dict(prof)
     return jsonify(data)
 
 
@@ -260,23 +521,53 @@ def save_profile():
     if 'user_id' not in session:
         return jsonify({'error': 'Not authenticated'}), 401
     data = request.get_json(force=True) or {}
-    age = data.get('age')
-    gender = data.get('gender')
-    weight = data.get('weight')
-    height = data.get('height')
-    session_duration = data.get('session_duration')
-    frequency = data.get('frequency')
+    profile = {field: data.get(field) for field in db.PROFILE_FIELDS}
     exercises_json = data.get('exercises_json')  # stringified JSON from client
-    conn = get_db()
-    conn.execute(
-        'REPLACE INTO profiles(user_id, age, gender, weight, height, session_duration, frequency, exercises_json) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
-        (session['user_id'], age, gender, weight, height, session_duration, frequency, exercises_json)
-    )
-    conn.commit()
-    conn.close()
+    try:
+        previous_age = db.save_profile(get_db(), session['user_id'], profile, exercises_json)
+    except ValueError as exc:
+        return jsonify({'error': str(exc)}), 400
+    cohort_analytics.invalidate(previous_age, profile['age'])
+    if 'name' in data:
+        db.update_user_name(get_db(), session['user_id'], data['name'] or '')
+        forget_cached_user(session['user_id'])
     return jsonify({'ok': True})
 
 
+@app.get('/api/history')
+def prediction_history():
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    limit = min(max(request.args.get('limit', 50, type=int), 1), HISTORY_PAGE_MAX_LIMIT)
+    try:
+        before = parse_cursor(request.args['before']) if 'before' in request.args else None
+    except ValueError:
+        return jsonify({'error': 'Invalid before cursor'}), 400
+    return jsonify(load_history(get_db(), session['user_id'], limit, before))
+
+
+# -------- Analytics --------
+@app.get('/api/analytics/cohorts')
+def analytics_cohorts():
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    try:
+        return jsonify(cohort_analytics.cohorts(request.args.getlist('bracket') or None))
+    except ValueError as exc:
+        return jsonify({'error': str(exc)}), 400
+
+
+@app.get('/api/analytics/exercises')
+def analytics_exercises():
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    limit = min(max(request.args.get('limit', 10, type=int), 1), ANALYTICS_EXERCISES_MAX_LIMIT)
+    try:
+        return jsonify(cohort_analytics.exercises(limit, request.args.getlist('bracket') or None))
+    except ValueError as exc:
+        return jsonify({'error': str(exc)}), 400
+
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
 
@@ -0,0 +1,264 @@
+"""Per-user prediction history and its rolling trend statistics.
+
+Signed-in users' /predict results are appended to the ``predictions`` table by
+``HistoryWriter`` on a background thread, in batches, so requests never wait
+on SQLite. Each append also updates the user's ``prediction_trends`` row: the
+count, an exponential moving average and the sums behind a least-squares slope
+over the latest ``window`` predictions. When the window is full the oldest row
+is subtracted as the new one is added, so a write costs one indexed lookup
+however long the history is, and reads never scan it.
+"""
+import logging
+import queue
+import sqlite3
+import threading
+import time
+
+import db
+
+logger = logging.getLogger(__name__)
+
+SECONDS_PER_DAY = 86400.0
+# No slope is reported until the window's timestamps spread at least this much
+# (standard deviation, in days); over minutes a per-day slope is just noise.
+MIN_SLOPE_SPREAD_DAYS = 1 / 24
+
+
+class Trend:
+    """A user's running trend state; mirrors one ``prediction_trends`` row."""
+
+    __slots__ = db.TREND_FIELDS
+
+    def __init__(self, **fields):
+        for name in db.TREND_FIELDS:
+            setattr(self, name, fields[name])
+
+    @classmethod
+    def start(cls, created_at: float, fat_pred: float, ideal_fat):
+        return cls(count=0, origin=created_at, window_n=0, sum_t=0.0, sum_y=0.0, sum_tt=0.0, sum_ty=0.0,
+                   ema=fat_pred, last_fat=fat_pred, last_ideal_fat=ideal_fat, last_at=created_at)
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(**{name: row[name] for name in db.TREND_FIELDS})
+
+    def as_row(self, user_id: int) -> tuple:
+        return (user_id,) + tuple(getattr(self, name) for name in db.TREND_FIELDS)
+
+    def _days(self, created_at: float) -> float:
+        return (created_at - self.origin) / SECONDS_PER_DAY
+
+    def _shift(self, created_at: float, fat_pred: float, sign: int):
+        t = self._days(created_at)
+        self.window_n += sign
+        self.sum_t += sign * t
+        self.sum_y += sign * fat_pred
+        self.sum_tt += sign * t * t
+        self.sum_ty += sign * t * fat_pred
+
+    def add(self, created_at: float, fat_pred: float, ideal_fat, alpha: float, leaving=None):
+        """Append one prediction; ``leaving`` is the (created_at, fat_pred) that drops out of a full window."""
+        self._shift(created_at, fat_pred, 1)
+        if leaving is not None:
+            self._shift(leaving[0], leaving[1], -1)
+        self.ema = fat_pred if self.count == 0 else alpha * fat_pred + (1 - alpha) * self.ema
+        self.count += 1
+        self.last_fat, self.last_ideal_fat, self.last_at = fat_pred, ideal_fat, created_at
+
+    def summary(self) -> dict:
+        n = self.window_n
+        denominator = n * self.sum_tt - self.sum_t * self.sum_t
+        slope = None
+        if n >= 2 and denominator > (n * MIN_SLOPE_SPREAD_DAYS) ** 2:
+            slope = (n * self.sum_ty - self.sum_t * self.sum_y) / denominator
+        gap = None if self.last_ideal_fat is None else self.last_fat - self.last_ideal_fat
+        if gap is None:
+            days_to_ideal = None
+        elif gap <= 0:
+            days_to_ideal = 0.0
+        elif slope is not None and slope < 0:
+            days_to_ideal = round(gap / -slope, 1)
+        else:
+            days_to_ideal = None
+        return {
+            'count': self.count,
+            'window': n,
+            'moving_average': round(self.sum_y / n, 3) if n else None,
+            'ema': round(self.ema, 3),
+            'slope_per_day': None if slope is None else round(slope, 4),
+            'latest_fat': self.last_fat,
+            'ideal_fat': self.last_ideal_fat,
+            'gap_to_ideal': None if gap is None else round(gap, 3),
+            'days_to_ideal': days_to_ideal,
+            'last_at': self.last_at,
+        }
+
+
+def append_predictions(conn: sqlite3.Connection, rows: list, window: int):
+    """Insert ``(user_id, created_at, fat, water, ideal_fat, total_rep_increase)`` rows and update trends.
+
+    Call it inside ``with conn:``. It opens the transaction with ``BEGIN
+    IMMEDIATE`` before reading any trend, so a writer in another process can't
+    update the same trends between the read and the write.
+    """
+    if not conn.in_transaction:
+        conn.execute(db.BEGIN_IMMEDIATE)
+    alpha = 2 / (window + 1)
+    trends = {}
+    for user_id, created_at, fat_pred, water_pred, ideal_fat, total_rep_increase in sorted(rows, key=lambda r: r[1]):
+        trend = trends.get(user_id)
+        if trend is None:
+            stored = conn.execute(db.SELECT_TREND, (user_id,)).fetchone()
+            trend = Trend.from_row(stored) if stored else Trend.start(created_at, fat_pred, ideal_fat)
+            trends[user_id] = trend
+        # A row queued a moment after a newer one was written keeps its place in
+        # the order, so the window's oldest row is always the one that drops out.
+        created_at = max(created_at, trend.last_at)
+        new_id = conn.execute(
+            db.INSERT_PREDICTION, (user_id, created_at, fat_pred, water_pred, ideal_fat, total_rep_increase)
+        ).lastrowid
+        if trend.window_n > window:
+            trend = trends[user_id] = _rebuild(conn, user_id, trend, window, (created_at, new_id))
+        leaving = None
+        if trend.window_n >= window:
+            leaving = conn.execute(db.SELECT_PREDICTION_AT_OFFSET, (user_id, created_at, new_id, window - 1)).fetchone()
+        trend.add(created_at, fat_pred, ideal_fat, alpha, tuple(leaving) if leaving else None)
+    conn.executemany(db.REPLACE_TREND, [trend.as_row(user_id) for user_id, trend in trends.items()])
+
+
+def _rebuild(conn, user_id: int, trend: Trend, window: int, before: tuple) -> Trend:
+    # Only after the window setting shrinks: refill the sums from the rows still inside it.
+    recent = conn.execute(db.SELECT_PREDICTIONS_PAGE, (user_id, before[0], before[1], window - 1)).fetchall()
+    rebuilt = Trend.start(trend.origin, trend.last_fat, trend.last_ideal_fat)
+    for row in reversed(recent):
+        rebuilt._shift(row['created_at'], row['fat_pred'], 1)
+    rebuilt.count, rebuilt.ema, rebuilt.last_at = trend.count, trend.ema, trend.last_at
+    return rebuilt
+
+
+def parse_cursor(cursor: str) -> tuple:
+    """``(created_at, id)`` from a ``next`` cursor; raises ValueError if it is malformed."""
+    created_at, _, row_id = cursor.partition(':')
+    return float(created_at), int(row_id)
+
+
+def load_history(conn: sqlite3.Connection, user_id: int, limit: int, before: tuple = None) -> dict:
+    """One page of a user's predictions, newest first, with the trend summary."""
+    created_at, row_id = before or (float('inf'), 0)
+    rows = conn.execute(db.SELECT_PREDICTIONS_PAGE, (user_id, created_at, row_id, limit + 1)).fetchall()
+    items = [dict(row) for row in rows[:limit]]
+    next_cursor = f'{items[-1]["created_at"]!r}:{items[-1]["id"]}' if len(rows) > limit else None
+    stored = conn.execute(db.SELECT_TREND, (user_id,)).fetchone()
+    return {'items': items, 'next': next_cursor, 'trend': Trend.from_row(stored).summary() if stored else None}
+
+
+class HistoryWriter:
+    """Queues prediction results and appends them in batches on a background thread.
+
+    ``record`` only enqueues. The writer takes the oldest queued row, keeps
+    collecting until ``max_batch`` rows are queued or ``max_wait`` seconds have
+    passed, and writes them with ``append_predictions`` in one transaction.
+    When ``max_queue`` rows are already waiting, new ones are dropped and
+    counted rather than blocking the request.
+    """
+
+    def __init__(self, pool: db.ConnectionPool, window: int = 10, max_batch: int = 256, max_wait: float = 0.05,
+                 max_queue: int = 10000):
+        self.pool = pool
+        self.window = window
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._written = 0
+        self._batches = 0
+        self._dropped = 0
+        self._failed = 0
+        self._skipped_flushes = 0
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._worker, name='history', daemon=True)
+                    self._thread.start()
+
+    def record(self, user_id: int, result: dict, created_at: float = None) -> bool:
+        """Queue one /predict result for ``user_id``; False if the queue was full."""
+        self._ensure_started()
+        row = (user_id, created_at or time.time(), result['fat_pred'], result.get('water_pred'),
+               result.get('ideal_fat'), result.get('total_rep_increase'))
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            with self._stats_lock:
+                self._dropped += 1
+            return False
+        return True
+
+    def flush(self, timeout: float = None) -> bool:
+        """Wait until everything queued so far has been written (or failed).
+
+        Never blocks on a full queue: the flush is skipped, counted and False returned.
+        """
+        if self._thread is None:
+            return True
+        marker = threading.Event()
+        try:
+            self._queue.put_nowait(marker)
+        except queue.Full:
+            with self._stats_lock:
+                self._skipped_flushes += 1
+            return False
+        return marker.wait(timeout)
+
+    def _collect(self) -> list:
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch and not isinstance(batch[-1], threading.Event):
+            remaining = deadline - time.perf_counter()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _worker(self):
+        while True:
+            batch = self._collect()
+            rows = [item for item in batch if not isinstance(item, threading.Event)]
+            if rows:
+                self._write(rows)
+            for item in batch:
+                if isinstance(item, threading.Event):
+                    item.set()
+
+    def _write(self, rows: list):
+        conn = self.pool.acquire()
+        try:
+            with conn:
+                append_predictions(conn, rows, self.window)
+        except Exception:
+            # Whatever went wrong, the thread must survive to write later batches.
+            logger.exception('Failed to write %d prediction history rows', len(rows))
+            with self._stats_lock:
+                self._failed += len(rows)
+            return
+        finally:
+            self.pool.release(conn)
+        with self._stats_lock:
+            self._written += len(rows)
+            self._batches += 1
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                'queue_depth': self._queue.qsize(),
+                'written': self._written,
+                'batches': self._batches,
+                'dropped': self._dropped,
+                'failed': self._failed,
+                'skipped_flushes': self._skipped_flushes,
+            }
@@ -0,0 +1,91 @@
+import bisect
+import csv
+import os
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+IDEAL_FAT_CSV_PATH = os.path.join(BASE_DIR, 'ideal_fat_reference.csv')
+
+
+class IdealFatTable:
+    """Ideal body-fat % by gender and age bracket.
+
+    ``brackets`` maps a lower-case gender to ``[(max_age, ideal_fat), ...]``;
+    each bracket includes its ``max_age`` and a ``max_age`` of None is open-ended.
+    Genders not in the table use ``default_gender``.
+    """
+
+    def __init__(self, brackets: dict, default_gender: str = 'female'):
+        if default_gender not in brackets:
+            raise ValueError(f'default gender {default_gender!r} is not in the table')
+        self.default_gender = default_gender
+        self._bounds = {}
+        self._values = {}
+        for gender, rows in brackets.items():
+            rows = sorted(rows, key=lambda row: float('inf') if row[0] is None else row[0])
+            if not rows or rows[-1][0] is not None:
+                raise ValueError(f'brackets for {gender!r} need an open-ended last row')
+            self._bounds[gender] = [float('inf') if max_age is None else max_age for max_age, _ in rows]
+            self._values[gender] = [ideal for _, ideal in rows]
+        # lookup_many searches every gender at once: ages are clipped to the
+        # finite bounds and shifted into a per-gender band of one sorted array.
+        self._genders = list(self._bounds)
+        finite = [b for bounds in self._bounds.values() for b in bounds[:-1]]
+        self._lo = min(finite, default=0) - 1
+        self._hi = max(finite, default=0) + 1
+        self._span = self._hi - self._lo + 1
+        self._flat_bounds = np.array([
+            min(bound, self._hi) - self._lo + code * self._span
+            for code, gender in enumerate(self._genders) for bound in self._bounds[gender]
+        ], dtype=np.float64)
+        self._flat_values = np.array([v for gender in self._genders for v in self._values[gender]])
+        # Common spellings map straight to a table gender, the app's 'Male'/'Female' first.
+        self._alias = {}
+        for form in (str.capitalize, str.lower, str.upper):
+            for gender in self._bounds:
+                self._alias.setdefault(form(gender), gender)
+
+    @classmethod
+    def from_csv(cls, path: str = IDEAL_FAT_CSV_PATH, default_gender: str = 'female'):
+        """Load a ``gender,max_age,ideal_fat`` CSV; leave max_age empty on each gender's last row."""
+        brackets = {}
+        with open(path, newline='') as f:
+            for row in csv.DictReader(f):
+                max_age = row['max_age'].strip()
+                ideal = float(row['ideal_fat'])
+                brackets.setdefault(row['gender'].strip().lower(), []).append(
+                    (float(max_age) if max_age else None, int(ideal) if ideal.is_integer() else ideal)
+                )
+        return cls(brackets, default_gender=default_gender)
+
+    def _gender(self, gender: str) -> str:
+        key = self._alias.get(gender)
+        if key is None:
+            key = str(gender).lower()
+            if key not in self._bounds:
+                key = self.default_gender
+        return key
+
+    def lookup(self, age, gender: str):
+        key = self._gender(gender)
+        return self._values[key][bisect.bisect_left(self._bounds[key], age)]
+
+    def lookup_many(self, ages, genders) -> np.ndarray:
+        """Vectorized ``lookup`` with a single ``searchsorted``."""
+        ages = np.asarray(ages, dtype=np.float64)
+        genders = np.asarray(genders)
+        codes = np.full(genders.shape, self._genders.index(self.default_gender), dtype=np.float64)
+        matched = np.zeros(genders.shape, dtype=bool)
+        for spelling, key in self._alias.items():
+            rows = genders == spelling
+            codes[rows] = self._genders.index(key)
+            matched |= rows
+            if matched.all():
+                break
+        # Only unusual spellings fall back to per-value normalization.
+        if not matched.all():
+            distinct, inverse = np.unique(genders[~matched], return_inverse=True)
+            codes[~matched] = np.array([self._genders.index(self._gender(g)) for g in distinct.tolist()])[inverse]
+        shifted = np.clip(ages, self._lo, self._hi) - self._lo + codes * self._span
+        return self._flat_values[np.searchsorted(self._flat_bounds, shifted, side='left')].astype(np.float64)
@@ -0,0 +1,190 @@
+"""Low-overhead timing histograms rendered in the Prometheus text format.
+
+Histograms register themselves with ``REGISTRY`` when created; ``render()``
+produces the body for ``GET /metrics``. ``observe`` is a bisect and three
+increments under a lock, so it is cheap enough for per-query timing.
+METRICS_ENABLED=0 (or setting ``ENABLED`` to False at runtime) turns recording off.
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+
+ENABLED = os.environ.get('METRICS_ENABLED', '1') != '0'
+
+# Seconds, from 50us (a cached SQLite read) to 10s (a stuck request).
+DEFAULT_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names, values, extra: str = '') -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Series:
+    __slots__ = ('counts', 'sum', 'lock', 'buckets')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value: float):
+        if not ENABLED:
+            return
+        idx = bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[idx] += 1
+            self.sum += value
+
+
+class Histogram:
+    """A Prometheus histogram with optional labels.
+
+    ``hist.labels('fat_model').observe(seconds)``; bind the child once for hot
+    paths. Without label names, call ``hist.observe`` directly.
+    """
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS, registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._series[()] = _Series(self.buckets)
+        (REGISTRY if registry is None else registry).register(self)
+
+    def labels(self, *values) -> _Series:
+        series = self._series.get(values)
+        if series is None:
+            with self._lock:
+                series = self._series.setdefault(values, _Series(self.buckets))
+        return series
+
+    def observe(self, value: float):
+        self._series[()].observe(value)
+
+    def collect(self) -> list:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        for values, series in sorted(self._series.items()):
+            with series.lock:
+                counts, total = list(series.counts), series.sum
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else _format_value(bound)
+                bucket_labels = _format_labels(self.labelnames, values, 'le="' + le + '"')
+                lines.append(f'{self.name}_bucket{bucket_labels} {cumulative}')
+            labels = _format_labels(self.labelnames, values)
+            lines.append(f'{self.name}_sum{labels} {repr(total)}')
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+class Registry:
+    """Histograms plus callbacks that report other components' counters and gauges.
+
+    A callback returns ``[(name, type, help, [(labels_dict, value), ...]), ...]``
+    with ``type`` 'counter' or 'gauge'.
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._callbacks = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+
+    def register_callback(self, callback):
+        self._callbacks.append(callback)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.collect())
+        for callback in self._callbacks:
+            for name, kind, documentation, samples in callback():
+                lines.append(f'# HELP {name} {documentation}')
+                lines.append(f'# TYPE {name} {kind}')
+                for labels, value in samples:
+                    lines.append(f'{name}{_format_labels(labels.keys(), labels.values())} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+PREDICT_STAGE_SECONDS = Histogram(
+    'predict_stage_seconds',
+    'Time per prediction pipeline stage (parse, cache, feature encoding, each model, recommendation).',
+    labelnames=('endpoint', 'stage'),
+)
+DB_QUERY_SECONDS = Histogram('db_query_seconds', 'SQLite statement execution time by query.', labelnames=('query',))
+PASSWORD_HASH_SECONDS = Histogram(
+    'password_hash_seconds', 'Password hashing and verification time, including pool queueing.', labelnames=('op',),
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    'http_request_duration_seconds', 'Request handling time by route, method and status.',
+    labelnames=('endpoint', 'method', 'status'),
+)
+
+
+_stage_series = {}
+
+
+def observe_stages(endpoint: str, timings: dict):
+    """Record a pipeline's per-stage timings (milliseconds, as in Server-Timing)."""
+    if not ENABLED:
+        return
+    for stage, ms in timings.items():
+        series = _stage_series.get((endpoint, stage))
+        if series is None:
+            series = _stage_series[(endpoint, stage)] = PREDICT_STAGE_SECONDS.labels(endpoint, stage)
+        series.observe(ms / 1000)
+
+
+class RequestTimingMiddleware:
+    """WSGI middleware recording ``http_request_duration_seconds`` per matched route.
+
+    Working on the WSGI environ keeps it off Flask's request/``g`` proxies. The
+    route is read from the werkzeug request in the environ when the response
+    starts, since Flask clears that entry once the request context is popped.
+    Streamed bodies are timed until the app returns, not until the last chunk.
+    """
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        if not ENABLED:
+            return self.wsgi_app(environ, start_response)
+        start = time.perf_counter()
+        labels = ['unmatched', '500']
+
+        def recording_start_response(status_line, headers, exc_info=None):
+            rule = getattr(environ.get('werkzeug.request'), 'url_rule', None)
+            if rule is not None:
+                labels[0] = rule.rule
+            labels[1] = status_line[:3]
+            return start_response(status_line, headers, exc_info)
+
+        try:
+            return self.wsgi_app(environ, recording_start_response)
+        finally:
+            HTTP_REQUEST_SECONDS.labels(labels[0], environ.get('REQUEST_METHOD', ''), labels[1]).observe(
+                time.perf_counter() - start
+            )
@@ -0,0 +1,139 @@
+import queue
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+
+# Upper bounds (ms) of the added-wait histogram buckets; the last bucket is open.
+WAIT_BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2, 5, 10, 25, 50, 100)
+
+
+class _Pending:
+    __slots__ = ('pipeline', 'features', 'enqueued', 'done', 'fat', 'water', 'timings', 'error')
+
+    def __init__(self, pipeline, features):
+        self.pipeline = pipeline
+        self.features = features
+        self.enqueued = time.perf_counter()
+        self.done = threading.Event()
+        self.error = None
+
+
+class MicroBatcher:
+    """Coalesces concurrent single-row predictions into one predict call per model.
+
+    ``predict`` queues a request's features and blocks until a background
+    thread has scored it. That thread takes the oldest waiting request, keeps
+    collecting until ``max_rows`` requests are queued or ``max_wait`` seconds
+    have passed since that request arrived, and runs
+    ``PredictionPipeline.predict_matrix`` over the stacked rows. Requests for
+    different pipelines (e.g. across a model reload) are scored separately.
+    """
+
+    def __init__(self, max_rows: int = 64, max_wait: float = 0.002):
+        self.max_rows = max_rows
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._rows = 0
+        self._max_queue_depth = 0
+        self._batch_sizes = defaultdict(int)
+        self._wait_buckets = [0] * (len(WAIT_BUCKETS_MS) + 1)
+        self._wait_sum_ms = 0.0
+        self._wait_max_ms = 0.0
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._worker, name='microbatch', daemon=True)
+                    self._thread.start()
+
+    def predict(self, pipeline, features: dict, timings: dict):
+        """Fat and water predictions for one feature row, scored in a shared batch."""
+        self._ensure_started()
+        item = _Pending(pipeline, features)
+        self._queue.put(item)
+        item.done.wait()
+        if item.error is not None:
+            raise item.error
+        timings.update(item.timings)
+        return item.fat, item.water
+
+    def _collect(self) -> list:
+        batch = [self._queue.get()]
+        deadline = batch[0].enqueued + self.max_wait
+        while len(batch) < self.max_rows:
+            remaining = deadline - time.perf_counter()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _worker(self):
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            depth = self._queue.qsize()
+            groups = defaultdict(list)
+            for item in batch:
+                groups[id(item.pipeline)].append(item)
+            for items in groups.values():
+                self._score(items, started)
+            self._record(batch, started, depth)
+
+    def _score(self, items: list, started: float):
+        timings = {}
+        try:
+            fat_preds, water_preds = items[0].pipeline.predict_matrix([item.features for item in items], timings)
+        except Exception as exc:
+            if len(items) == 1:
+                items[0].error = exc
+                items[0].done.set()
+                return
+            # Score the requests alone, so one bad row fails only its own request.
+            for item in items:
+                self._score([item], started)
+            return
+        for item, fat, water in zip(items, fat_preds.tolist(), water_preds.tolist()):
+            item.fat, item.water = fat, water
+            item.timings = dict(timings, batch_wait=(started - item.enqueued) * 1000)
+            item.done.set()
+
+    def _record(self, batch: list, started: float, depth: int):
+        waits = [(started - item.enqueued) * 1000 for item in batch]
+        with self._stats_lock:
+            self._batches += 1
+            self._rows += len(batch)
+            self._max_queue_depth = max(self._max_queue_depth, depth + len(batch))
+            # Batch sizes are counted in power-of-two buckets: 1, 2, 4, ...
+            self._batch_sizes[1 << (len(batch) - 1).bit_length()] += 1
+            for wait in waits:
+                self._wait_buckets[bisect_left(WAIT_BUCKETS_MS, wait)] += 1
+            self._wait_sum_ms += sum(waits)
+            self._wait_max_ms = max(self._wait_max_ms, max(waits))
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                'max_rows': self.max_rows,
+                'max_wait_ms': self.max_wait * 1000,
+                'queue_depth': self._queue.qsize(),
+                'max_queue_depth': self._max_queue_depth,
+                'batches': self._batches,
+                'rows': self._rows,
+                'mean_batch_size': self._rows / self._batches if self._batches else 0.0,
+                'batch_sizes': [{'le': size, 'count': count} for size, count in sorted(self._batch_sizes.items())],
+                'wait_ms': {
+                    'mean': self._wait_sum_ms / self._rows if self._rows else 0.0,
+                    'max': self._wait_max_ms,
+                    'buckets': [
+                        {'le': bound, 'count': count}
+                        for bound, count in zip(WAIT_BUCKETS_MS + ('+Inf',), self._wait_buckets)
+                    ],
+                },
+            }
@@ -0,0 +1,119 @@
+import os
+import threading
+import time
+
+from compiled_model import COMPILED_SUFFIX, load_compiled
+
+
+class ModelUnavailable(Exception):
+    """Raised when a model has never been loaded successfully (e.g. its pickle is missing)."""
+
+
+def file_signature(path: str):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return (path, None, None)
+    return (path, st.st_mtime_ns, st.st_size)
+
+
+def load_model(path: str, mmap_mode: str = 'r'):
+    """A compiled ``.npz`` model, or else a joblib pickle (memory-mapped per ``mmap_mode``)."""
+    if path.endswith(COMPILED_SUFFIX):
+        return load_compiled(path)
+    # Deferred: joblib (and sklearn, when unpickling) load with the first pickled model.
+    import joblib
+
+    return joblib.load(path, mmap_mode=mmap_mode)
+
+
+class _LoadedModel:
+    __slots__ = ('model', 'signature', 'load_seconds')
+
+    def __init__(self, model, signature, load_seconds):
+        self.model = model
+        self.signature = signature
+        self.load_seconds = load_seconds
+
+
+class ModelRegistry:
+    """Loads model pickles on first use and swaps in new versions as they appear.
+
+    Models are loaded with ``joblib.load(path, mmap_mode=...)`` so their numpy
+    arrays are mapped from the page cache and shared by all worker processes.
+    Each file's mtime/size is re-checked at most every ``check_interval``
+    seconds; a changed file is loaded in full before the new model replaces the
+    old one, so callers only ever see a complete model. If a reload fails the
+    previous version keeps serving. Replace model files by renaming a finished
+    file over the old one; rewriting a mapped file in place corrupts the model
+    that is still serving. Paths ending in ``.npz`` are compiled models
+    (``compiled_model.py``), loaded into memory and evaluated without sklearn.
+    ``on_swap(name)`` is called after a reload replaces a serving model, e.g. to
+    drop results cached from the old one.
+    """
+
+    def __init__(self, paths: dict, mmap_mode: str = 'r', check_interval: float = 1.0, on_swap=None):
+        self.paths = dict(paths)
+        self.mmap_mode = mmap_mode
+        self.check_interval = check_interval
+        self.on_swap = on_swap
+        self._loaded = {}
+        self._errors = {}
+        self._failed_signatures = {}
+        self._next_check = {name: 0.0 for name in self.paths}
+        self._locks = {name: threading.Lock() for name in self.paths}
+
+    def _load(self, name: str, signature):
+        start = time.perf_counter()
+        try:
+            model = load_model(self.paths[name], self.mmap_mode)
+        except Exception as exc:
+            self._errors[name] = f'{type(exc).__name__}: {exc}'
+            self._failed_signatures[name] = signature
+            return
+        previous = self._loaded.get(name)
+        self._loaded[name] = _LoadedModel(model, signature, time.perf_counter() - start)
+        self._errors.pop(name, None)
+        if previous is not None and self.on_swap is not None:
+            self.on_swap(name)
+
+    def _refresh(self, name: str, now: float):
+        with self._locks[name]:
+            if now < self._next_check[name]:
+                return
+            self._next_check[name] = now + self.check_interval
+            signature = file_signature(self.paths[name])
+            current = self._loaded.get(name)
+            if signature[1] is None:
+                if current is None:
+                    self._errors[name] = f'{self.paths[name]} not found'
+                return
+            if current is not None and current.signature == signature:
+                return
+            if self._failed_signatures.get(name) == signature:
+                return
+            self._load(name, signature)
+
+    def get(self, name: str):
+        if name not in self.paths:
+            raise KeyError(name)
+        now = time.monotonic()
+        # Until the first load finishes, wait on it rather than report the model missing.
+        if now >= self._next_check[name] or name not in self._loaded:
+            self._refresh(name, now)
+        loaded = self._loaded.get(name)
+        if loaded is None:
+            raise ModelUnavailable(f'The {name} model is not available ({self._errors.get(name, "not loaded")})')
+        return loaded.model
+
+    def status(self) -> dict:
+        status = {}
+        for name, path in self.paths.items():
+            loaded = self._loaded.get(name)
+            status[name] = {
+                'path': path,
+                'loaded': loaded is not None,
+                'load_ms': round(loaded.load_seconds * 1000, 3) if loaded else None,
+                'error': self._errors.get(name),
+            }
+        return status
@@ -0,0 +1,399 @@
+import itertools
+import math
+import threading
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from feature_encoder import FeatureEncoder
+from ideal_fat import IdealFatTable
+from prediction_cache import prediction_key
+from recommender import REP_SLOPE, RepRecommender
+
+_model_executor = None
+_model_executor_lock = threading.Lock()
+# Each pipeline gets its own number, which prefixes its cache keys.
+_pipeline_versions = itertools.count()
+
+
+def _shared_model_executor() -> ThreadPoolExecutor:
+    # One pool for every pipeline, so rebuilding a pipeline after a model
+    # reload doesn't leave threads behind.
+    global _model_executor
+    if _model_executor is None:
+        with _model_executor_lock:
+            if _model_executor is None:
+                _model_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='predict')
+    return _model_executor
+
+
+STAGES = ('parse', 'cache', 'feature', 'batch_wait', 'fat_model', 'water_model', 'recommendation')
+
+
+# Age brackets x gender from ideal_fat_reference.csv; pipelines can be given
+# another IdealFatTable (e.g. an athlete reference) instead.
+DEFAULT_IDEAL_FAT_TABLE = IdealFatTable.from_csv()
+
+
+def ideal_fat_percentage(age: int, gender: str, table: IdealFatTable = None) -> int:
+    return (table or DEFAULT_IDEAL_FAT_TABLE).lookup(age, gender)
+
+
+def build_model_input(model, features):
+    # Only models without feature_names_in_ need this; pandas loads on first use.
+    import pandas as pd
+
+    # A single features dict gives a one-row frame, a list of dicts one row each.
+    rows = [features] if isinstance(features, dict) else list(features)
+    df = pd.DataFrame(rows)
+    if 'Gender' in df.columns:
+        df = pd.get_dummies(df, columns=['Gender'], prefix='Gender')
+    expected_cols = getattr(model, 'feature_names_in_', None)
+    if expected_cols is not None:
+        for col in expected_cols:
+            if col not in df.columns:
+                df[col] = 0
+        df = df.reindex(columns=expected_cols)
+    return df
+
+
+def encode_model_input(model, encoder, features):
+    # Models without feature_names_in_ have no fixed layout to precompile.
+    if encoder is None:
+        return build_model_input(model, features)
+    return encoder.transform(features)
+
+
+def calculate_rep_increase(fat_pred: float, ideal_fat: float, slope: float, user_exercises: dict, exercise_intensity_map: dict):
+    if slope >= 0:
+        slope = -0.01
+    fat_diff = fat_pred - ideal_fat
+    if fat_diff <= 0:
+        return 0, {ex: 0 for ex in user_exercises}
+    total_rep_increase = fat_diff / abs(slope)
+    weighted = [exercise_intensity_map.get(ex, 1) * vals.get('Reps', 0) for ex, vals in user_exercises.items()]
+    total_weight = sum(weighted) or 1
+    rep_increase_each = {
+        ex: int((weight / total_weight) * total_rep_increase) for ex, weight in zip(user_exercises, weighted)
+    }
+    total_rep_increase = min(total_rep_increase, 600)
+    return int(total_rep_increase), rep_increase_each
+
+
+def _finite(value, field: str):
+    # float() accepts "nan" and "inf", and JSON parsers accept NaN; the models don't.
+    if isinstance(value, float) and not math.isfinite(value):
+        raise ValueError(f'{field} must be a finite number')
+    return value
+
+
+def _plan_value(vals: dict, field: str, ex: str) -> float:
+    try:
+        value = float(vals.get(field, 0))
+    except (TypeError, ValueError):
+        raise ValueError(f'{ex} {field} must be a number') from None
+    return _finite(value, f'{ex} {field}')
+
+
+def parse_payload(data: dict) -> dict:
+    """Validated, normalized profile: numbers as int/float, Reps and Sets as floats."""
+    if not isinstance(data, dict):
+        raise ValueError('payload must be a JSON object')
+    exercises = data.get('exercises', {})  # { name: {Reps, Sets} }
+    if not isinstance(exercises, dict) or not all(isinstance(vals, dict) for vals in exercises.values()):
+        raise ValueError('exercises must be an object of {name: {Reps, Sets}}')
+    exercises = {
+        ex: {'Reps': _plan_value(vals, 'Reps', ex), 'Sets': _plan_value(vals, 'Sets', ex)}
+        for ex, vals in exercises.items()
+    }
+    return {
+        'age': int(data.get('age')),
+        'gender': str(data.get('gender')),
+        'weight': _finite(float(data.get('weight')), 'weight'),
+        'height': _finite(float(data.get('height')), 'height'),
+        'session_duration': _finite(float(data.get('session_duration')), 'session_duration'),
+        'frequency': int(data.get('frequency')),
+        'exercises': exercises,
+    }
+
+
+def derive_features(profile: dict, exercise_intensity: dict) -> dict:
+    bmi = profile['weight'] / (profile['height'] ** 2)
+    total_reps = sum(
+        (vals.get('Reps', 0) * vals.get('Sets', 0) * (exercise_intensity.get(ex, 100) / 100))
+        for ex, vals in profile['exercises'].items()
+    )
+    if not (math.isfinite(bmi) and math.isfinite(total_reps)):
+        raise ValueError('BMI and total reps must be finite numbers')
+    return {
+        'Age': profile['age'],
+        'Gender': profile['gender'],
+        'Weight (kg)': profile['weight'],
+        'Height (m)': profile['height'],
+        'BMI': bmi,
+        'Session_Duration (hours)': profile['session_duration'],
+        'Workout_Frequency (days/week)': profile['frequency'],
+        'Total_Reps': total_reps
+    }
+
+
+def parse_prediction_input(data: dict, exercise_intensity: dict):
+    profile = parse_payload(data)
+    return derive_features(profile, exercise_intensity), profile['exercises']
+
+
+def _column_selector(columns: list, union: list):
+    # None: use the shared matrix as is; a slice keeps a contiguous block a view.
+    if columns == union:
+        return None
+    idx = [union.index(col) for col in columns]
+    if idx == list(range(idx[0], idx[0] + len(idx))):
+        return slice(idx[0], idx[0] + len(idx))
+    return np.array(idx)
+
+
+class SharedEncoder:
+    """Encodes features once for several models.
+
+    Models with identical column layouts get the very same matrix; otherwise
+    the features are encoded once into the union of their columns and each
+    model gets a column-indexed view of that.
+    """
+
+    def __init__(self, models):
+        self.models = list(models)
+        encoders = [FeatureEncoder.for_model(model) for model in self.models]
+        if any(encoder is None for encoder in encoders):
+            # No fixed layout for at least one model: encode each one separately.
+            self.encoder = None
+            self.column_maps = None
+            self.model_encoders = encoders
+            return
+        union = []
+        for encoder in encoders:
+            union.extend(col for col in encoder.columns if col not in union)
+        self.encoder = FeatureEncoder(union)
+        self.column_maps = [_column_selector(encoder.columns, union) for encoder in encoders]
+        self.model_encoders = encoders
+
+    def transform(self, features) -> list:
+        if self.encoder is None:
+            return [encode_model_input(model, encoder, features) for model, encoder in zip(self.models, self.model_encoders)]
+        matrix = self.encoder.transform(features)
+        return [matrix if cols is None else matrix[:, cols] for cols in self.column_maps]
+
+    def transform_columns(self, columns: dict, n: int) -> list:
+        if self.encoder is None:
+            rows = [
+                {key: value[i] if isinstance(value, np.ndarray) else value for key, value in columns.items()}
+                for i in range(n)
+            ]
+            return self.transform(rows)
+        matrix = self.encoder.encode_columns(columns, n)
+        return [matrix if cols is None else matrix[:, cols] for cols in self.column_maps]
+
+
+class PredictionPipeline:
+    """Fat/water prediction with features derived and encoded once per request.
+
+    ``run`` and ``run_batch`` return the results together with a dict of
+    per-stage timings in milliseconds (see ``STAGES``). With ``concurrent=True``
+    the two models are evaluated on a small thread pool instead of back to back.
+    An optional ``PredictionCache`` short-circuits ``run`` for repeat inputs,
+    a ``MicroBatcher`` lets concurrent ``run`` calls share model calls, and
+    ``ideal_fat_table`` replaces the default ideal body-fat reference.
+    Cache keys carry the pipeline's ``model_version``, so a result computed
+    by a pipeline built around older models is never served by a newer one.
+    """
+
+    def __init__(self, model_fat, model_water, exercise_intensity: dict, concurrent: bool = False, cache=None,
+                 ideal_fat_table: IdealFatTable = None, batcher=None):
+        self.cache = cache
+        self.batcher = batcher
+        self.ideal_fat_table = ideal_fat_table or DEFAULT_IDEAL_FAT_TABLE
+        self.model_fat = model_fat
+        self.model_water = model_water
+        self.model_version = next(_pipeline_versions)
+        self.exercise_intensity = exercise_intensity
+        self.recommender = RepRecommender(exercise_intensity)
+        self.encoder = SharedEncoder([model_fat, model_water])
+        self._executor = _shared_model_executor() if concurrent else None
+
+    def _timed_predict(self, model, X):
+        start = time.perf_counter()
+        with warnings.catch_warnings():
+            # FeatureEncoder hands sklearn plain arrays already in feature_names_in_
+            # order, so the "fitted with feature names" warning is expected here.
+            warnings.filterwarnings('ignore', message='X does not have valid feature names')
+            preds = model.predict(X)
+        return preds, (time.perf_counter() - start) * 1000
+
+    def predict_matrix(self, features, timings: dict):
+        start = time.perf_counter()
+        fat_X, water_X = self.encoder.transform(features)
+        timings['feature'] = timings.get('feature', 0.0) + (time.perf_counter() - start) * 1000
+        return self._predict_encoded(fat_X, water_X, timings)
+
+    def predict_columns(self, columns: dict, n: int, timings: dict):
+        """``predict_matrix`` for ``n`` rows given per feature as scalars or arrays."""
+        start = time.perf_counter()
+        fat_X, water_X = self.encoder.transform_columns(columns, n)
+        timings['feature'] = timings.get('feature', 0.0) + (time.perf_counter() - start) * 1000
+        return self._predict_encoded(fat_X, water_X, timings)
+
+    def _predict_encoded(self, fat_X, water_X, timings: dict):
+        if self._executor is None:
+            fat_preds, timings['fat_model'] = self._timed_predict(self.model_fat, fat_X)
+            water_preds, timings['water_model'] = self._timed_predict(self.model_water, water_X)
+        else:
+            fat_future = self._executor.submit(self._timed_predict, self.model_fat, fat_X)
+            water_future = self._executor.submit(self._timed_predict, self.model_water, water_X)
+            fat_preds, timings['fat_model'] = fat_future.result()
+            water_preds, timings['water_model'] = water_future.result()
+        return fat_preds, water_preds
+
+    def recommend(self, base_features: dict, user_exercises: dict, fat_pred: float, water_pred: float) -> dict:
+        ideal_fat = float(self.ideal_fat_table.lookup(base_features['Age'], base_features['Gender']))
+        total_inc, rep_increase_each = calculate_rep_increase(
+            fat_pred=fat_pred,
+            ideal_fat=ideal_fat,
+            slope=REP_SLOPE,
+            user_exercises=user_exercises,
+            exercise_intensity_map=self.exercise_intensity,
+        )
+        return {
+            'fat_pred': round(fat_pred, 2),
+            'water_pred': round(water_pred, 2),
+            'ideal_fat': round(ideal_fat, 2),
+            'total_rep_increase': int(total_inc),
+            'rep_increase_each': rep_increase_each,
+        }
+
+    def run(self, data: dict):
+        timings = {}
+        start = time.perf_counter()
+        profile = parse_payload(data)
+        timings['parse'] = (time.perf_counter() - start) * 1000
+
+        key = None
+        if self.cache is not None:
+            start = time.perf_counter()
+            key = (self.model_version, prediction_key(profile))
+            cached = self.cache.get(key)
+            timings['cache'] = (time.perf_counter() - start) * 1000
+            if cached is not None:
+                return cached, timings
+
+        start = time.perf_counter()
+        base_features = derive_features(profile, self.exercise_intensity)
+        timings['feature'] = (time.perf_counter() - start) * 1000
+        if self.batcher is not None:
+            fat_pred, water_pred = self.batcher.predict(self, base_features, timings)
+        else:
+            fat_preds, water_preds = self.predict_matrix(base_features, timings)
+            fat_pred, water_pred = float(fat_preds[0]), float(water_preds[0])
+
+        start = time.perf_counter()
+        result = self.recommend(base_features, profile['exercises'], fat_pred, water_pred)
+        timings['recommendation'] = (time.perf_counter() - start) * 1000
+        if key is not None:
+            self.cache.put(key, result)
+        return result, timings
+
+    def run_batch(self, payloads: list):
+        """Score many payloads with one predict call per model.
+
+        Results come back in input order; a row that fails validation gets
+        ``{'error': ...}`` in its slot instead of failing the whole batch.
+        """
+        timings = {}
+        results = [None] * len(payloads)
+        start = time.perf_counter()
+        profiles = []
+        for i, data in enumerate(payloads):
+            try:
+                profiles.append((i, parse_payload(data)))
+            except Exception as exc:
+                results[i] = {'error': str(exc)}
+        timings['parse'] = (time.perf_counter() - start) * 1000
+
+        # Features and recommendations for the whole batch come from RepRecommender
+        # arrays, which match derive_features and calculate_rep_increase exactly.
+        start = time.perf_counter()
+        plans = self.recommender.encode([profile['exercises'] for _, profile in profiles])
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            weight = np.array([profile['weight'] for _, profile in profiles], dtype=np.float64)
+            height = np.array([profile['height'] for _, profile in profiles], dtype=np.float64)
+            bmi = weight / (height ** 2)
+            total_reps = self.recommender.total_reps(plans)
+        bad = ~(np.isfinite(bmi) & np.isfinite(total_reps))
+        for k in np.flatnonzero(bad).tolist():
+            results[profiles[k][0]] = {'error': 'BMI and total reps must be finite numbers'}
+        for k, message in plans.errors.items():
+            results[profiles[k][0]] = {'error': message}
+        columns = {
+            'Age': np.array([profile['age'] for _, profile in profiles]),
+            'Gender': np.array([profile['gender'] for _, profile in profiles], dtype=object),
+            'Weight (kg)': weight,
+            'Height (m)': height,
+            'BMI': bmi,
+            'Session_Duration (hours)': np.array([p['session_duration'] for _, p in profiles], dtype=np.float64),
+            'Workout_Frequency (days/week)': np.array([p['frequency'] for _, p in profiles]),
+            'Total_Reps': total_reps,
+        }
+        keep = [k for k in range(len(profiles)) if results[profiles[k][0]] is None]
+        timings['feature'] = (time.perf_counter() - start) * 1000
+        if not keep:
+            return results, timings
+
+        scored, fat_preds, water_preds = self._predict_rows(keep, columns, profiles, results, timings)
+        if not scored:
+            return results, timings
+
+        start = time.perf_counter()
+        rows = np.array(scored, dtype=np.intp)
+        fat = np.asarray(fat_preds, dtype=np.float64)
+        ideal = self.ideal_fat_table.lookup_many(columns['Age'][rows], columns['Gender'][rows])
+        plans = plans.take(rows)
+        total_inc, each = self.recommender.recommend(fat, ideal, plans)
+        rep_increase_each = self.recommender.as_dicts(plans, each)
+        for k, fat_pred, water_pred, ideal_fat, total, increases in zip(
+                scored, fat.tolist(), np.asarray(water_preds, dtype=np.float64).tolist(), ideal.tolist(),
+                total_inc.tolist(), rep_increase_each):
+            results[profiles[k][0]] = {
+                'fat_pred': round(fat_pred, 2),
+                'water_pred': round(water_pred, 2),
+                'ideal_fat': round(ideal_fat, 2),
+                'total_rep_increase': total,
+                'rep_increase_each': increases,
+            }
+        timings['recommendation'] = (time.perf_counter() - start) * 1000
+        return results, timings
+
+    def _predict_rows(self, keep: list, columns: dict, profiles: list, results: list, timings: dict):
+        # One call for all rows; if a row still makes the models raise, score the
+        # rows one by one so only that row gets the error.
+        rows = np.array(keep, dtype=np.intp)
+        try:
+            batch = {key: col[rows] for key, col in columns.items()}
+            fat_preds, water_preds = self.predict_columns(batch, len(keep), timings)
+            return keep, fat_preds, water_preds
+        except Exception:
+            pass
+        scored, fat_preds, water_preds = [], [], []
+        for k in keep:
+            try:
+                fat, water = self.predict_columns({key: col[k:k + 1] for key, col in columns.items()}, 1, timings)
+            except Exception as exc:
+                results[profiles[k][0]] = {'error': str(exc)}
+                continue
+            scored.append(k)
+            fat_preds.append(fat[0])
+            water_preds.append(water[0])
+        return scored, fat_preds, water_preds
+
+
+def server_timing_header(timings: dict) -> str:
+    return ', '.join(f'{stage};dur={timings[stage]:.3f}' for stage in STAGES if stage in timings)
@@ -0,0 +1,89 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+def prediction_key(profile: dict) -> tuple:
+    """Cache key for a profile as ``parse_payload`` returns it.
+
+    Built from the parsed values only, so payloads that parse to the same
+    profile share a key. Exercise order doesn't change the prediction, so the
+    exercises become a sorted tuple of (name, reps, sets).
+    """
+    exercises = tuple(sorted(
+        (ex, vals['Reps'], vals['Sets']) for ex, vals in profile['exercises'].items()
+    ))
+    return (
+        profile['age'],
+        profile['gender'],
+        profile['weight'],
+        profile['height'],
+        profile['session_duration'],
+        profile['frequency'],
+        exercises,
+    )
+
+
+class PredictionCache:
+    """Thread-safe LRU cache of prediction results with a per-entry TTL.
+
+    The cache doesn't watch the model files itself: ``clear`` is called when
+    the ``ModelRegistry`` swaps in a new model. Cached results are shared
+    between callers and must not be mutated.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: float = 300.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at <= now:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+            }
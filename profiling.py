@@ -0,0 +1,57 @@
+import cProfile
+import hmac
+import itertools
+import os
+import random
+import time
+
+
+class RequestProfiler:
+    """Opt-in per-request cProfile dumps.
+
+    A request is profiled when it is sampled (``sample_rate``, 0 disables) or
+    when it asks with ``?profile=1`` and an ``X-Profile-Token`` header equal to
+    ``token`` (no token configured: never). Each profile is written to
+    ``directory`` as a ``.prof`` file for ``python -m pstats`` or snakeviz.
+    """
+
+    def __init__(self, directory: str, sample_rate: float = 0.0, token: str = None):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.token = token or None
+        self._seq = itertools.count()
+
+    @property
+    def enabled(self) -> bool:
+        return self.sample_rate > 0 or self.token is not None
+
+    def _token_matches(self, supplied: str) -> bool:
+        # Constant-time, so response timing doesn't reveal how much of the token matched.
+        return hmac.compare_digest(supplied.encode(), self.token.encode())
+
+    def wanted(self, args, headers) -> bool:
+        token = headers.get('X-Profile-Token', '')
+        if self.token is not None and args.get('profile') == '1' and self._token_matches(token):
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def start(self):
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another request on this interpreter is already being profiled.
+            return None
+        return profiler
+
+    def profile_path(self, label: str) -> str:
+        """A new ``.prof`` path in ``directory`` for a request labelled ``label``."""
+        safe_label = ''.join(c if c.isalnum() else '_' for c in label).strip('_') or 'request'
+        return os.path.join(
+            self.directory, f'{time.strftime("%Y%m%dT%H%M%S")}-{os.getpid()}-{next(self._seq)}-{safe_label}.prof'
+        )
+
+    def stop(self, profiler, path: str):
+        profiler.disable()
+        os.makedirs(self.directory, exist_ok=True)
+        profiler.dump_stats(path)
@@ -0,0 +1,171 @@
+import numbers
+
+import numpy as np
+
+# Fat% change per extra rep: the dataset correlation, scaled so that
+# recommendations come out in the hundreds of reps rather than thousands.
+TRUE_SLOPE = -0.00185
+SCALING_FACTOR = 15
+REP_SLOPE = TRUE_SLOPE * SCALING_FACTOR
+MAX_TOTAL_REP_INCREASE = 600
+
+
+class ExercisePlans:
+    """A cohort's exercise plans as users x slots arrays.
+
+    Slot ``k`` of row ``i`` holds user ``i``'s k-th exercise in the order of
+    their plan dict (padding slots have ``mask`` False and zero reps/sets), so
+    row sums accumulate in exactly the order the per-user Python code does.
+    """
+
+    __slots__ = ('names', 'reps', 'sets', 'intensity', 'weight_intensity', 'mask', 'errors')
+
+    def __init__(self, names, reps, sets, intensity, weight_intensity, mask, errors):
+        self.names = names
+        self.reps = reps
+        self.sets = sets
+        self.intensity = intensity
+        self.weight_intensity = weight_intensity
+        self.mask = mask
+        self.errors = errors
+
+    def __len__(self):
+        return len(self.names)
+
+    def take(self, rows: np.ndarray) -> 'ExercisePlans':
+        """The plans of ``rows`` only, without ``errors``."""
+        return ExercisePlans(
+            [self.names[i] for i in rows.tolist()], self.reps[rows], self.sets[rows], self.intensity[rows],
+            self.weight_intensity[rows], self.mask[rows], {},
+        )
+
+
+_PLAIN_NUMBERS = {int, float}
+
+
+def _is_number(value) -> bool:
+    return type(value) in _PLAIN_NUMBERS or isinstance(value, numbers.Real)
+
+
+class RepRecommender:
+    """``calculate_rep_increase`` and the Total_Reps feature for whole cohorts in NumPy.
+
+    Results match the per-user functions exactly, including the 600-rep clamp
+    on the total (applied after distributing the unclamped total), the
+    ``slope >= 0`` fallback to -0.01 and the different defaults for exercises
+    missing from the intensity map (100 in Total_Reps, 1 as a distribution
+    weight).
+    """
+
+    def __init__(self, exercise_intensity: dict, slope: float = REP_SLOPE):
+        self.exercise_intensity = exercise_intensity
+        self.slope = slope
+
+    def encode(self, plans: list) -> ExercisePlans:
+        """Lay out plan dicts; rows that can't be encoded are listed in ``errors`` and left empty."""
+        n = len(plans)
+        names = []
+        errors = {}
+        # Gather everything into flat lists first; one fancy-indexed store per
+        # array is far cheaper than assigning NumPy elements one at a time.
+        flat_rows, flat_cols, flat_names, flat_reps, flat_sets = [], [], [], [], []
+        add_name, add_reps, add_sets = flat_names.append, flat_reps.append, flat_sets.append
+        for i, plan in enumerate(plans):
+            start = len(flat_names)
+            try:
+                for ex, vals in plan.items():
+                    add_name(ex)
+                    add_reps(vals.get('Reps', 0))
+                    add_sets(vals.get('Sets', 0))
+            except AttributeError:
+                del flat_names[start:], flat_reps[start:], flat_sets[start:]
+                errors[i] = 'exercises must be an object of {name: {Reps, Sets}}'
+                names.append([])
+                continue
+            count = len(flat_names) - start
+            names.append(flat_names[start:])
+            flat_rows.extend([i] * count)
+            flat_cols.extend(range(count))
+
+        # Per-value checks only when some value isn't a plain int/float.
+        mixed = not (set(map(type, flat_reps)) <= _PLAIN_NUMBERS and set(map(type, flat_sets)) <= _PLAIN_NUMBERS)
+        for j, (r, s) in enumerate(zip(flat_reps, flat_sets) if mixed else ()):
+            if not (_is_number(r) and _is_number(s)):
+                i = flat_rows[j]
+                if i not in errors:
+                    field = 'Reps' if not _is_number(r) else 'Sets'
+                    errors[i] = f'{field} for {flat_names[j]} must be a number'
+        if errors:
+            keep = [j for j, i in enumerate(flat_rows) if i not in errors]
+            for i in errors:
+                names[i] = []
+            flat_rows = [flat_rows[j] for j in keep]
+            flat_cols = [flat_cols[j] for j in keep]
+            flat_names = [flat_names[j] for j in keep]
+            flat_reps = [flat_reps[j] for j in keep]
+            flat_sets = [flat_sets[j] for j in keep]
+
+        width = max(flat_cols, default=-1) + 1
+        idx = (np.array(flat_rows, dtype=np.intp), np.array(flat_cols, dtype=np.intp))
+        reps = np.zeros((n, width))
+        sets = np.zeros((n, width))
+        mask = np.zeros((n, width), dtype=bool)
+        reps[idx] = np.array(flat_reps, dtype=np.float64)
+        sets[idx] = np.array(flat_sets, dtype=np.float64)
+        mask[idx] = True
+        nan = float('nan')
+        lookup = self.exercise_intensity
+        known = np.array([lookup.get(ex, nan) for ex in flat_names], dtype=np.float64)
+        intensity = np.full((n, width), 100.0)
+        weight_intensity = np.ones((n, width))
+        intensity[idx] = np.where(np.isnan(known), 100.0, known)
+        weight_intensity[idx] = np.where(np.isnan(known), 1.0, known)
+        return ExercisePlans(names, reps, sets, intensity, weight_intensity, mask, errors)
+
+    def encode_shared(self, names: list, reps: list, sets: list, n: int) -> ExercisePlans:
+        """Lay out ``n`` plans that all list ``names``, given per exercise as a reps and a sets array."""
+        width = len(names)
+        lookup = self.exercise_intensity
+        known = [lookup.get(ex) for ex in names]
+        reps = np.column_stack(reps).astype(np.float64) if width else np.zeros((n, 0))
+        sets = np.column_stack(sets).astype(np.float64) if width else np.zeros((n, 0))
+        intensity = np.tile(np.array([100.0 if k is None else k for k in known], dtype=np.float64), (n, 1))
+        weight_intensity = np.tile(np.array([1.0 if k is None else k for k in known], dtype=np.float64), (n, 1))
+        mask = np.ones((n, width), dtype=bool)
+        return ExercisePlans([list(names)] * n, reps, sets, intensity, weight_intensity, mask, {})
+
+    @staticmethod
+    def _row_sums(values: np.ndarray) -> np.ndarray:
+        # Column by column, i.e. left to right like Python's sum(); np.sum's
+        # pairwise summation could differ in the last bit.
+        total = np.zeros(values.shape[0])
+        for k in range(values.shape[1]):
+            total += values[:, k]
+        return total
+
+    def total_reps(self, plans: ExercisePlans) -> np.ndarray:
+        """The Total_Reps model feature: sum of reps * sets * intensity / 100."""
+        return self._row_sums(plans.reps * plans.sets * (plans.intensity / 100))
+
+    def recommend(self, fat_pred, ideal_fat, plans: ExercisePlans, slope=None):
+        """Total and per-slot rep increases as int64 arrays ``(n,)`` and ``(n, slots)``."""
+        slope = np.asarray(self.slope if slope is None else slope, dtype=np.float64)
+        slope = np.where(slope >= 0, -0.01, slope)
+        fat_diff = np.asarray(fat_pred, dtype=np.float64) - np.asarray(ideal_fat, dtype=np.float64)
+        total = fat_diff / np.abs(slope)
+
+        weights = plans.weight_intensity * plans.reps * plans.mask
+        total_weight = self._row_sums(weights)
+        total_weight[total_weight == 0] = 1
+        each = (weights / total_weight[:, None]) * total[:, None]
+
+        needs_more = fat_diff > 0
+        each = np.where(needs_more[:, None] & plans.mask, np.trunc(each), 0).astype(np.int64)
+        total = np.where(needs_more, np.trunc(np.minimum(total, MAX_TOTAL_REP_INCREASE)), 0).astype(np.int64)
+        return total, each
+
+    @staticmethod
+    def as_dicts(plans: ExercisePlans, each: np.ndarray) -> list:
+        """Per-user ``{exercise: increase}`` dicts, as ``calculate_rep_increase`` returns them."""
+        rows = each.tolist()
+        return [dict(zip(names, row)) for names, row in zip(plans.names, rows)]
@@ -0,0 +1,249 @@
+"""Server-side sessions: the cookie carries a random session id, the data lives in a store.
+
+``ServerSideSessionInterface`` replaces Flask's signed-cookie sessions with a
+``MemorySessionStore`` (one process) or a ``SQLiteSessionStore`` (the app's
+database, shared by every worker). A session is written only when it changes,
+an emptied session is deleted along with its cookie, and stored sessions expire
+``app.permanent_session_lifetime`` after their last write. Because the data
+stays on the server, it can hold a cached copy of the user row (under
+``USER_CACHE_KEY``) that ``forget_user`` drops from all of that user's sessions
+when the row changes.
+"""
+import json
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+import db
+
+USER_CACHE_KEY = '_user'
+# Expired sessions are deleted at most this often (seconds), during a save.
+PURGE_INTERVAL = 600.0
+# Most sessions a SQLiteSessionStore keeps in its in-process read cache.
+SESSION_CACHE_SIZE = 10000
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    """Session data plus the id it is stored under; ``sid`` is None until first saved."""
+
+    def __init__(self, initial=None, sid: str = None):
+        def on_update(self):
+            self.modified = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.previous_sid = None
+        self.modified = False
+
+    def regenerate(self):
+        """Store the session under a fresh id on save and delete the old one (call on sign-in)."""
+        if self.sid is not None:
+            self.previous_sid = self.sid
+        self.sid = None
+        self.modified = True
+
+
+class MemorySessionStore:
+    """Sessions in a dict in this process; every worker has its own, so only for a single process.
+
+    Stores hold each session as its serialized JSON text, keyed by session id,
+    with the owning user id kept alongside for ``forget_user``.
+    """
+
+    def __init__(self):
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def load(self, sid: str, conn=None):
+        with self._lock:
+            entry = self._sessions.get(sid)
+        if entry is None or entry[1] <= time.time():
+            return None
+        return entry[2]
+
+    def save(self, sid: str, user_id, data: str, expires_at: float):
+        with self._lock:
+            self._sessions[sid] = (user_id, expires_at, data)
+
+    def delete(self, sid: str):
+        with self._lock:
+            self._sessions.pop(sid, None)
+
+    def forget_user(self, user_id: int, conn=None):
+        with self._lock:
+            for sid, (owner, expires_at, data) in list(self._sessions.items()):
+                if owner == user_id:
+                    stored = json.loads(data)
+                    if stored.pop(USER_CACHE_KEY, None) is not None:
+                        self._sessions[sid] = (owner, expires_at, json.dumps(stored))
+
+    def purge_expired(self, now: float):
+        with self._lock:
+            for sid in [sid for sid, entry in self._sessions.items() if entry[1] <= now]:
+                del self._sessions[sid]
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+class SQLiteSessionStore:
+    """Sessions in the ``sessions`` table, so all workers on the host share them.
+
+    Methods that take ``conn`` use it when given (e.g. an ``AsyncDB`` worker's
+    connection) and otherwise borrow one from ``pool``. With ``cache_ttl`` > 0
+    a loaded session is kept in this process for that many seconds, so repeat
+    requests don't query the table. Saves, deletes and ``forget_user`` through
+    this store update the cache at once. Changes made by other workers show up
+    here within ``cache_ttl``.
+    """
+
+    def __init__(self, pool: db.ConnectionPool, cache_ttl: float = 0.0):
+        self.pool = pool
+        self.cache_ttl = cache_ttl
+        # sid -> (user_id, data, expires_at, cached_until)
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+    def _run(self, conn, fn, *args):
+        if conn is not None:
+            return fn(conn, *args)
+        conn = self.pool.acquire()
+        try:
+            return fn(conn, *args)
+        finally:
+            self.pool.release(conn)
+
+    @staticmethod
+    def _load(conn, sid, now):
+        row = conn.execute(db.SELECT_SESSION, (sid, now)).fetchone()
+        return None if row is None else (row['user_id'], row['data'], row['expires_at'])
+
+    @staticmethod
+    def _write(conn, sql, params):
+        with conn:
+            conn.execute(sql, params)
+
+    def _remember(self, sid: str, user_id, data: str, expires_at: float):
+        if self.cache_ttl <= 0:
+            return
+        with self._cache_lock:
+            self._cache[sid] = (user_id, data, expires_at, time.monotonic() + self.cache_ttl)
+            self._cache.move_to_end(sid)
+            while len(self._cache) > SESSION_CACHE_SIZE:
+                self._cache.popitem(last=False)
+
+    def load(self, sid: str, conn=None):
+        now = time.time()
+        if self.cache_ttl > 0:
+            with self._cache_lock:
+                entry = self._cache.get(sid)
+            if entry is not None and entry[2] > now and entry[3] > time.monotonic():
+                return entry[1]
+        stored = self._run(conn, self._load, sid, now)
+        if stored is None:
+            with self._cache_lock:
+                self._cache.pop(sid, None)
+            return None
+        self._remember(sid, *stored)
+        return stored[1]
+
+    def save(self, sid: str, user_id, data: str, expires_at: float):
+        self._run(None, self._write, db.REPLACE_SESSION, (sid, user_id, data, expires_at))
+        self._remember(sid, user_id, data, expires_at)
+
+    def delete(self, sid: str):
+        with self._cache_lock:
+            self._cache.pop(sid, None)
+        self._run(None, self._write, db.DELETE_SESSION, (sid,))
+
+    def forget_user(self, user_id: int, conn=None):
+        with self._cache_lock:
+            for sid in [sid for sid, entry in self._cache.items() if entry[0] == user_id]:
+                del self._cache[sid]
+        self._run(conn, self._write, db.FORGET_SESSION_KEY, (f'$.{USER_CACHE_KEY}', user_id))
+
+    def purge_expired(self, now: float):
+        with self._cache_lock:
+            for sid in [sid for sid, entry in self._cache.items() if entry[2] <= now]:
+                del self._cache[sid]
+        self._run(None, self._write, db.DELETE_EXPIRED_SESSIONS, (now,))
+
+    def __len__(self):
+        return self._run(None, lambda conn: conn.execute(db.COUNT_SESSIONS).fetchone()[0])
+
+
+class ServerSideSessionInterface(SessionInterface):
+    """Flask session interface that keeps session data in ``store`` under a random id."""
+
+    session_class = ServerSession
+    serializer = TaggedJSONSerializer()
+
+    def __init__(self, store):
+        self.store = store
+        self._next_purge = 0.0
+
+    def load_data(self, sid: str, conn=None):
+        """The stored session for a cookie value, or None if it is unknown, expired or unreadable."""
+        if not sid:
+            return None
+        try:
+            stored = self.store.load(sid, conn)
+        except sqlite3.Error:
+            return None
+        return None if stored is None else self.serializer.loads(stored)
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        data = self.load_data(sid)
+        if data is None:
+            return self.session_class()
+        return self.session_class(data, sid)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        secure = self.get_cookie_secure(app)
+        samesite = self.get_cookie_samesite(app)
+        httponly = self.get_cookie_httponly(app)
+        if session.accessed:
+            response.vary.add('Cookie')
+        if session.previous_sid is not None:
+            self.store.delete(session.previous_sid)
+            session.previous_sid = None
+
+        if not session:
+            if session.modified:
+                if session.sid is not None:
+                    self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path, secure=secure, samesite=samesite,
+                                       httponly=httponly)
+                response.vary.add('Cookie')
+            return
+
+        if session.modified:
+            now = time.time()
+            if session.sid is None:
+                session.sid = secrets.token_urlsafe(32)
+            self.store.save(session.sid, session.get('user_id'), self.serializer.dumps(dict(session)),
+                            now + app.permanent_session_lifetime.total_seconds())
+            if now >= self._next_purge:
+                self._next_purge = now + PURGE_INTERVAL
+                self.store.purge_expired(now)
+        elif not self.should_set_cookie(app, session):
+            return
+        response.set_cookie(name, session.sid, expires=self.get_expiration_time(app, session), httponly=httponly,
+                            domain=domain, path=path, secure=secure, samesite=samesite)
+        response.vary.add('Cookie')
+
+
+SESSION_STORES = {
+    'memory': lambda pool, cache_ttl: MemorySessionStore(),
+    'sqlite': SQLiteSessionStore,
+}
@@ -6,21 +6,44 @@ const state = {
   allExercises: Array.isArray(window.__EXERCISES__) ? window.__EXERCISES__ : [],
 };
 
-function renderExerciseList(filter = '') {
+function renderExerciseNames(names) {
   const list = byId('exercise-list');
   list.innerHTML = '';
+  names.forEach((name) => {
+    const pill = document.createElement('button');
+    pill.className = 'pill';
+    pill.type = 'button';
+    pill.textContent = name;
+    pill.onclick = () => addSelected(name);
+    list.appendChild(pill);
+  });
+}
+
+function renderExerciseList(filter = '') {
   const q = filter.trim().toLowerCase();
-  state.allExercises
-    .filter((e) => e.toLowerCase().includes(q))
-    .slice(0, 60)
-    .forEach((name) => {
-      const pill = document.createElement('button');
-      pill.className = 'pill';
-      pill.type = 'button';
-      pill.textContent = name;
-      pill.onclick = () => addSelected(name);
-      list.appendChild(pill);
-    });
+  renderExerciseNames(state.allExercises.filter((e) => e.toLowerCase().includes(q)).slice(0, 60));
+}
+
+// Typo-tolerant search runs server-side; keystrokes are debounced and stale
+// responses dropped. Falls back to the local filter if the request fails.
+let searchTimer;
+let searchSeq = 0;
+function searchExercises(query) {
+  clearTimeout(searchTimer);
+  const seq = ++searchSeq;
+  if (!query.trim()) {
+    renderExerciseList('');
+    return;
+  }
+  searchTimer = setTimeout(async () => {
+    try {
+      const res = await fetch(`/exercises/search?q=${encodeURIComponent(query)}&limit=60`);
+      const results = await res.json();
+      if (seq === searchSeq) renderExerciseNames(results.map((r) => r.name));
+    } catch {
+      if (seq === searchSeq) renderExerciseList(query);
+    }
+  }, 120);
 }
 
 function addSelected(name) {
@@ -163,7 +186,7 @@ function tryRenderCharts(data){
 window.addEventListener('DOMContentLoaded', () => {
   renderExerciseList('');
   renderSelected();
-  byId('exercise-search').addEventListener('input', (e) => renderExerciseList(e.target.value));
+  byId('exercise-search').addEventListener('input', (e) => searchExercises(e.target.value));
   byId('predict').addEventListener('click', predict);
   // Try load profile if logged in
   fetch('/api/profile').then(r => r.json()).then(p => {
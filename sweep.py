@@ -0,0 +1,213 @@
+"""What-if sweeps: score a grid of workout plans around one profile in one batch.
+
+A sweep request is a ``/predict`` payload under ``base`` plus the axes to vary::
+
+    {"base": {...},
+     "frequency": {"min": 2, "max": 6},
+     "session_duration": [0.5, 1, 1.5],
+     "exercises": {"Push Ups": {"Reps": {"min": 10, "max": 40, "step": 10}, "Sets": 3}},
+     "stop_at_goal": true}
+
+An axis is a number, a list of numbers or ``{"min", "max", "step"}`` (step
+defaults to 1); axes that aren't given keep the base profile's value, and swept
+exercises missing from the base plan are added to it.
+"""
+import math
+import time
+
+import numpy as np
+
+from prediction import parse_payload
+
+DEFAULT_MAX_GRID_SIZE = 10_000
+CHUNK_SIZE = 1024
+# Most axes with more than one value in a sweep: np.indices needs one more
+# dimension than the grid has, and NumPy 1.x arrays have at most 32.
+MAX_AXES = 31
+
+
+class GridTooLarge(ValueError):
+    """Raised when a sweep would score more grid points than allowed."""
+
+
+def _axis_values(spec, name: str, cast, max_size: int) -> np.ndarray:
+    if isinstance(spec, dict):
+        low, high = float(spec['min']), float(spec['max'])
+        step = float(spec.get('step', 1))
+        if step <= 0 or high < low:
+            raise ValueError(f'{name}: need min <= max and step > 0')
+        # Size the axis arithmetically so an absurd range is refused before it's built.
+        count = math.floor((high - low) / step + 1e-9) + 1
+        if count > max_size:
+            raise GridTooLarge(f'{name} has {count} values, over the limit of {max_size} grid points')
+        values = [low + i * step for i in range(count)]
+    elif isinstance(spec, list):
+        values = spec
+    else:
+        values = [spec]
+    if not values:
+        raise ValueError(f'{name}: no values')
+    values = sorted({cast(v) for v in values})
+    if len(values) > max_size:
+        raise GridTooLarge(f'{name} has {len(values)} values, over the limit of {max_size} grid points')
+    return np.array(values, dtype=np.float64)
+
+
+def _round(value: float) -> float:
+    return round(float(value), 2)
+
+
+def _duration(value) -> float:
+    # Float steps accumulate error (0.1 * 3 != 0.3); durations don't need more than this.
+    return round(float(value), 6)
+
+
+class Sweep:
+    """A parsed sweep: the base profile, its axes and the grid size."""
+
+    def __init__(self, data: dict, max_grid_size: int = DEFAULT_MAX_GRID_SIZE):
+        if not isinstance(data, dict) or not isinstance(data.get('base'), dict):
+            raise ValueError('sweep needs a "base" /predict payload')
+        self.profile = parse_payload(data['base'])
+        self.stop_at_goal = bool(data.get('stop_at_goal', False))
+        self.max_grid_size = max_grid_size
+
+        plan = {ex: dict(vals) for ex, vals in self.profile['exercises'].items()}
+        for ex in data.get('exercises') or {}:
+            plan.setdefault(ex, {'Reps': 0, 'Sets': 0})
+        self.exercises = list(plan)
+
+        # (label, values); exercise axes are labelled (exercise, 'Reps' | 'Sets').
+        self.axes = [
+            ('frequency', _axis_values(data.get('frequency', self.profile['frequency']), 'frequency', int, max_grid_size)),
+            ('session_duration', _axis_values(
+                data.get('session_duration', self.profile['session_duration']), 'session_duration', _duration, max_grid_size)),
+        ]
+        sweep_exercises = data.get('exercises') or {}
+        for ex in self.exercises:
+            spec = sweep_exercises.get(ex) or {}
+            for field in ('Reps', 'Sets'):
+                default = plan[ex].get(field, 0)
+                self.axes.append(((ex, field), _axis_values(spec.get(field, default), f'{ex} {field}', int, max_grid_size)))
+
+        varying = sum(len(values) > 1 for _, values in self.axes)
+        if varying > MAX_AXES:
+            raise ValueError(f'too many sweep dimensions (max {MAX_AXES} axes with more than one value)')
+        self.grid_size = math.prod(len(values) for _, values in self.axes)
+        if self.grid_size > max_grid_size:
+            raise GridTooLarge(f'sweep grid has {self.grid_size} points, over the limit of {max_grid_size}')
+
+    def grid(self) -> dict:
+        """Every grid point's axis values, as one array per axis label.
+
+        Only axes with more than one value span the grid; the rest are repeated.
+        """
+        varying = [(label, values) for label, values in self.axes if len(values) > 1]
+        grid = {label: np.full(self.grid_size, values[0]) for label, values in self.axes if len(values) == 1}
+        if varying:
+            shape = [len(values) for _, values in varying]
+            index = np.indices(shape).reshape(len(shape), -1)
+            grid.update((label, values[idx]) for (label, values), idx in zip(varying, index))
+        return {label: grid[label] for label, _ in self.axes}
+
+
+def run_sweep(pipeline, data: dict, max_grid_size: int = DEFAULT_MAX_GRID_SIZE):
+    """Score a sweep with ``pipeline``; returns ``(result, timings)`` like ``PredictionPipeline.run``.
+
+    Points are scored cheapest first, by weekly hours (frequency x session
+    duration) and then weekly weighted reps. With ``stop_at_goal`` scoring stops
+    after the first chunk that contains a plan reaching the ideal fat %, so the
+    surface only covers the points up to there.
+    """
+    timings = {}
+    start = time.perf_counter()
+    sweep = Sweep(data, max_grid_size)
+    profile = sweep.profile
+    ideal_fat = float(pipeline.ideal_fat_table.lookup(profile['age'], profile['gender']))
+    timings['parse'] = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    grid = sweep.grid()
+    plans = pipeline.recommender.encode_shared(
+        sweep.exercises,
+        [grid[(ex, 'Reps')] for ex in sweep.exercises],
+        [grid[(ex, 'Sets')] for ex in sweep.exercises],
+        sweep.grid_size,
+    )
+    total_reps = pipeline.recommender.total_reps(plans)
+    weekly_hours = grid['frequency'] * grid['session_duration']
+    weekly_reps = grid['frequency'] * total_reps
+    order = np.lexsort((weekly_reps, weekly_hours))
+    grid = {label: values[order] for label, values in grid.items()}
+    total_reps = total_reps[order]
+    weekly_hours = weekly_hours[order]
+    timings['feature'] = (time.perf_counter() - start) * 1000
+
+    base_columns = {
+        'Age': profile['age'],
+        'Gender': profile['gender'],
+        'Weight (kg)': profile['weight'],
+        'Height (m)': profile['height'],
+        'BMI': profile['weight'] / (profile['height'] ** 2),
+    }
+    chunk_size = sweep.grid_size if not sweep.stop_at_goal else CHUNK_SIZE
+    fat_chunks, water_chunks = [], []
+    evaluated = 0
+    model_timings = {'fat_model': 0.0, 'water_model': 0.0}
+    while evaluated < sweep.grid_size:
+        stop = min(evaluated + chunk_size, sweep.grid_size)
+        columns = dict(base_columns)
+        columns['Session_Duration (hours)'] = grid['session_duration'][evaluated:stop]
+        columns['Workout_Frequency (days/week)'] = grid['frequency'][evaluated:stop]
+        columns['Total_Reps'] = total_reps[evaluated:stop]
+        chunk_timings = {}
+        fat_preds, water_preds = pipeline.predict_columns(columns, stop - evaluated, chunk_timings)
+        timings['feature'] += chunk_timings['feature']
+        for stage in model_timings:
+            model_timings[stage] += chunk_timings[stage]
+        fat_chunks.append(np.asarray(fat_preds, dtype=np.float64))
+        water_chunks.append(np.asarray(water_preds, dtype=np.float64))
+        evaluated = stop
+        if sweep.stop_at_goal and (fat_chunks[-1] <= ideal_fat).any():
+            break
+    timings.update(model_timings)
+
+    start = time.perf_counter()
+    fat = np.concatenate(fat_chunks)
+    water = np.concatenate(water_chunks)
+    reaching = np.flatnonzero(fat <= ideal_fat)
+    cheapest = None
+    if reaching.size:
+        i = reaching[0]
+        cheapest = {
+            'frequency': int(grid['frequency'][i]),
+            'session_duration': float(grid['session_duration'][i]),
+            'exercises': {
+                ex: {'Reps': int(grid[(ex, 'Reps')][i]), 'Sets': int(grid[(ex, 'Sets')][i])} for ex in sweep.exercises
+            },
+            'weekly_hours': _round(weekly_hours[i]),
+            'fat_pred': _round(fat[i]),
+            'water_pred': _round(water[i]),
+        }
+    result = {
+        'ideal_fat': _round(ideal_fat),
+        'grid_size': sweep.grid_size,
+        'evaluated': evaluated,
+        'terminated_early': evaluated < sweep.grid_size,
+        'cheapest': cheapest,
+        'surface': {
+            'frequency': grid['frequency'][:evaluated].astype(np.int64).tolist(),
+            'session_duration': grid['session_duration'][:evaluated].tolist(),
+            'exercises': {
+                ex: {
+                    'Reps': grid[(ex, 'Reps')][:evaluated].astype(np.int64).tolist(),
+                    'Sets': grid[(ex, 'Sets')][:evaluated].astype(np.int64).tolist(),
+                }
+                for ex in sweep.exercises
+            },
+            'fat_pred': [_round(v) for v in fat.tolist()],
+            'water_pred': [_round(v) for v in water.tolist()],
+        },
+    }
+    timings['recommendation'] = (time.perf_counter() - start) * 1000
+    return result, timings
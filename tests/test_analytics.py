@@ -0,0 +1,77 @@
+import json
+import os
+
+import pytest
+
+import db
+from analytics import CohortAnalytics
+from exercise_catalog import EXERCISE_CSV_PATH, read_exercise_csv
+from model_registry import load_model
+from prediction import PredictionPipeline
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = db.ConnectionPool(str(tmp_path / 'analytics.db'))
+    conn = pool.acquire()
+    db.ensure_schema(conn)
+    pool.release(conn)
+    return pool
+
+
+@pytest.fixture(scope='module')
+def pipeline():
+    # The fat model stands in for both; only the shape of the results matters here.
+    model = load_model(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'fat_model.pkl'))
+    return PredictionPipeline(model, model, read_exercise_csv(EXERCISE_CSV_PATH))
+
+
+def _add_profile(pool, email: str, age: int, exercises: dict, **fields):
+    conn = pool.acquire()
+    try:
+        with conn:
+            user_id = conn.execute(db.INSERT_USER, (email, 'x', '')).lastrowid
+        profile = {'age': age, 'gender': 'Male', 'weight': 80, 'height': 1.8, 'session_duration': 1, 'frequency': 3}
+        db.save_profile(conn, user_id, profile | fields, json.dumps(exercises))
+    finally:
+        pool.release(conn)
+
+
+def test_exercises_leave_out_exercises_below_min_cohort(pool):
+    for i in range(3):
+        _add_profile(pool, f'push{i}@example.com', 30, {'Push Ups': {'Reps': 10 + i, 'Sets': 3}})
+    for i in range(2):
+        _add_profile(pool, f'squat{i}@example.com', 30, {'Squats': {'Reps': 20, 'Sets': 2}})
+    # A third Squats profile in another bracket doesn't lift the 26-35 count to 3.
+    _add_profile(pool, 'squat-older@example.com', 50, {'Squats': {'Reps': 20, 'Sets': 2}})
+
+    analytics = CohortAnalytics(pool, get_pipeline=lambda: None, min_cohort=3)
+
+    assert analytics.exercises() == {'exercises': [
+        {'exercise': 'Push Ups', 'profiles': 3, 'avg_reps': 11.0, 'avg_sets': 3.0},
+    ]}
+    assert analytics.exercises(brackets=['46-55']) == {'exercises': []}
+
+
+def test_exercises_at_min_cohort_are_reported(pool):
+    for i in range(3):
+        _add_profile(pool, f'squat{i}@example.com', 50, {'Squats': {'Reps': 20, 'Sets': 2}})
+
+    analytics = CohortAnalytics(pool, get_pipeline=lambda: None, min_cohort=3)
+
+    assert analytics.exercises(brackets=['46-55'])['exercises'] == [
+        {'exercise': 'Squats', 'profiles': 3, 'avg_reps': 20.0, 'avg_sets': 2.0},
+    ]
+
+
+def test_cohorts_skip_profiles_with_non_numeric_or_non_finite_values(pool, pipeline):
+    for i in range(3):
+        _add_profile(pool, f'ok{i}@example.com', 30, {'Push Ups': {'Reps': 10, 'Sets': 3}})
+    _add_profile(pool, 'text@example.com', 30, {}, weight='eighty')
+    _add_profile(pool, 'inf@example.com', 30, {}, height=float('inf'))
+    _add_profile(pool, 'huge@example.com', 30, {'Push Ups': {'Reps': 1e308, 'Sets': 10}})
+
+    result = CohortAnalytics(pool, get_pipeline=lambda: pipeline, min_cohort=3).cohorts()
+
+    assert result['skipped'] == 3
+    assert [(row['bracket'], row['gender'], row['profiles']) for row in result['cohorts']] == [('26-35', 'male', 3)]
@@ -0,0 +1,60 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import ExtraTreesRegressor, GradientBoostingRegressor, RandomForestRegressor
+from sklearn.linear_model import LinearRegression
+from sklearn.tree import DecisionTreeRegressor
+
+import compiled_model
+from model_registry import load_model
+
+FAT_MODEL_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'fat_model.pkl')
+COLUMNS = ['Age', 'Gender_Male', 'BMI', 'Session_Duration (hours)', 'Total_Reps']
+
+MODELS = [
+    LinearRegression(),
+    DecisionTreeRegressor(max_depth=6, random_state=0),
+    RandomForestRegressor(n_estimators=8, max_depth=5, random_state=0),
+    ExtraTreesRegressor(n_estimators=8, max_depth=5, random_state=0),
+    GradientBoostingRegressor(n_estimators=20, max_depth=3, random_state=0),
+]
+
+
+def _frame(rows: int, seed: int) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    X = rng.uniform(0, 100, size=(rows, len(COLUMNS)))
+    X[:, 1] = rng.integers(0, 2, rows)
+    return pd.DataFrame(X, columns=COLUMNS)
+
+
+@pytest.mark.parametrize('model', MODELS, ids=lambda model: type(model).__name__)
+def test_npz_predictions_equal_model_predict(model, tmp_path):
+    train = _frame(300, seed=0)
+    model.fit(train, train['BMI'] * 0.3 + train['Total_Reps'] * 0.01 + train['Gender_Male'])
+    path = str(tmp_path / 'model.npz')
+    compiled_model.save(compiled_model.compile_model(model), path)
+
+    loaded = load_model(path)
+
+    X = _frame(500, seed=1)
+    np.testing.assert_allclose(loaded.predict(X.to_numpy()), model.predict(X), rtol=1e-9, atol=1e-9)
+    assert list(loaded.feature_names_in_) == COLUMNS
+
+
+def test_compiled_fat_model_matches_the_pickle(tmp_path):
+    model = load_model(FAT_MODEL_PATH)
+    path = str(tmp_path / 'fat_model.npz')
+    compiled_model.save(compiled_model.compile_model(model), path)
+
+    assert compiled_model.check_compiled(model, load_model(path)) <= 1e-9
+
+
+def test_load_compiled_rejects_other_format_versions(tmp_path, monkeypatch):
+    path = str(tmp_path / 'model.npz')
+    compiled_model.save(compiled_model.CompiledLinear(None, np.ones(3), 0.5), path)
+    monkeypatch.setattr(compiled_model, 'FORMAT_VERSION', compiled_model.FORMAT_VERSION + 1)
+
+    with pytest.raises(ValueError, match='compiled model format'):
+        compiled_model.load_compiled(path)
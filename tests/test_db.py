@@ -0,0 +1,149 @@
+import sqlite3
+
+import pytest
+
+import db
+
+# The tables as a database at user_version 1 has them (the baseline tables plus
+# profile_exercises); legacy plans may still sit in profiles.exercises_json.
+VERSION_1_SCHEMA = (
+    """
+    CREATE TABLE users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        email TEXT UNIQUE NOT NULL,
+        password_hash TEXT NOT NULL,
+        name TEXT
+    )
+    """,
+    """
+    CREATE TABLE profiles (
+        user_id INTEGER PRIMARY KEY,
+        age INTEGER,
+        gender TEXT,
+        weight REAL,
+        height REAL,
+        session_duration REAL,
+        frequency INTEGER,
+        exercises_json TEXT,
+        FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE
+    )
+    """,
+    """
+    CREATE TABLE profile_exercises (
+        user_id INTEGER NOT NULL,
+        position INTEGER NOT NULL,
+        exercise TEXT NOT NULL,
+        reps INTEGER,
+        sets INTEGER,
+        PRIMARY KEY (user_id, exercise),
+        FOREIGN KEY(user_id) REFERENCES profiles(user_id) ON DELETE CASCADE
+    )
+    """,
+)
+
+LEGACY_PLANS = {
+    1: '{"Push Ups": {"Reps": 10, "Sets": 3}, "Squats": {"Reps": 20, "Sets": 2}}',
+    2: '{}',
+    3: 'not json',
+    4: '{"Push Ups": {"Reps": "lots"}}',
+    5: None,
+}
+
+
+@pytest.fixture
+def version_1_db(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / 'app.db'))
+    conn.row_factory = sqlite3.Row
+    for ddl in VERSION_1_SCHEMA:
+        conn.execute(ddl)
+    for user_id, exercises_json in LEGACY_PLANS.items():
+        conn.execute('INSERT INTO users(id, email, password_hash) VALUES (?, ?, ?)', (user_id, f'{user_id}@x.com', 'x'))
+        conn.execute('INSERT INTO profiles VALUES (?, 30, ?, 80, 1.8, 1, 3, ?)', (user_id, 'Male', exercises_json))
+    conn.execute('PRAGMA user_version = 1')
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+@pytest.fixture
+def conn(tmp_path):
+    pool = db.ConnectionPool(str(tmp_path / 'profiles.db'))
+    conn = pool.acquire()
+    db.ensure_schema(conn)
+    with conn:
+        conn.execute(db.INSERT_USER, ('a@example.com', 'x', ''))
+    yield conn
+    pool.release(conn)
+
+
+PROFILE = {'age': 30, 'gender': 'Male', 'weight': 80.0, 'height': 1.8, 'session_duration': 1.0, 'frequency': 3}
+
+
+def _tables(conn) -> set:
+    return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+
+def test_migration_from_version_1_brings_the_schema_up_to_date(version_1_db):
+    conn = version_1_db
+
+    assert db.ensure_schema(conn)
+
+    assert conn.execute('PRAGMA user_version').fetchone()[0] == db.SCHEMA_VERSION
+    assert {'predictions', 'prediction_trends', 'sessions'} <= _tables(conn)
+    # Everything a fresh database gets, e.g. indexes added by later versions.
+    fresh = sqlite3.connect(':memory:')
+    db.create_schema(fresh)
+    expected = {row[0] for row in fresh.execute("SELECT name FROM sqlite_master WHERE name NOT LIKE 'sqlite_%'")}
+    assert expected <= {row[0] for row in conn.execute('SELECT name FROM sqlite_master')}
+    assert not db.ensure_schema(conn)
+
+
+def test_migration_backfills_legacy_plans(version_1_db):
+    conn = version_1_db
+
+    db.ensure_schema(conn)
+
+    rows = conn.execute('SELECT exercise, reps, sets FROM profile_exercises WHERE user_id=1 ORDER BY position')
+    assert [tuple(row) for row in rows] == [('Push Ups', 10, 3), ('Squats', 20, 2)]
+    legacy = dict(conn.execute('SELECT user_id, exercises_json FROM profiles').fetchall())
+    # Migrated plans move out of the blob; ones that don't parse stay as they were.
+    assert legacy == {1: None, 2: '{}', 3: 'not json', 4: '{"Push Ups": {"Reps": "lots"}}', 5: None}
+    plan = '{"Push Ups":{"Reps":10,"Sets":3},"Squats":{"Reps":20,"Sets":2}}'
+    assert db.load_profile(conn, 1)['exercises_json'] == plan
+    assert db.load_profile(conn, 2)['exercises_json'] == '{}'
+    assert db.load_profile(conn, 3)['exercises_json'] == 'not json'
+    assert db.load_profile(conn, 5)['exercises_json'] is None
+
+
+@pytest.mark.parametrize('exercises_json', [
+    '{"Push Ups":{"Reps":10,"Sets":3},"Squats":{"Reps":12.5,"Sets":null}}',
+    '{}',
+    None,
+    '["kept", "verbatim"]',
+])
+def test_profile_round_trips(conn, exercises_json):
+    db.save_profile(conn, 1, PROFILE, exercises_json)
+
+    assert db.load_profile(conn, 1) == PROFILE | {'exercises_json': exercises_json}
+
+
+def test_save_profile_parses_numeric_strings(conn):
+    db.save_profile(conn, 1, PROFILE, '{"Push Ups":{"Reps":"10","Sets":" 3 "}}')
+
+    assert db.load_profile(conn, 1)['exercises_json'] == '{"Push Ups":{"Reps":10,"Sets":3}}'
+
+
+@pytest.mark.parametrize('value', ['"ten"', '"nan"', '[10]', 'true'])
+def test_save_profile_rejects_non_numeric_reps(conn, value):
+    db.save_profile(conn, 1, PROFILE, '{"Push Ups":{"Reps":10,"Sets":3}}')
+
+    with pytest.raises(ValueError, match='Reps for Push Ups must be a number'):
+        db.save_profile(conn, 1, PROFILE | {'age': 40}, '{"Push Ups":{"Reps":%s,"Sets":3}}' % value)
+    assert db.load_profile(conn, 1) == PROFILE | {'exercises_json': '{"Push Ups":{"Reps":10,"Sets":3}}'}
+
+
+def test_empty_plans_are_not_counted_as_legacy_in_cohorts(conn):
+    db.save_profile(conn, 1, PROFILE, '{}')
+
+    row = conn.execute(db.SELECT_COHORT_PROFILES, ('{}', 25, 35)).fetchone()
+    assert (row['legacy'], row['total_reps']) == (0, 0)
@@ -0,0 +1,46 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from feature_encoder import FeatureEncoder
+from prediction import build_model_input
+
+FEATURE_ROWS = [
+    {'Age': 30, 'Gender': 'Male', 'BMI': 24.7, 'Total_Reps': 90.0},
+    {'Age': 52, 'Gender': 'Female', 'BMI': 31.2, 'Total_Reps': 0.0},
+    {'Age': 41, 'Gender': 'Other', 'BMI': 19.8, 'Total_Reps': 12.5},
+]
+
+LAYOUTS = [
+    # One-hot genders, a raw Gender column get_dummies drops, and a column no feature provides.
+    ['Age', 'Gender_Male', 'BMI', 'Gender_Female', 'Total_Reps'],
+    ['Gender', 'BMI', 'Workout_Frequency (days/week)', 'Total_Reps'],
+    ['Total_Reps', 'Gender_Female', 'Age'],
+]
+
+
+def _dataframe_path(columns, features) -> np.ndarray:
+    model = SimpleNamespace(feature_names_in_=np.array(columns, dtype=object))
+    return build_model_input(model, features).to_numpy(dtype=np.float64)
+
+
+@pytest.mark.parametrize('columns', LAYOUTS)
+def test_encode_matches_the_dataframe_path(columns):
+    encoder = FeatureEncoder(columns)
+
+    for features in FEATURE_ROWS:
+        np.testing.assert_array_equal(encoder.transform(features), _dataframe_path(columns, features))
+    np.testing.assert_array_equal(encoder.transform(FEATURE_ROWS), _dataframe_path(columns, FEATURE_ROWS))
+
+
+@pytest.mark.parametrize('columns', LAYOUTS)
+def test_encode_columns_matches_encode_many(columns):
+    encoder = FeatureEncoder(columns)
+    arrays = {key: np.array([row[key] for row in FEATURE_ROWS]) for key in FEATURE_ROWS[0]}
+    arrays['Gender'] = np.array(arrays['Gender'], dtype=object)
+
+    np.testing.assert_array_equal(encoder.encode_columns(arrays, len(FEATURE_ROWS)), encoder.encode_many(FEATURE_ROWS))
+    # Scalars are repeated down every row.
+    scalars = dict(FEATURE_ROWS[0])
+    np.testing.assert_array_equal(encoder.encode_columns(scalars, 2), encoder.encode_many([FEATURE_ROWS[0]] * 2))
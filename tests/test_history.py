@@ -0,0 +1,107 @@
+import numpy as np
+import pytest
+
+import db
+from history import SECONDS_PER_DAY, HistoryWriter, append_predictions, load_history, parse_cursor
+
+WINDOW = 5
+START = 1_700_000_000.0
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = db.ConnectionPool(str(tmp_path / 'history.db'))
+    conn = pool.acquire()
+    db.ensure_schema(conn)
+    pool.release(conn)
+    return pool
+
+
+@pytest.fixture
+def conn(pool):
+    conn = pool.acquire()
+    yield conn
+    pool.release(conn)
+
+
+def _add_user(conn, email: str) -> int:
+    with conn:
+        return conn.execute(db.INSERT_USER, (email, 'x', '')).lastrowid
+
+
+def _append(conn, rows: list, window: int = WINDOW):
+    with conn:
+        append_predictions(conn, rows, window)
+
+
+def _expected_trend(times: list, fats: list, window: int) -> dict:
+    # Straight from the full history, the way the running sums should come out.
+    alpha = 2 / (window + 1)
+    ema = fats[0]
+    for fat in fats[1:]:
+        ema = alpha * fat + (1 - alpha) * ema
+    days = (np.array(times[-window:]) - times[0]) / SECONDS_PER_DAY
+    slope = np.polyfit(days, fats[-window:], 1)[0]
+    return {'count': len(fats), 'moving_average': np.mean(fats[-window:]), 'ema': ema, 'slope_per_day': slope}
+
+
+def test_trend_matches_a_recompute_over_the_window(conn):
+    user_id = _add_user(conn, 'a@example.com')
+    other_id = _add_user(conn, 'b@example.com')
+    rng = np.random.default_rng(0)
+    times = [START + day * SECONDS_PER_DAY + rng.uniform(0, 3600) for day in range(12)]
+    fats = [30 - 0.2 * day + rng.normal(0, 0.3) for day in range(12)]
+    rows = [(user_id, t, fat, 55.0, 18.0, 100) for t, fat in zip(times, fats)]
+    # Several batches, one of them interleaved with another user's rows.
+    _append(conn, rows[:3])
+    _append(conn, rows[3:8] + [(other_id, START, 40.0, 50.0, 20.0, 0)])
+    _append(conn, rows[8:])
+
+    trend = load_history(conn, user_id, 50)['trend']
+    expected = _expected_trend(times, fats, WINDOW)
+
+    assert trend['count'] == expected['count']
+    assert trend['window'] == WINDOW
+    assert trend['moving_average'] == pytest.approx(expected['moving_average'], abs=1e-3)
+    assert trend['ema'] == pytest.approx(expected['ema'], abs=1e-3)
+    assert trend['slope_per_day'] == pytest.approx(expected['slope_per_day'], abs=1e-4)
+    assert trend['gap_to_ideal'] == pytest.approx(fats[-1] - 18.0, abs=1e-3)
+    assert load_history(conn, other_id, 50)['trend']['count'] == 1
+
+
+def test_late_rows_keep_the_window_in_order(conn):
+    user_id = _add_user(conn, 'a@example.com')
+    _append(conn, [(user_id, START + day * SECONDS_PER_DAY, 30.0 - day, None, None, 0) for day in range(6)])
+    # Queued before the last write but written after it: clamped to the newest time.
+    _append(conn, [(user_id, START, 20.0, None, None, 0)])
+
+    history = load_history(conn, user_id, 50)
+
+    assert [item['fat_pred'] for item in history['items']][:2] == [20.0, 25.0]
+    assert history['trend']['moving_average'] == pytest.approx(np.mean([28.0, 27.0, 26.0, 25.0, 20.0]))
+
+
+def test_history_pages_cover_every_row_newest_first(conn):
+    user_id = _add_user(conn, 'a@example.com')
+    _append(conn, [(user_id, START + i, float(i), None, None, 0) for i in range(7)])
+
+    seen, before = [], None
+    while True:
+        page = load_history(conn, user_id, 3, before)
+        seen += [item['fat_pred'] for item in page['items']]
+        if page['next'] is None:
+            break
+        before = parse_cursor(page['next'])
+
+    assert seen == [6.0, 5.0, 4.0, 3.0, 2.0, 1.0, 0.0]
+
+
+def test_writer_appends_recorded_results(pool, conn):
+    user_id = _add_user(conn, 'a@example.com')
+    writer = HistoryWriter(pool, window=WINDOW, max_wait=0.001)
+    for i in range(4):
+        assert writer.record(user_id, {'fat_pred': 25.0 - i, 'ideal_fat': 18.0}, created_at=START + i)
+
+    assert writer.flush(5)
+    assert writer.stats()['written'] == 4
+    assert load_history(conn, user_id, 50)['trend']['count'] == 4
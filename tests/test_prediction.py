@@ -0,0 +1,63 @@
+import os
+
+import pytest
+
+from exercise_catalog import EXERCISE_CSV_PATH, read_exercise_csv
+from model_registry import load_model
+from prediction import PredictionPipeline, parse_payload
+from prediction_cache import PredictionCache, prediction_key
+
+PAYLOAD = {
+    'age': 30, 'gender': 'Male', 'weight': 80, 'height': 1.8, 'session_duration': 1, 'frequency': 3,
+    'exercises': {'Push Ups': {'Reps': 10, 'Sets': 3}},
+}
+
+
+@pytest.fixture(scope='module')
+def model():
+    return load_model(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'fat_model.pkl'))
+
+
+@pytest.fixture
+def pipeline(model):
+    # The fat model stands in for both; only the shape of the results matters here.
+    return PredictionPipeline(model, model, read_exercise_csv(EXERCISE_CSV_PATH))
+
+
+@pytest.mark.parametrize('payload', [
+    PAYLOAD | {'weight': float('nan')},
+    PAYLOAD | {'height': 'inf'},
+    PAYLOAD | {'exercises': {'Push Ups': {'Reps': float('nan'), 'Sets': 3}}},
+])
+def test_parse_payload_rejects_non_finite_numbers(payload):
+    with pytest.raises(ValueError, match='finite'):
+        parse_payload(payload)
+
+
+def test_run_batch_reports_errors_per_row(pipeline):
+    payloads = [PAYLOAD, PAYLOAD | {'weight': float('nan')}, {'age': 30}, 'not a dict', PAYLOAD | {'height': 0}, PAYLOAD]
+
+    results, _ = pipeline.run_batch(payloads)
+
+    assert [set(result) == {'error'} for result in results] == [False, True, True, True, True, False]
+    assert results[0] == results[5] == pipeline.run(PAYLOAD)[0]
+
+
+def test_payloads_that_parse_alike_share_a_cache_key():
+    as_strings = PAYLOAD | {'age': '30', 'weight': '80', 'exercises': {'Push Ups': {'Reps': '10', 'Sets': '3'}}}
+    reordered = PAYLOAD | {'exercises': {'Squats': {'Reps': 5}, 'Push Ups': {'Reps': 10, 'Sets': 3}}}
+    other = PAYLOAD | {'exercises': {'Push Ups': {'Reps': 10, 'Sets': 3}, 'Squats': {'Reps': 5}}}
+
+    assert prediction_key(parse_payload(as_strings)) == prediction_key(parse_payload(PAYLOAD))
+    assert prediction_key(parse_payload(reordered)) == prediction_key(parse_payload(other))
+
+
+def test_cached_results_are_never_served_for_invalid_payloads(model):
+    cache = PredictionCache()
+    pipeline = PredictionPipeline(model, model, read_exercise_csv(EXERCISE_CSV_PATH), cache=cache)
+    result, _ = pipeline.run(PAYLOAD)
+
+    assert pipeline.run(PAYLOAD | {'exercises': {'Push Ups': {'Reps': '10', 'Sets': 3}}})[0] is result
+    with pytest.raises(ValueError, match='Push Ups Reps must be a number'):
+        pipeline.run(PAYLOAD | {'exercises': {'Push Ups': {'Reps': 'ten', 'Sets': 3}}})
+    assert (cache.hits, cache.misses) == (1, 1)
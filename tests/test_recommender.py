@@ -0,0 +1,97 @@
+import os
+
+import numpy as np
+import pytest
+
+from exercise_catalog import EXERCISE_CSV_PATH, read_exercise_csv
+from model_registry import load_model
+from prediction import REP_SLOPE, PredictionPipeline, calculate_rep_increase, derive_features
+from recommender import RepRecommender
+
+INTENSITY = read_exercise_csv(EXERCISE_CSV_PATH)
+
+
+@pytest.fixture(scope='module')
+def pipeline():
+    # The fat model stands in for both; only agreement between the paths matters here.
+    model = load_model(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'fat_model.pkl'))
+    return PredictionPipeline(model, model, INTENSITY)
+
+
+def _plans(n: int, seed: int) -> list:
+    rng = np.random.default_rng(seed)
+    names = sorted(INTENSITY)[:20] + ['Not In The Catalog']
+    plans = []
+    for _ in range(n):
+        picked = rng.choice(names, size=rng.integers(0, 6), replace=False)
+        plans.append({str(ex): {'Reps': int(rng.integers(0, 60)), 'Sets': float(rng.integers(0, 6))} for ex in picked})
+    return plans
+
+
+def test_recommend_matches_calculate_rep_increase():
+    plans = _plans(500, seed=0)
+    rng = np.random.default_rng(1)
+    fat = rng.uniform(5, 45, len(plans))
+    ideal = rng.uniform(10, 25, len(plans))
+    recommender = RepRecommender(INTENSITY)
+
+    encoded = recommender.encode(plans)
+    for slope in (REP_SLOPE, 0.5):
+        total, each = recommender.recommend(fat, ideal, encoded, slope)
+        expected = [calculate_rep_increase(f, i, slope, plan, INTENSITY) for f, i, plan in zip(fat, ideal, plans)]
+        assert total.tolist() == [t for t, _ in expected]
+        assert recommender.as_dicts(encoded, each) == [e for _, e in expected]
+
+
+def test_total_reps_matches_derive_features():
+    plans = _plans(500, seed=2)
+    recommender = RepRecommender(INTENSITY)
+    profile = {'age': 30, 'gender': 'Male', 'weight': 80.0, 'height': 1.8, 'session_duration': 1.0, 'frequency': 3}
+
+    totals = recommender.total_reps(recommender.encode(plans))
+
+    assert totals.tolist() == [derive_features(profile | {'exercises': p}, INTENSITY)['Total_Reps'] for p in plans]
+
+
+def test_encode_reports_bad_rows_and_keeps_the_rest():
+    recommender = RepRecommender(INTENSITY)
+
+    encoded = recommender.encode([{'Push Ups': {'Reps': 10, 'Sets': 3}}, ['Push Ups'], {'Push Ups': {'Reps': 'x'}}])
+
+    assert set(encoded.errors) == {1, 2}
+    assert recommender.total_reps(encoded)[1:].tolist() == [0.0, 0.0]
+
+
+def test_encode_shared_matches_encode():
+    recommender = RepRecommender(INTENSITY)
+    names = ['Push Ups', 'Not In The Catalog']
+    reps = [np.array([10.0, 20.0, 30.0]), np.array([5.0, 0.0, 8.0])]
+    sets = [np.array([3.0, 3.0, 1.0]), np.array([2.0, 4.0, 0.0])]
+    plans = [{ex: {'Reps': r[i], 'Sets': s[i]} for ex, r, s in zip(names, reps, sets)} for i in range(3)]
+
+    shared = recommender.encode_shared(names, reps, sets, 3)
+    encoded = recommender.encode(plans)
+
+    np.testing.assert_array_equal(recommender.total_reps(shared), recommender.total_reps(encoded))
+    np.testing.assert_array_equal(recommender.recommend(np.full(3, 30.0), 15.0, shared)[1],
+                                  recommender.recommend(np.full(3, 30.0), 15.0, encoded)[1])
+
+
+def test_run_batch_matches_run(pipeline):
+    rng = np.random.default_rng(3)
+    payloads = [
+        {'age': int(rng.integers(18, 70)), 'gender': str(rng.choice(['Male', 'Female'])),
+         'weight': float(rng.uniform(50, 120)), 'height': float(rng.uniform(1.5, 2.0)),
+         'session_duration': float(rng.uniform(0.5, 2)), 'frequency': int(rng.integers(1, 7)), 'exercises': plan}
+        for plan in _plans(200, seed=4)
+    ]
+    payloads[5] = payloads[5] | {'height': 0}
+    payloads[9] = payloads[9] | {'exercises': {'Push Ups': {'Reps': 'ten'}}}
+
+    results, _ = pipeline.run_batch(payloads)
+
+    for i, (payload, result) in enumerate(zip(payloads, results)):
+        if i in (5, 9):
+            assert set(result) == {'error'}
+        else:
+            assert result == pipeline.run(payload)[0]
@@ -0,0 +1,107 @@
+import json
+import time
+
+import pytest
+from flask import Flask, session
+
+import db
+from sessions import SESSION_STORES, USER_CACHE_KEY, ServerSideSessionInterface, SQLiteSessionStore
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = db.ConnectionPool(str(tmp_path / 'sessions.db'))
+    conn = pool.acquire()
+    db.ensure_schema(conn)
+    pool.release(conn)
+    return pool
+
+
+@pytest.fixture(params=[('memory', 0.0), ('sqlite', 0.0), ('sqlite', 60.0)], ids=['memory', 'sqlite', 'sqlite-cached'])
+def store(request, pool):
+    kind, cache_ttl = request.param
+    return SESSION_STORES[kind](pool, cache_ttl)
+
+
+def test_store_round_trips_sessions(store):
+    later = time.time() + 60
+    store.save('a', 1, json.dumps({'user_id': 1, 'theme': 'dark'}), later)
+    store.save('b', None, json.dumps({'next': '/dashboard'}), later)
+
+    assert json.loads(store.load('a')) == {'user_id': 1, 'theme': 'dark'}
+    assert json.loads(store.load('b')) == {'next': '/dashboard'}
+    assert store.load('missing') is None
+
+    store.save('a', 1, json.dumps({'user_id': 1, 'theme': 'light'}), later)
+    store.delete('b')
+
+    assert json.loads(store.load('a')) == {'user_id': 1, 'theme': 'light'}
+    assert store.load('b') is None
+
+
+def test_store_drops_expired_sessions(store):
+    now = time.time()
+    store.save('old', 1, '{}', now - 1)
+    store.save('new', 1, '{}', now + 60)
+
+    assert store.load('old') is None
+    store.purge_expired(now)
+    assert len(store) == 1
+
+
+def test_forget_user_drops_only_the_cached_user_row(store):
+    later = time.time() + 60
+    store.save('a', 1, json.dumps({'user_id': 1, USER_CACHE_KEY: {'name': 'Old'}}), later)
+    store.save('b', 2, json.dumps({'user_id': 2, USER_CACHE_KEY: {'name': 'Other'}}), later)
+    store.load('a')
+
+    store.forget_user(1)
+
+    assert json.loads(store.load('a')) == {'user_id': 1}
+    assert json.loads(store.load('b')) == {'user_id': 2, USER_CACHE_KEY: {'name': 'Other'}}
+
+
+def test_cached_sqlite_store_rereads_after_the_ttl(pool, monkeypatch):
+    reader = SQLiteSessionStore(pool, cache_ttl=5.0)
+    writer = SQLiteSessionStore(pool)  # another worker sharing the database
+    later = time.time() + 60
+    writer.save('a', 1, '{"v": 1}', later)
+    assert reader.load('a') == '{"v": 1}'
+
+    writer.save('a', 1, '{"v": 2}', later)
+    assert reader.load('a') == '{"v": 1}'
+
+    monotonic = time.monotonic() + 6
+    monkeypatch.setattr(time, 'monotonic', lambda: monotonic)
+    assert reader.load('a') == '{"v": 2}'
+
+
+def test_interface_keeps_session_data_on_the_server(pool):
+    app = Flask(__name__)
+    app.secret_key = 'test'
+    app.session_interface = ServerSideSessionInterface(SESSION_STORES['sqlite'](pool, 0.0))
+
+    @app.post('/set')
+    def set_value():
+        session['user_id'] = 7
+        return ''
+
+    @app.get('/get')
+    def get_value():
+        return {'user_id': session.get('user_id')}
+
+    @app.post('/clear')
+    def clear():
+        session.clear()
+        return ''
+
+    client = app.test_client()
+    client.post('/set')
+    sid = client.get_cookie('session').value
+
+    assert client.get('/get').get_json() == {'user_id': 7}
+    assert json.loads(app.session_interface.store.load(sid)) == {'user_id': 7}
+
+    client.post('/clear')
+    assert client.get_cookie('session') is None
+    assert app.session_interface.store.load(sid) is None